@@ -0,0 +1,191 @@
+"""
+Load test of the world topic fan-out paths against simulated servers.
+
+Spins up local fake BYOND servers and measures p50/p99 latency and throughput of
+WorldTopic.send, GoonServers.send_to_servers and SpacebeeCommands.locate.
+Run from the repository root with Red installed:
+    python -m benchmarks.fanout [--servers 1 10 50 200] [--rounds N] [--latency S] [--jitter S] [--drop-rate P]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import *
+from worldtopic.worldtopic import WorldTopic
+from worldtopic.fakeserver import CannedReplies, FakeTopicServer
+from goonservers.goonservers import GoonServers, Server
+from spacebeecommands.spacebeecommands import SpacebeeCommands
+
+
+class FakeBot:
+    def __init__(self):
+        self.cogs = {}
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    async def get_shared_api_tokens(self, service):
+        return {}
+
+
+class FakeConfigValue:
+    def __init__(self, value):
+        self.value = value
+
+    async def __call__(self):
+        return self.value
+
+
+class FakeConfig:
+    # stands in for Red's Config so the cogs don't need a data directory
+    def __init__(self, **values):
+        for key, value in values.items():
+            setattr(self, key, FakeConfigValue(value))
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def report(name: str, server_count: int, latencies: List[float], requests: int, elapsed: float):
+    print(
+        f"{name:>16} {server_count:>4} servers: "
+        f"p50 {percentile(latencies, 50) * 1000:8.2f}ms "
+        f"p99 {percentile(latencies, 99) * 1000:8.2f}ms "
+        f"{requests / elapsed:10.0f} req/s"
+    )
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+def make_cogs(fake_servers: List[FakeTopicServer]):
+    bot = FakeBot()
+    worldtopic = WorldTopic(bot)
+    goonservers = GoonServers.__new__(GoonServers)
+    goonservers.bot = bot
+    goonservers.config = FakeConfig(status_max_age=0, status_poll_period=0)
+    goonservers.status_cache = {}
+    goonservers.status_in_flight = {}
+    goonservers.status_poll_task = None
+    goonservers.servers = [
+        Server(
+            {
+                "host": s.host,
+                "port": s.port,
+                "full_name": f"Fake {i}",
+                "type": "goon",
+            },
+            None,
+        )
+        for i, s in enumerate(fake_servers)
+    ]
+    spacebeecommands = SpacebeeCommands(bot)
+    bot.cogs.update(
+        WorldTopic=worldtopic,
+        GoonServers=goonservers,
+        SpacebeeCommands=spacebeecommands,
+    )
+    return worldtopic, goonservers, spacebeecommands
+
+
+async def bench_worldtopic(worldtopic, fake_servers, rounds):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = await asyncio.gather(
+            *(timed(worldtopic.send(s.addr_port, "status", adaptive=True)) for s in fake_servers),
+            return_exceptions=True,
+        )
+        latencies.extend(r[0] for r in results if not isinstance(r, BaseException))
+    elapsed = time.perf_counter() - start
+    report("WorldTopic.send", len(fake_servers), latencies, rounds * len(fake_servers), elapsed)
+
+
+async def bench_send_to_servers(goonservers, rounds):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        round_time, _ = await timed(goonservers.send_to_servers(goonservers.servers, "status"))
+        latencies.append(round_time)
+    elapsed = time.perf_counter() - start
+    report("send_to_servers", len(goonservers.servers), latencies, rounds * len(goonservers.servers), elapsed)
+
+
+async def bench_locate(spacebeecommands, server_count, rounds):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        ctx = FakeContext()
+        round_time, _ = await timed(
+            SpacebeeCommands.locate.callback(spacebeecommands, ctx, who="player1")
+        )
+        latencies.append(round_time)
+    elapsed = time.perf_counter() - start
+    report("locate", server_count, latencies, rounds * server_count, elapsed)
+
+
+async def run(server_count: int, args):
+    rng = random.Random(args.seed)
+    fake_servers = []
+    for i in range(server_count):
+        players = [f"player{rng.randrange(1000)}" for _ in range(rng.randrange(80))]
+        fake_servers.append(
+            FakeTopicServer(
+                CannedReplies(players=players),
+                latency=args.latency,
+                jitter=args.jitter,
+                drop_rate=args.drop_rate,
+                seed=rng.randrange(1 << 32),
+            )
+        )
+    await asyncio.gather(*(s.start() for s in fake_servers))
+    worldtopic, goonservers, spacebeecommands = make_cogs(fake_servers)
+    try:
+        await bench_worldtopic(worldtopic, fake_servers, args.rounds)
+        await bench_send_to_servers(goonservers, args.rounds)
+        await bench_locate(spacebeecommands, server_count, args.rounds)
+        print(f"{'pool':>16} {server_count:>4} servers: {worldtopic.pool_stats}")
+    finally:
+        worldtopic.cog_unload()
+        await asyncio.gather(*(s.stop() for s in fake_servers))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--drop-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    for server_count in args.servers:
+        await run(server_count, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Times makelogo and makefrog end to end, and their old PIL pipeline for comparison.
+
+Colour arguments are used so nothing is downloaded. Run from the repository root
+with Red installed:
+    python -m benchmarks.image_compositing [--rounds N]
+"""
+import argparse
+import asyncio
+import colorsys
+import contextlib
+import io
+import time
+import PIL.Image
+import PIL.ImageChops
+import PIL.ImageOps
+from redbot.core.data_manager import bundled_data_path
+from goonmisc import compositing
+from goonmisc.goonmisc import GoonMisc
+from .fanout import percentile
+
+
+class FakeMessage:
+    attachments = []
+
+
+class FakeContext:
+    def __init__(self):
+        self.message = FakeMessage()
+        self.sent = []
+
+    def typing(self):
+        return contextlib.AsyncExitStack()
+
+    async def send(self, content=None, file=None, **kwargs):
+        self.sent.append(file or content)
+
+
+def legacy_pretty_paint(img, from_col, to_col):
+    from_hsv = colorsys.rgb_to_hsv(*from_col)
+    to_hsv = colorsys.rgb_to_hsv(*to_col)
+
+    def transform(p):
+        r, g, b, a = p
+        h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        h += to_hsv[0] - from_hsv[0]
+        s *= to_hsv[1] / from_hsv[1]
+        v *= to_hsv[2] / from_hsv[2]
+        ro, go, bo = colorsys.hsv_to_rgb(h, s, v)
+        return (int(ro * 255), int(go * 255), int(bo * 255), a)
+
+    img.putdata(list(map(transform, img.convert("RGBA").getdata())))
+
+
+def legacy_logo(datapath, bg_color):
+    fg = PIL.Image.open(datapath / "logo_g.png").convert("RGBA")
+    bg = PIL.Image.open(datapath / "logo_bg_color.png")
+    legacy_pretty_paint(bg, compositing.LOGO_PAINT_FROM, bg_color)
+    fg = PIL.ImageChops.multiply(fg, PIL.Image.new("RGBA", bg.size, color="#3366cc"))
+    bg.paste(fg.convert("RGB"), (0, 0), fg)
+    data = io.BytesIO()
+    bg.save(data, format="png")
+
+
+def legacy_frog(datapath):
+    bottom_img = PIL.Image.open(datapath / "shelterbottom.png").convert("RGBA")
+    top_img = PIL.Image.open(datapath / "sheltertop.png").convert("RGBA")
+    eyes_img = PIL.Image.open(datapath / "sheltereyes.png").convert("RGBA")
+    mouth_img = PIL.Image.open(datapath / "sheltermouth.png").convert("RGBA")
+    bottom_img = PIL.ImageChops.multiply(bottom_img, PIL.Image.new("RGBA", bottom_img.size, color="#cddfc1"))
+    top_img = PIL.ImageChops.multiply(top_img, PIL.Image.new("RGBA", bottom_img.size, color="#91b978"))
+    bottom_img.paste(top_img.convert("RGB"), (0, 0), top_img)
+    bottom_img.paste(eyes_img.convert("RGB"), (0, 0), eyes_img)
+    bottom_img.paste(mouth_img.convert("RGB"), (0, 0), mouth_img)
+    bottom_img = PIL.ImageOps.mirror(bottom_img)
+    data = io.BytesIO()
+    bottom_img.save(data, format="png")
+
+
+def report(name, latencies):
+    print(
+        f"{name:>20}: p50 {percentile(latencies, 50) * 1000:8.2f}ms "
+        f"p99 {percentile(latencies, 99) * 1000:8.2f}ms"
+    )
+
+
+async def timed_rounds(rounds, make_coro):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await make_coro()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    cog = GoonMisc.__new__(GoonMisc)
+    cog.color_names = {}
+    cog.render_pool = None
+    datapath = bundled_data_path(cog)
+    loop = asyncio.get_running_loop()
+    try:
+        report("legacy makelogo !", await timed_rounds(
+            args.rounds, lambda: loop.run_in_executor(None, legacy_logo, datapath, (30, 120, 200))
+        ))
+        report("makelogo !", await timed_rounds(
+            args.rounds, lambda: GoonMisc.makelogo.callback(cog, FakeContext(), "!#1e78c8", "#3366cc")
+        ))
+        report("legacy makefrog", await timed_rounds(
+            args.rounds, lambda: loop.run_in_executor(None, legacy_frog, datapath)
+        ))
+        report("makefrog", await timed_rounds(
+            args.rounds, lambda: GoonMisc.makefrog.callback(cog, FakeContext(), "default", "default", flags="mirror")
+        ))
+    finally:
+        cog.cog_unload()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
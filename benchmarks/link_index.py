@@ -0,0 +1,62 @@
+"""
+Measures ckey <-> Discord link lookups in SpacebeeCentcom's in-memory index.
+
+Run from the repository root with Red installed:
+    python -m benchmarks.link_index [--accounts N]
+"""
+import argparse
+import random
+import string
+import time
+from spacebeecentcom.linkindex import LinkIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--accounts", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # same shapes as Config.all_users() and Config.custom("ckey").all()
+    users = {}
+    ckeys = {}
+    for i in range(args.accounts):
+        user_id = rng.randrange(10**17, 10**18)
+        ckey = "".join(rng.choices(string.ascii_lowercase + string.digits, k=12)) + str(i)
+        users[user_id] = {"linked_ckey": ckey, "link_verification": None}
+        ckeys[ckey] = {"discord_id": user_id}
+
+    index = LinkIndex()
+    start = time.perf_counter()
+    index.load(users, ckeys)
+    print(f"load {len(index)} accounts: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    ckey_list = list(ckeys)
+    user_list = list(users)
+    queries = [rng.choice(ckey_list) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for ckey in queries:
+        index.get_user_id(ckey)
+    elapsed = time.perf_counter() - start
+    print(f"ckey -> user: {elapsed / args.lookups * 1e9:.0f}ns per lookup")
+
+    queries = [rng.choice(user_list) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for user_id in queries:
+        index.get_ckey(user_id)
+    elapsed = time.perf_counter() - start
+    print(f"user -> ckey: {elapsed / args.lookups * 1e9:.0f}ns per lookup")
+
+    # a full server worth of players, like playermentions does
+    batches = [rng.sample(ckey_list, 100) for _ in range(1000)]
+    start = time.perf_counter()
+    for batch in batches:
+        index.ckeys_to_user_ids(batch)
+    elapsed = time.perf_counter() - start
+    print(f"bulk 100 ckeys: {elapsed / len(batches) * 1e6:.1f}us per batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Fuzzes and benchmarks the world topic response parser against a local fake server.
+
+Run from the repository root:
+    python -m benchmarks.topic_protocol [--fuzz N] [--rounds N]
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from worldtopic import protocol
+from worldtopic.fakeserver import FakeTopicServer
+
+
+async def legacy_read(reader: asyncio.StreamReader) -> bytes:
+    # the old receive loop, kept for comparison
+    response = b""
+    target_length = 0
+    while len(response) < 4 or len(response) < target_length:
+        new_bytes = await reader.read(0xFFFF)
+        if not new_bytes:
+            raise ConnectionResetError()
+        response += new_bytes
+        if not target_length and len(response) >= 4:
+            target_length = int.from_bytes(response[2:4], byteorder="big") + 4
+    return response
+
+
+def random_value(rng: random.Random):
+    kind = rng.random()
+    if kind < 0.1:
+        return None
+    if kind < 0.3:
+        return rng.uniform(-1e6, 1e6)
+    length = rng.choice([0, 1, 10, 100, 1000, 20000, 60000])
+    alphabet = "abcdefgh=&%+ éř\U0001F41D"
+    text = "".join(rng.choice(alphabet) for _ in range(length))
+    while len(text.encode("utf8")) > protocol.MAX_PAYLOAD_LENGTH - 2:
+        text = text[: len(text) // 2]
+    return text.strip("\x00")
+
+
+def values_equal(sent, received):
+    if isinstance(sent, float):
+        return math.isclose(sent, received, rel_tol=1e-6)
+    return sent == received
+
+
+async def fuzz(count: int, seed: int):
+    rng = random.Random(seed)
+    pending = []
+
+    def handler(topic):
+        return pending.pop(0)
+
+    async with FakeTopicServer(handler) as server:
+        reader, writer = await asyncio.open_connection(*server.addr_port)
+        for i in range(count):
+            value = random_value(rng)
+            pending.append(value)
+            writer.write(protocol.encode_packet(f"fuzz{i}"))
+            received = protocol.decode_payload(await protocol.read_payload(reader))
+            if not values_equal(value, received):
+                raise AssertionError(f"Mismatch on iteration {i}: {value!r} != {received!r}")
+        writer.close()
+
+    # garbage must only ever fail with protocol or decoding errors
+    for i in range(count):
+        payload = memoryview(bytes(rng.randrange(256) for _ in range(rng.randrange(1, 64))))
+        try:
+            protocol.decode_payload(payload)
+        except (protocol.ProtocolError, UnicodeDecodeError):
+            pass
+    print(f"fuzz: {count} round trips and {count} garbage payloads ok")
+
+
+async def bench_parser(rounds: int):
+    for size in [100, 1000, 10000, 60000]:
+        text = "x" * size
+
+        async with FakeTopicServer(lambda topic: text) as server:
+            for name, read in [
+                ("legacy", legacy_read),
+                ("readexactly", protocol.read_payload),
+            ]:
+                reader, writer = await asyncio.open_connection(*server.addr_port)
+                packet = protocol.encode_packet("status")
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    writer.write(packet)
+                    await read(reader)
+                elapsed = time.perf_counter() - start
+                writer.close()
+                print(
+                    f"{name:>12} {size:>6} bytes: {elapsed / rounds * 1e6:8.1f}us per response"
+                )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fuzz", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+    await fuzz(args.fuzz, args.seed)
+    await bench_parser(args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
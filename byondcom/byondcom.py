@@ -17,10 +17,14 @@ FISH_MEDAL = "http://www.byond.com/games/hubmedal/4893.png"
 class ByondCom(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.http = bot.get_cog("HttpClient").handle_for(self)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     @checks.admin()
     @commands.command(aliases=["byondinfo"])
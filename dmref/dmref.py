@@ -1,6 +1,8 @@
 import asyncio
 import aiohttp
 import discord
+import logging
+import pickle
 from redbot.core import commands, Config, checks
 import discord.errors
 from redbot.core.bot import Red
@@ -10,8 +12,13 @@ from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 from redbot.core.utils.chat_formatting import pagify, box, quote
 from html.parser import HTMLParser
 from collections import OrderedDict
+from redbot.core.data_manager import cog_data_path, bundled_data_path
+from .searchindex import SearchIndex
+
+log = logging.getLogger("red.goon.dmref")
 
 BYOND_REF_URL = "http://www.byond.com/docs/ref/info.html"
+CACHE_VERSION = 1
 
 class DMRefEntry:
     def __init__(self):
@@ -38,6 +45,16 @@ class DMRefEntry:
             self.lists[list_name] = []
         self.lists[list_name].append((value, url))
 
+    def to_data(self):
+        return (self.path, self.title, [(name, lines) for name, lines in self.lists.items()], self.body)
+
+    @classmethod
+    def from_data(cls, data):
+        entry = cls()
+        entry.path, entry.title, lists, entry.body = data
+        entry.lists = OrderedDict((name, [tuple(line) for line in lines]) for name, lines in lists)
+        return entry
+
     def __repr__(self):
         return f"<DMRefEntry title={repr(self.title)} see_also={repr(self.lists)} body={repr(self.body)}>"
     
@@ -175,42 +192,122 @@ class DMRefParser(HTMLParser):
 class DMRef(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.http = bot.get_cog("HttpClient").handle_for(self)
+        self.entries = {}
+        self.index = SearchIndex({})
+        self.rendered = {}
+        self.cache_path = cog_data_path(self) / "reference.pickle"
+        self.etag = None
+        self.last_modified = None
+        self.refresh_task = None
 
     async def init(self):
+        """Loads the cached or bundled reference right away and refreshes it from byond.com in the background."""
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.load_cache)
+        if cached is not None:
+            self.etag, self.last_modified, built = cached
+            self.set_entries(built)
+        else:
+            built = await loop.run_in_executor(None, self.load_snapshot)
+            if built is not None:
+                self.set_entries(built)
+        self.refresh_task = asyncio.create_task(self.refresh())
+
+    def load_cache(self):
+        """Returns the cached ETag, Last-Modified and built entries, None if there's no usable cache."""
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            log.exception("Unreadable DM reference cache")
+            return None
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return None
+        built = self.build_entries({entry[0]: DMRefEntry.from_data(entry) for entry in data["entries"]})
+        return data["etag"], data["last_modified"], built
+
+    def save_cache(self):
+        data = {
+            "version": CACHE_VERSION,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "entries": [entry.to_data() for entry in self.entries.values()],
+        }
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(self.cache_path)
+
+    def load_snapshot(self):
+        """Falls back to a copy of info.html bundled in the cog's data folder, if there is one."""
+        try:
+            snapshot_path = bundled_data_path(self) / "info.html"
+        except FileNotFoundError:
+            return None
+        if not snapshot_path.exists():
+            return None
+        return self.build_entries(self.parse(snapshot_path.read_text(encoding="utf-8", errors="replace")))
+
+    def parse(self, html):
         parser = DMRefParser()
-        async with self.session.get(BYOND_REF_URL) as res:
-            if res.status != 200:
-                return res
-            parser.feed(await res.text())
-        self.entries = parser.processed
+        parser.feed(html)
+        return parser.processed
+
+    async def refresh(self):
+        headers = {}
+        if self.entries:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        try:
+            async with self.session.get(BYOND_REF_URL, headers=headers) as res:
+                if res.status == 304:
+                    return
+                if res.status != 200:
+                    log.warning(f"Fetching the DM reference failed with status {res.status}")
+                    return
+                html = await res.text()
+                etag = res.headers.get("ETag")
+                last_modified = res.headers.get("Last-Modified")
+        except aiohttp.ClientError:
+            log.exception("Fetching the DM reference failed")
+            return
+        loop = asyncio.get_running_loop()
+        entries = await loop.run_in_executor(None, self.parse, html)
+        built = await loop.run_in_executor(None, self.build_entries, entries)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.set_entries(built)
+        await loop.run_in_executor(None, self.save_cache)
+
+    def build_entries(self, entries):
+        """Builds the search index and rendered pages of parsed entries, safe to run in a thread."""
+        index = SearchIndex(entries)
+        rendered = {path: self.render_entry(entry) for path, entry in entries.items()}
+        return entries, index, rendered
+
+    def set_entries(self, built):
+        # swapped at once on the event loop so a running search never sees a mix
+        self.entries, self.index, self.rendered = built
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+        self.http.close()
 
     def ckeyify(self, text):
         return ''.join(c.lower() for c in text if c.isalnum())
 
     def find_entries(self, search):
-        search = search.lower().strip()
-        csearch = self.ckeyify(search)
-        search_words = [self.ckeyify(w) for w in search.split()]
-        result_tiers = [[] for x in range(6)]
-        for key, value in self.entries.items():
-            if search == key.split('/')[-1]:
-                result_tiers[0].append(value)
-            elif search in key.split('/'):
-                result_tiers[1].append(value)
-            elif search in key:
-                result_tiers[2].append(value)
-            elif search in value.title:
-                result_tiers[3].append(value)
-            elif csearch in self.ckeyify(value.title) or csearch in self.ckeyify(key):
-                result_tiers[4].append(value)
-            elif all(w in value.title or w in key for w in search_words):
-                result_tiers[5].append(value)
-        #return next(results for results in result_tiers if results)
-        return sum(result_tiers, [])
+        return self.index.search(search)
 
     def process_entry_list(self, entry, name, separator=' - ', sep_on_first=True):
         if not name in entry.lists:
@@ -242,9 +339,28 @@ class DMRef(commands.Cog):
             first = False
         return output
 
+    def render_entry(self, entry):
+        """Splits an entry into (title, description, footer) parts each fitting one embed."""
+        desc = []
+        for name in entry.lists:
+            if name in ['See also:']:
+                continue
+            desc += self.process_entry_list(entry, name)
+        desc.append(entry.body)
+        desc.append(''.join(self.process_entry_list(entry, 'See also:', ' | ', False)))
+        desc = '\n'.join(desc)
+        desc_parts = list(pagify(desc, page_length=4000))
+        parts = []
+        for i, desc_part in enumerate(desc_parts):
+            page_part_text = f" ({i + 1}/{len(desc_parts)})" if len(desc_parts) > 1 else ""
+            parts.append(((entry.title or entry.path) + page_part_text, desc_part, entry.path + page_part_text))
+        return parts
+
     @commands.command()
     async def dmref(self, ctx: commands.Context, *, search: str):
         """Searches the DM language reference and displays results neatly."""
+        # a refresh may swap in new entries while this awaits
+        rendered = self.rendered
         entries = self.find_entries(search)
         if not entries:
             await ctx.send("No results found.")
@@ -252,26 +368,14 @@ class DMRef(commands.Cog):
         embed_colour = await ctx.embed_colour()
         pages = []
         for entry in entries:
-            desc = []
-            for name in entry.lists:
-                if name in ['See also:']:
-                    continue
-                desc += self.process_entry_list(entry, name)
-            desc.append(entry.body)
-            desc.append(''.join(self.process_entry_list(entry, 'See also:', ' | ', False)))
-            desc = '\n'.join(desc)
-            desc_parts = list(pagify(desc, page_length=4000))
-            for i, desc_part in enumerate(desc_parts):
-                title = entry.title
-                page_part_text = f" ({i + 1}/{len(desc_parts)})" if len(desc_parts) > 1 else ""
-                title += page_part_text
+            for title, desc_part, footer in rendered[entry.path]:
                 current_embed = discord.Embed(
                         title = title,
                         color = embed_colour,
                         description = desc_part,
                         url = f"{BYOND_REF_URL}#{entry.path}",
                     )
-                current_embed.set_footer(text=entry.path + page_part_text)
+                current_embed.set_footer(text=footer)
                 pages.append(current_embed)
 
         for i, page in enumerate(pages):
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from typing import *
+
+
+def ckeyify(text):
+    return ''.join(c.lower() for c in text if c.isalnum())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IndexedEntry:
+    __slots__ = ("entry", "key", "segments", "title", "ckey", "ckey_title")
+
+    def __init__(self, key, entry):
+        self.entry = entry
+        self.key = key.lower()
+        self.segments = self.key.split('/')
+        self.title = (entry.title or "").lower()
+        self.ckey = ckeyify(key)
+        self.ckey_title = ckeyify(self.title)
+
+
+class SearchIndex:
+    """Search index over the parsed DM reference entries, built once after parsing.
+
+    Results are ranked in the same tiers the old linear scan used: exact last path
+    segment, any path segment, substring of the path, substring of the title, then
+    alphanumerics only and finally all words anywhere. Exact last segments and path
+    segments are looked up directly, the substring tiers only check entries sharing all trigrams of the
+    search. If nothing matches the entries with the most trigrams in common with
+    the search are returned instead."""
+
+    MIN_FUZZY_SIMILARITY = 0.5
+    MAX_FUZZY_RESULTS = 10
+
+    def __init__(self, entries: Dict[str, Any]):
+        self.entries = [IndexedEntry(key, entry) for key, entry in entries.items()]
+        self.last_segment = defaultdict(list)
+        self.segment = defaultdict(list)
+        self.trigrams = defaultdict(set)
+        for i, indexed in enumerate(self.entries):
+            self.last_segment[indexed.segments[-1]].append(i)
+            for segment in set(indexed.segments):
+                self.segment[segment].append(i)
+            for trigram in trigrams(indexed.ckey) | trigrams(indexed.ckey_title):
+                self.trigrams[trigram].add(i)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, text) -> Optional[Set[int]]:
+        """Entries containing all trigrams of `text`, None if it's too short to tell."""
+        grams = trigrams(text)
+        if not grams:
+            return None
+        postings = sorted((self.trigrams.get(g, set()) for g in grams), key=len)
+        return set.intersection(*postings)
+
+    def tier(self, indexed, search, csearch, search_words):
+        # exact last segments (tier 0) are found through `last_segment` instead
+        if search in indexed.segments:
+            return 1
+        if search in indexed.key:
+            return 2
+        if search in indexed.title:
+            return 3
+        if csearch and (csearch in indexed.ckey_title or csearch in indexed.ckey):
+            return 4
+        if all(w in indexed.title or w in indexed.key for w in search_words):
+            return 5
+        return None
+
+    def search(self, search: str) -> List[Any]:
+        search = search.lower().strip()
+        csearch = ckeyify(search)
+        search_words = [ckeyify(w) for w in search.split()]
+        candidates = set(self.segment.get(search, ()))
+        substring_candidates = self.candidates(csearch)
+        if substring_candidates is None or any(len(w) < 3 for w in search_words):
+            candidates = range(len(self.entries))
+        else:
+            candidates.update(substring_candidates)
+            word_candidates = [self.candidates(w) for w in search_words]
+            if word_candidates:
+                candidates.update(set.intersection(*word_candidates))
+        exact = set(self.last_segment.get(search, ()))
+        scored = [(0, len(self.entries[i].key), i) for i in exact]
+        for i in candidates:
+            if i in exact:
+                continue
+            indexed = self.entries[i]
+            tier = self.tier(indexed, search, csearch, search_words)
+            if tier is not None:
+                scored.append((tier, len(indexed.key), i))
+        if not scored:
+            return self.fuzzy_search(csearch)
+        scored.sort()
+        return [self.entries[i].entry for _, _, i in scored]
+
+    def fuzzy_search(self, csearch: str) -> List[Any]:
+        grams = trigrams(csearch)
+        if not grams:
+            return []
+        shared = defaultdict(int)
+        for gram in grams:
+            for i in self.trigrams.get(gram, ()):
+                shared[i] += 1
+        scored = []
+        for i, count in shared.items():
+            similarity = count / len(grams)
+            if similarity >= self.MIN_FUZZY_SIMILARITY:
+                scored.append((-similarity, len(self.entries[i].key), i))
+        scored.sort()
+        return [self.entries[i].entry for _, _, i in scored[:self.MAX_FUZZY_RESULTS]]
@@ -18,11 +18,15 @@ import time
 class GoonHub(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.cancelled_findalts = False
-        self.session = aiohttp.ClientSession()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     def country_to_emoji(self, country):
         if country and len(country) == 2:
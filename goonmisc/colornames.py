@@ -0,0 +1,53 @@
+import numpy as np
+from typing import *
+from .colorstuff import color_parse_hex
+
+
+def rgb_to_lab_array(rgb):
+    """Vectorized `colorstuff.rgb_to_lab` for an (N, 3) array of 0-255 RGB values."""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255
+    rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92) * 100
+    xyz = rgb @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ])
+    xyz /= np.array([95.047, 100.0, 108.883])
+    xyz = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    lab = np.empty_like(xyz)
+    lab[:, 0] = 116 * xyz[:, 1] - 16
+    lab[:, 1] = 500 * (xyz[:, 0] - xyz[:, 1])
+    lab[:, 2] = 200 * (xyz[:, 1] - xyz[:, 2])
+    return lab
+
+
+class ColorNameIndex:
+    """Named colors with their Lab coordinates precomputed for nearest name lookups."""
+
+    # bounds the (queries x names) distance matrix to a few MB
+    CHUNK_SIZE = 256
+
+    def __init__(self, color_names: Dict[str, str]):
+        self.names = list(color_names.keys())
+        self.hexes = list(color_names.values())
+        self.lab = rgb_to_lab_array([color_parse_hex(col) for col in self.hexes])
+
+    def __len__(self):
+        return len(self.names)
+
+    def closest(self, rgb: Tuple[int, int, int]) -> Tuple[float, str, str]:
+        return self.closest_many([rgb])[0]
+
+    def closest_many(self, rgbs: Sequence[Tuple[int, int, int]]) -> List[Tuple[float, str, str]]:
+        """Returns (distance, name, hex) of the closest named color for every RGB triple."""
+        if not len(rgbs):
+            return []
+        lab = rgb_to_lab_array(rgbs)
+        result = []
+        for start in range(0, len(lab), self.CHUNK_SIZE):
+            chunk = lab[start:start + self.CHUNK_SIZE]
+            dists = ((chunk[:, None, :] - self.lab[None, :, :]) ** 2).sum(axis=2)
+            best = dists.argmin(axis=1)
+            for row, i in enumerate(best):
+                result.append((float(np.sqrt(dists[row, i])), self.names[i], self.hexes[i]))
+        return result
@@ -0,0 +1,211 @@
+"""
+Image compositing for makelogo and makefrog.
+
+Everything here is a plain module level function taking picklable arguments so it
+can run in a process pool. Template layers are decoded once per process and kept
+as read-only RGBA uint8 arrays, recently used paint images are kept decoded too.
+"""
+import io
+import os.path
+import cairosvg
+import numpy as np
+import PIL.Image
+from collections import OrderedDict
+from typing import *
+
+LOGO_PAINT_FROM = (0xEC, 0xED, 0x42)
+MAX_CACHED_PAINTS = 16
+
+_templates = {}
+_paints = OrderedDict()
+
+
+class UnreadableImageError(Exception):
+    """A paint image couldn't be decoded, the argument says which one."""
+
+    pass
+
+
+def load_template(datapath: str, name: str) -> np.ndarray:
+    path = os.path.join(datapath, name)
+    template = _templates.get(path)
+    if template is None:
+        template = np.asarray(PIL.Image.open(path).convert("RGBA"))
+        template.setflags(write=False)
+        _templates[path] = template
+    return template
+
+
+def load_paint(paint, size: Tuple[int, int], which: str):
+    """Turns a paint spec into an RGBA array or an RGBA colour tuple.
+
+    A spec is None, `("color", rgba)` or `("image", bytes, is_svg, digest)`. Images
+    are scaled to cover `size` and cropped to a centered square like before. If the
+    content digest is known the result is cached."""
+    if paint is None:
+        return None
+    if paint[0] == "color":
+        return paint[1]
+    _, img_bytes, is_svg, digest = paint
+    if digest is not None:
+        cached = _paints.get((digest, size))
+        if cached is not None:
+            _paints.move_to_end((digest, size))
+            return cached
+    try:
+        if is_svg and len(img_bytes):
+            img_bytes = cairosvg.svg2png(
+                bytestring=img_bytes, parent_width=size[0], parent_height=size[1]
+            )
+        image = PIL.Image.open(io.BytesIO(img_bytes))
+        image.load()
+    except Exception as e:
+        raise UnreadableImageError(which) from e
+    scale_factor = max(bsize / isize for bsize, isize in zip(size, image.size))
+    if scale_factor != 1.0:
+        image = image.resize(
+            tuple(int(s * scale_factor) for s in image.size), PIL.Image.Resampling.BICUBIC
+        )
+    if image.size[0] != image.size[1]:
+        half_new_size = min(image.size) / 2
+        center_x = image.size[0] / 2
+        center_y = image.size[1] / 2
+        image = image.crop(
+            (
+                int(center_x - half_new_size),
+                int(center_y - half_new_size),
+                int(center_x + half_new_size),
+                int(center_y + half_new_size),
+            )
+        )
+    result = np.asarray(image.convert("RGBA"))
+    if digest is not None:
+        result.setflags(write=False)
+        _paints[(digest, size)] = result
+        while len(_paints) > MAX_CACHED_PAINTS:
+            _paints.popitem(last=False)
+    return result
+
+
+def multiply(img: np.ndarray, paint) -> np.ndarray:
+    """Same as `ImageChops.multiply`, the result has the smaller size of the two."""
+    if isinstance(paint, tuple):
+        return (img.astype(np.uint16) * np.array(paint, dtype=np.uint16) // 255).astype(np.uint8)
+    height = min(img.shape[0], paint.shape[0])
+    width = min(img.shape[1], paint.shape[1])
+    product = img[:height, :width].astype(np.uint16) * paint[:height, :width]
+    return (product // 255).astype(np.uint8)
+
+
+def paste(dst: np.ndarray, src: np.ndarray) -> np.ndarray:
+    """Same as `dst.paste(src.convert("RGB"), (0, 0), src)`."""
+    height = min(dst.shape[0], src.shape[0])
+    width = min(dst.shape[1], src.shape[1])
+    out = dst.copy()
+    region = out[:height, :width].astype(np.float32)
+    mask = src[:height, :width, 3:4].astype(np.float32) / 255
+    overlay = src[:height, :width].astype(np.float32)
+    overlay[..., 3] = 255
+    out[:height, :width] = np.rint(region + (overlay - region) * mask).astype(np.uint8)
+    return out
+
+
+def rgb_to_hsv_array(rgb: np.ndarray) -> np.ndarray:
+    mx = rgb.max(axis=-1)
+    mn = rgb.min(axis=-1)
+    df = mx - mn
+    safe_df = np.where(df == 0, 1, df)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    h = np.where(
+        mx == r,
+        (g - b) / safe_df,
+        np.where(mx == g, 2 + (b - r) / safe_df, 4 + (r - g) / safe_df),
+    )
+    h = np.where(df == 0, 0, (h / 6) % 1)
+    s = np.where(mx == 0, 0, df / np.where(mx == 0, 1, mx))
+    return np.stack([h, s, mx], axis=-1)
+
+
+def hsv_to_rgb_array(hsv: np.ndarray) -> np.ndarray:
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    i = np.floor(h * 6)
+    f = h * 6 - i
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+    i = i.astype(np.int64) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=-1)
+
+
+def pretty_paint(img: np.ndarray, from_col, to_col) -> np.ndarray:
+    """Shifts hue and scales saturation and value so `from_col` becomes `to_col`."""
+    from_hsv = rgb_to_hsv_array(np.array(from_col, dtype=np.float64) / 255)
+    to_hsv = rgb_to_hsv_array(np.array(to_col[:3], dtype=np.float64) / 255)
+    hsv = rgb_to_hsv_array(img[..., :3].astype(np.float32) / 255)
+    hsv[..., 0] = (hsv[..., 0] + to_hsv[0] - from_hsv[0]) % 1
+    hsv[..., 1] *= to_hsv[1] / from_hsv[1]
+    hsv[..., 2] *= to_hsv[2] / from_hsv[2]
+    rgb = hsv_to_rgb_array(np.clip(hsv, 0, 1))
+    out = np.empty_like(img)
+    out[..., :3] = (rgb * 255).astype(np.uint8)
+    out[..., 3] = img[..., 3]
+    return out
+
+
+def encode_png(img: np.ndarray) -> bytes:
+    data = io.BytesIO()
+    PIL.Image.fromarray(img, "RGBA").save(data, format="png")
+    return data.getvalue()
+
+
+def render_logo(datapath: str, background, background_paint, foreground_paint) -> bytes:
+    """`background` is "color" with `background_paint` being the colour, "goon" or "paint"."""
+    fg = load_template(datapath, "logo_g.png")
+    if background == "color":
+        bg = pretty_paint(load_template(datapath, "logo_bg_color.png"), LOGO_PAINT_FROM, background_paint)
+    elif background == "goon":
+        bg = load_template(datapath, "logo_bg_color.png")
+    else:
+        bg = load_template(datapath, "logo_bg.png")
+        size = (bg.shape[1], bg.shape[0])
+        bg = multiply(bg, load_paint(background_paint, size, "background"))
+    size = (bg.shape[1], bg.shape[0])
+    fg_paint = load_paint(foreground_paint, size, "foreground")
+    if fg_paint is not None:
+        fg = multiply(fg, fg_paint)
+    return encode_png(paste(bg, fg))
+
+
+def render_frog(datapath: str, bottom_paint, top_paint, flags: List[str]) -> bytes:
+    bottom_img = load_template(datapath, "shelterbottom.png")
+    top_img = load_template(datapath, "sheltertop.png")
+    size = (bottom_img.shape[1], bottom_img.shape[0])
+
+    bottom_paint = load_paint(bottom_paint, size, "bottom")
+    top_paint = load_paint(top_paint, size, "top")
+    if top_paint is None:
+        top_paint = bottom_paint
+
+    def flipped(paint, prefix):
+        if isinstance(paint, tuple):
+            return paint
+        if f"flip{prefix}" in flags:
+            paint = paint[::-1]
+        if f"mirror{prefix}" in flags:
+            paint = paint[:, ::-1]
+        return paint
+
+    result = multiply(bottom_img, flipped(bottom_paint, "bottom"))
+    result = paste(result, multiply(top_img, flipped(top_paint, "top")))
+    if "noface" not in flags and "noeyes" not in flags:
+        result = paste(result, load_template(datapath, "sheltereyes.png"))
+    if "noface" not in flags and "nomouth" not in flags:
+        result = paste(result, load_template(datapath, "sheltermouth.png"))
+    if "flip" in flags:
+        result = result[::-1]
+    if "mirror" in flags:
+        result = result[:, ::-1]
+    return encode_png(np.ascontiguousarray(result))
@@ -1,5 +1,7 @@
 import random
 import asyncio
+import multiprocessing
+import site
 import discord
 import os.path
 from github import Github
@@ -7,9 +9,10 @@ from redbot.core import commands, Config, checks
 from redbot.core.bot import Red
 from redbot.core.data_manager import cog_data_path, bundled_data_path
 from concurrent.futures.thread import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 from typing import *
-import requests
 from collections import defaultdict
 import datetime
 import hashlib
@@ -17,17 +20,20 @@ import re
 import bisect
 import PIL
 import io
-import aiohttp
-import colorsys
-import cairosvg
 import json
 import contextlib
 from .moonymath import moony
 from .colorstuff import *
+from .colornames import ColorNameIndex
+from . import compositing
+from .imagecache import ImageCache, ImageFetchError
 
 class GoonMisc(commands.Cog):
+    RENDER_PROCESSES = 2
+
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.config = Config.get_conf(self, identifier=11530251279432)
         self.config.register_global(
             repository=None,
@@ -40,6 +46,48 @@ class GoonMisc(commands.Cog):
         self.is_dad = False
         self.color_names = json.load(open(bundled_data_path(self) / "color-names.json"))
         self.norm_color_names = {self.normalize_text(name): col for name, col in self.color_names.items()}
+        self.color_index = ColorNameIndex(self.color_names)
+        self.render_pool = None
+        self.background_tasks = set()
+        self.image_cache = ImageCache(
+            cog_data_path(self) / "image_cache",
+            lambda: self.http.session,
+        )
+
+    def cog_unload(self):
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=False, cancel_futures=True)
+        for task in self.background_tasks:
+            task.cancel()
+        self.image_cache.close()
+        self.http.close()
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def prefetch_image(self, url):
+        try:
+            await self.image_cache.fetch(url)
+        except ImageFetchError:
+            pass
+
+    async def render(self, function, *args):
+        """Runs a `compositing` render function in a worker process."""
+        if self.render_pool is None:
+            # forking the bot's multi-threaded process can leave a worker stuck on a copied lock
+            self.render_pool = ProcessPoolExecutor(
+                max_workers=self.RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                # cog folders aren't on sys.path, spawned workers need it to import `compositing`
+                initializer=site.addsitedir,
+                initargs=(str(Path(__file__).resolve().parents[1]),),
+            )
+        return await asyncio.get_running_loop().run_in_executor(
+            self.render_pool, function, *args
+        )
 
     def normalize_text(self, text):
         return "".join(c.lower() for c in text if c.isalnum())
@@ -144,6 +192,9 @@ class GoonMisc(commands.Cog):
             embed.set_image(url=logo_url)
             embed.set_footer(text=f"{i+1}/{len(presets)}")
             embeds.append(embed)
+        # warm the cache so picking one of them with `logo set` is instant
+        for logo_url in presets.values():
+            self.spawn(self.prefetch_image(logo_url))
         if len(embeds) > 1:
             await menu(ctx, embeds, DEFAULT_CONTROLS, timeout=60.0)
         elif len(embeds) == 1:
@@ -158,7 +209,14 @@ class GoonMisc(commands.Cog):
         if logo_name not in presets:
             await ctx.send("There is no such logo preset.")
             return
-        await ctx.send(presets[logo_name])
+        logo_url = presets[logo_name]
+        try:
+            _, data = await self.image_cache.fetch(logo_url)
+        except ImageFetchError:
+            await ctx.send(logo_url)
+            return
+        fname = logo_url.split("?")[0].split("/")[-1] or "logo.png"
+        await ctx.send(f"<{logo_url}>", file=discord.File(io.BytesIO(data), fname))
 
     @logo.command()
     async def get(self, ctx: commands.Context):
@@ -196,9 +254,9 @@ class GoonMisc(commands.Cog):
             if logo_url in presets:
                 logo_url = presets[logo_url]
             if logo_url:
-                icon = requests.get(logo_url).content
+                _, icon = await self.image_cache.fetch(logo_url)
             elif len(ctx.message.attachments) > 0:
-                icon = requests.get(ctx.message.attachments[0].url).content
+                _, icon = await self.image_cache.fetch(ctx.message.attachments[0].url)
             else:
                 error_out = True
         except Exception:
@@ -423,20 +481,28 @@ class GoonMisc(commands.Cog):
             "\N{LARGE RED SQUARE} __admin message__ \N{LARGE RED SQUARE}\n" + message
         )
 
-    def _pretty_paint(self, img, from_col, to_col):
-        from_hsv = colorsys.rgb_to_hsv(*from_col)
-        to_hsv = colorsys.rgb_to_hsv(*to_col)
-
-        def transform(p):
-            r, g, b, a = p
-            h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
-            h += to_hsv[0] - from_hsv[0]
-            s *= to_hsv[1] / from_hsv[1]
-            v *= to_hsv[2] / from_hsv[2]
-            ro, go, bo = colorsys.hsv_to_rgb(h, s, v)
-            return (int(ro * 255), int(go * 255), int(bo * 255), a)
-
-        img.putdata(list(map(transform, img.convert("RGBA").getdata())))
+    async def fetch_paint(self, ctx: commands.Context, arg, attachment_index):
+        """Resolves a makelogo/makefrog argument to a paint spec for `compositing.load_paint`."""
+        if len(ctx.message.attachments) > attachment_index:
+            arg = ctx.message.attachments[attachment_index].url
+        if isinstance(arg, str) and arg.lower() in self.color_names:
+            arg = self.color_names[arg.lower()]
+        if arg is None:
+            return None
+        elif isinstance(arg, discord.Member):
+            arg = arg.display_avatar.replace(format="png").url
+        elif isinstance(arg, discord.PartialEmoji):
+            arg = arg.url
+        elif ord(arg[0]) > 127:
+            arg = "https://twemoji.maxcdn.com/v/latest/svg/{}.svg".format(
+                "-".join(
+                    "{cp:x}".format(cp=ord(c)) for c in arg if ord(c) != 0xFE0F
+                )
+            )
+        elif arg and "." not in arg:
+            return ("color", PIL.ImageColor.getcolor(arg, "RGBA"))
+        digest, img_bytes = await self.image_cache.fetch(arg)
+        return ("image", img_bytes, arg.endswith(".svg"), digest)
 
     @commands.command()
     @commands.cooldown(1, 1)
@@ -452,65 +518,8 @@ class GoonMisc(commands.Cog):
         Both background and foreground can be entered either as colours (word or #rrggbb) or as URLs to images or as attachments to the message or as custom emoji or as usernames.
         """
 
-        datapath = bundled_data_path(self)
-        bg = None
-        fg = PIL.Image.open(datapath / "logo_g.png").convert("RGBA")
-
-        async def make_paint(arg, attachment_index):
-            img_bytes = None
-            if len(ctx.message.attachments) > attachment_index:
-                arg = ctx.message.attachments[attachment_index].url
-            if isinstance(arg, str) and arg.lower() in self.color_names:
-                arg = self.color_names[arg.lower()]
-            if arg is None:
-                return None
-            elif isinstance(arg, discord.Member):
-                img_bytes = await arg.avatar.replace(format="png").read()
-            elif isinstance(arg, discord.PartialEmoji):
-                img_bytes = await arg.read()
-            elif ord(arg[0]) > 127:
-                arg = "https://twemoji.maxcdn.com/v/latest/svg/{}.svg".format(
-                    "-".join(
-                        "{cp:x}".format(cp=ord(c)) for c in arg if ord(c) != 0xFE0F
-                    )
-                )
-            elif arg and "." not in arg:
-                return PIL.Image.new("RGBA", bg.size, color=arg)
-            if arg is None and img_bytes is None:
-                return None
-            if img_bytes is None:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(arg) as response:
-                        img_bytes = (
-                            await response.read() if response.status == 200 else b""
-                        )
-                if arg.endswith(".svg") and len(img_bytes):
-                    img_bytes = cairosvg.svg2png(
-                        bytestring=img_bytes,
-                        parent_width=bg.size[0],
-                        parent_height=bg.size[1],
-                    )
-            image = PIL.Image.open(io.BytesIO(img_bytes))
-            scale_factors = [bsize / isize for bsize, isize in zip(bg.size, image.size)]
-            scale_factor = max(scale_factors)
-            if scale_factor != 1.0:
-                image = image.resize(
-                    (int(s * scale_factor) for s in image.size), PIL.Image.Resampling.BICUBIC
-                )
-            if image.size[0] != image.size[1]:
-                half_new_size = min(image.size) / 2
-                center_x = image.size[0] / 2
-                center_y = image.size[1] / 2
-                image = image.crop(
-                    (
-                        int(center_x - half_new_size),
-                        int(center_y - half_new_size),
-                        int(center_x + half_new_size),
-                        int(center_y + half_new_size),
-                    )
-                )
-            return image
-
+        datapath = str(bundled_data_path(self))
+        bg_paint = None
         bg_color = None
         if isinstance(background, str) and len(background) > 0 and background[0] == "!":
             try:
@@ -518,54 +527,44 @@ class GoonMisc(commands.Cog):
             except ValueError:
                 pass
         if bg_color is not None:
-            bg = PIL.Image.open(datapath / "logo_bg_color.png")
-            executor = ThreadPoolExecutor(max_workers=1)
-            async with ctx.typing():
-                await asyncio.get_running_loop().run_in_executor(
-                    executor,
-                    self._pretty_paint,
-                    bg,
-                    PIL.ImageColor.getrgb("#eced42"),
-                    bg_color,
-                )
+            bg_type = "color"
+            bg_paint = bg_color
         elif isinstance(background, str) and background.lower() in [
             "goon",
             "goonstation",
             "default",
         ]:
-            bg = PIL.Image.open(datapath / "logo_bg_color.png").convert("RGBA")
+            bg_type = "goon"
         else:
-            bg = PIL.Image.open(datapath / "logo_bg.png").convert("RGBA")
+            bg_type = "paint"
             try:
-                bg_paint = await make_paint(background, 0)
+                bg_paint = await self.fetch_paint(ctx, background, 0)
             except ValueError:
                 return await ctx.send(f"Unknown background color {background}.")
-            except PIL.UnidentifiedImageError:
-                return await ctx.send(f"Cannot read background image.")
-            if bg_paint:
-                bg = PIL.ImageChops.multiply(bg, bg_paint.convert("RGBA"))
-            else:
+            except ImageFetchError as e:
+                return await ctx.send(f"Cannot fetch background image, {e}.")
+            if not bg_paint:
                 return await ctx.send(
                     "You need to provide either a colour or a picture (either as an URL or as an attachment or as a custom emoji or as a username)."
                 )
 
         try:
-            fg_paint = await make_paint(
-                background if len(ctx.message.attachments) > 0 else foreground, 1
+            fg_paint = await self.fetch_paint(
+                ctx, background if len(ctx.message.attachments) > 0 else foreground, 1
             )
         except ValueError:
             return await ctx.send(f"Unknown foreground color {foreground}.")
-        except PIL.UnidentifiedImageError:
-            return await ctx.send(f"Cannot read foreground image.")
-        if fg_paint:
-            fg = PIL.ImageChops.multiply(fg, fg_paint.convert("RGBA"))
-
-        bg.paste(fg.convert("RGB"), (0, 0), fg)
+        except ImageFetchError as e:
+            return await ctx.send(f"Cannot fetch foreground image, {e}.")
 
-        img_data = io.BytesIO()
-        bg.save(img_data, format="png")
-        img_data.seek(0)
-        img_file = discord.File(img_data, filename="logo.png")
+        async with ctx.typing():
+            try:
+                png = await self.render(
+                    compositing.render_logo, datapath, bg_type, bg_paint, fg_paint
+                )
+            except compositing.UnreadableImageError as e:
+                return await ctx.send(f"Cannot read {e.args[0]} image.")
+        img_file = discord.File(io.BytesIO(png), filename="logo.png")
         await ctx.send(file=img_file)
 
     @commands.command()
@@ -590,87 +589,17 @@ class GoonMisc(commands.Cog):
             flags = ""
         flags = flags.lower().split()
 
-        datapath = bundled_data_path(self)
-        bottom_img = PIL.Image.open(datapath / "shelterbottom.png").convert("RGBA")
-        top_img = PIL.Image.open(datapath / "sheltertop.png").convert("RGBA")
-        eyes_img = PIL.Image.open(datapath / "sheltereyes.png").convert("RGBA")
-        mouth_img = PIL.Image.open(datapath / "sheltermouth.png").convert("RGBA")
-
-        async def make_paint(arg, attachment_index):
-            img_bytes = None
-            if len(ctx.message.attachments) > attachment_index:
-                arg = ctx.message.attachments[attachment_index].url
-            if isinstance(arg, str) and arg.lower() in self.color_names:
-                arg = self.color_names[arg.lower()]
-            if arg is None:
-                return None
-            elif isinstance(arg, discord.Member):
-                img_bytes = await arg.avatar.replace(format="png").read()
-            elif isinstance(arg, discord.PartialEmoji):
-                img_bytes = await arg.read()
-            elif ord(arg[0]) > 127:
-                arg = "https://twemoji.maxcdn.com/v/latest/svg/{}.svg".format(
-                    "-".join(
-                        "{cp:x}".format(cp=ord(c)) for c in arg if ord(c) != 0xFE0F
-                    )
-                )
-            elif arg and "." not in arg:
-                return PIL.Image.new("RGBA", bottom_img.size, color=arg)
-            if arg is None and img_bytes is None:
-                return None
-            if img_bytes is None:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(arg) as response:
-                        img_bytes = (
-                            await response.read() if response.status == 200 else b""
-                        )
-                if arg.endswith(".svg") and len(img_bytes):
-                    img_bytes = cairosvg.svg2png(
-                        bytestring=img_bytes,
-                        parent_width=bottom_img.size[0],
-                        parent_height=bottom_img.size[1],
-                    )
-            image = PIL.Image.open(io.BytesIO(img_bytes))
-            scale_factors = [
-                bsize / isize for bsize, isize in zip(bottom_img.size, image.size)
-            ]
-            scale_factor = max(scale_factors)
-            if scale_factor != 1.0:
-                image = image.resize(
-                    (int(s * scale_factor) for s in image.size), PIL.Image.Resampling.BICUBIC
-                )
-            if image.size[0] != image.size[1]:
-                half_new_size = min(image.size) / 2
-                center_x = image.size[0] / 2
-                center_y = image.size[1] / 2
-                image = image.crop(
-                    (
-                        int(center_x - half_new_size),
-                        int(center_y - half_new_size),
-                        int(center_x + half_new_size),
-                        int(center_y + half_new_size),
-                    )
-                )
-            return image
+        datapath = str(bundled_data_path(self))
 
         if isinstance(bottom, str) and bottom.lower() in ["default", "shelter"]:
             bottom = "#cddfc1"
         try:
-            bottom_paint = await make_paint(bottom, 0)
+            bottom_paint = await self.fetch_paint(ctx, bottom, 0)
         except ValueError:
             return await ctx.send(f"Unknown bottom color {bottom}.")
-        except PIL.UnidentifiedImageError:
-            return await ctx.send(f"Cannot read bottom image.")
-        orig_bottom_paint = bottom_paint
-        if bottom_paint:
-            if "flipbottom" in flags:
-                bottom_paint = PIL.ImageOps.flip(bottom_paint)
-            if "mirrorbottom" in flags:
-                bottom_paint = PIL.ImageOps.mirror(bottom_paint)
-            bottom_img = PIL.ImageChops.multiply(
-                bottom_img, bottom_paint.convert("RGBA")
-            )
-        else:
+        except ImageFetchError as e:
+            return await ctx.send(f"Cannot fetch bottom image, {e}.")
+        if not bottom_paint:
             return await ctx.send(
                 "You need to provide either a colour or a picture (either as an URL or as an attachment or as a custom emoji or as a username)."
             )
@@ -678,35 +607,20 @@ class GoonMisc(commands.Cog):
         if isinstance(top, str) and top.lower() in ["default", "shelter"]:
             top = "#91b978"
         try:
-            top_paint = await make_paint(top, 1)
+            top_paint = await self.fetch_paint(ctx, top, 1)
         except ValueError:
             return await ctx.send(f"Unknown top color {top}.")
-        except PIL.UnidentifiedImageError:
-            return await ctx.send(f"Cannot read top image.")
-        if not top_paint:
-            top_paint = orig_bottom_paint
-
-        if "fliptop" in flags:
-            top_paint = PIL.ImageOps.flip(top_paint)
-        if "mirrortop" in flags:
-            top_paint = PIL.ImageOps.mirror(top_paint)
-        top_img = PIL.ImageChops.multiply(top_img, top_paint.convert("RGBA"))
-
-        bottom_img.paste(top_img.convert("RGB"), (0, 0), top_img)
-        if "noface" not in flags and "noeyes" not in flags:
-            bottom_img.paste(eyes_img.convert("RGB"), (0, 0), eyes_img)
-        if "noface" not in flags and "nomouth" not in flags:
-            bottom_img.paste(mouth_img.convert("RGB"), (0, 0), mouth_img)
-
-        if "flip" in flags:
-            bottom_img = PIL.ImageOps.flip(bottom_img)
-        if "mirror" in flags:
-            bottom_img = PIL.ImageOps.mirror(bottom_img)
-
-        img_data = io.BytesIO()
-        bottom_img.save(img_data, format="png")
-        img_data.seek(0)
-        img_file = discord.File(img_data, filename="shelterfrog.png")
+        except ImageFetchError as e:
+            return await ctx.send(f"Cannot fetch top image, {e}.")
+
+        async with ctx.typing():
+            try:
+                png = await self.render(
+                    compositing.render_frog, datapath, bottom_paint, top_paint, flags
+                )
+            except compositing.UnreadableImageError as e:
+                return await ctx.send(f"Cannot read {e.args[0]} image.")
+        img_file = discord.File(io.BytesIO(png), filename="shelterfrog.png")
         await ctx.send(file=img_file)
 
     @commands.command()
@@ -747,9 +661,10 @@ class GoonMisc(commands.Cog):
             await ctx.send(result)
 
     def closest_color_name(self, rgb: Tuple[int, int, int]):
-        lab = rgb_to_lab(rgb)
-        min_dist, name, col = min((euclidean_dist(lab, rgb_to_lab(color_parse_hex(col))), name, col) for name, col in self.color_names.items())
-        return (min_dist, name, col)
+        return self.color_index.closest(rgb)
+
+    def closest_color_names(self, rgbs: Sequence[Tuple[int, int, int]]):
+        return self.color_index.closest_many(rgbs)
 
     @commands.command(aliases=["colourname"])
     async def colorname(self, ctx: commands.Context, color_hex: str):
@@ -758,6 +673,42 @@ class GoonMisc(commands.Cog):
         min_dist, name, col = self.closest_color_name(rgb)
         await ctx.send(f"Closest color name to {color_hex} is `{name}` (`{col}`) with distance {min_dist:.2f}.")
 
+    def _dominant_colors(self, img_bytes: bytes, count: int):
+        image = PIL.Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        image.thumbnail((256, 256))
+        quantized = image.quantize(colors=count)
+        palette = quantized.getpalette()
+        total = image.size[0] * image.size[1]
+        colors = sorted(quantized.getcolors(), reverse=True)
+        rgbs = [tuple(palette[i * 3:i * 3 + 3]) for _, i in colors]
+        return [(pixels / total, rgb) for (pixels, _), rgb in zip(colors, rgbs)]
+
+    @commands.command(aliases=["colourpalette"])
+    async def colorpalette(self, ctx: commands.Context, url: Optional[str] = None, count: int = 5):
+        """Names the dominant colours of an image (attachment or URL)."""
+        if not 1 <= count <= 16:
+            return await ctx.send("Count needs to be between 1 and 16.")
+        if len(ctx.message.attachments) > 0:
+            url = ctx.message.attachments[0].url
+        if not url:
+            return await ctx.send("You need to provide an image either as an URL or as an attachment.")
+        try:
+            _, img_bytes = await self.image_cache.fetch(url)
+        except ImageFetchError as e:
+            return await ctx.send(f"Cannot fetch that image, {e}.")
+        async with ctx.typing():
+            try:
+                colors = await asyncio.get_running_loop().run_in_executor(
+                    None, self._dominant_colors, img_bytes, count
+                )
+            except PIL.UnidentifiedImageError:
+                return await ctx.send("Cannot read that image.")
+        names = self.closest_color_names([rgb for _, rgb in colors])
+        lines = []
+        for (share, rgb), (_, name, _) in zip(colors, names):
+            lines.append(f"`#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}` {name} ({share:.0%})")
+        await ctx.send("\n".join(lines))
+
     def parse_triple(self, text: str) -> Union[Tuple[int, int, int], Tuple[float, float, float]]:
         text = text.strip()
         try:
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import aiohttp
+from collections import OrderedDict
+from pathlib import Path
+from typing import *
+
+log = logging.getLogger("red.goon.goonmisc")
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class ImageCache:
+    """Downloads of user supplied images, cached in memory and on disk.
+
+    Blobs are stored by the SHA-256 of their content and URLs map to those digests,
+    so the same image behind several URLs is kept once. Both tiers are LRU bounded
+    by total bytes. A URL is downloaded again once its mapping is older than
+    `url_ttl` seconds since the image behind it may have changed, blobs themselves
+    don't expire. Downloads are streamed and aborted once they exceed
+    `max_download` and concurrent fetches of one URL share a single download.
+    `get_session` returns the session to download with."""
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        path: Path,
+        get_session: Callable[[], aiohttp.ClientSession],
+        memory_budget: int = 32 * 1024 * 1024,
+        disk_budget: int = 256 * 1024 * 1024,
+        max_download: int = 8 * 1024 * 1024,
+        url_ttl: float = 6 * 60 * 60,
+    ):
+        self.path = Path(path)
+        self.get_session = get_session
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.max_download = max_download
+        self.url_ttl = url_ttl
+        self.url_digests = OrderedDict()
+        self.blobs = OrderedDict()
+        self.memory_size = 0
+        self.disk_size = None
+        # write_disk runs on executor threads, this guards disk_size and blob eviction
+        self.disk_lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "downloads": 0, "deduped": 0}
+
+    def close(self):
+        for task in self.in_flight.values():
+            task.cancel()
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.path / "blobs" / digest
+
+    def url_path(self, url: str) -> Path:
+        return self.path / "urls" / self.url_key(url)
+
+    async def fetch(self, url: str) -> Tuple[str, bytes]:
+        """Returns (digest, content) of the image at `url`."""
+        digest, stored_at = self.url_digests.get(url, (None, None))
+        if digest is not None and time.monotonic() - stored_at > self.url_ttl:
+            del self.url_digests[url]
+        elif digest is not None and digest in self.blobs:
+            self.url_digests.move_to_end(url)
+            self.blobs.move_to_end(digest)
+            self.stats["memory_hits"] += 1
+            return digest, self.blobs[digest]
+        task = self.in_flight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._fetch(url))
+            self.in_flight[url] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(url, None))
+        else:
+            self.stats["deduped"] += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str) -> Tuple[str, bytes]:
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.read_disk, url)
+        if cached is not None:
+            self.stats["disk_hits"] += 1
+            digest, content, age = cached
+        else:
+            content = await self.download(url)
+            digest = hashlib.sha256(content).hexdigest()
+            await loop.run_in_executor(None, self.write_disk, url, digest, content)
+            self.stats["downloads"] += 1
+            age = 0
+        self.remember(url, digest, content, time.monotonic() - age)
+        return digest, content
+
+    async def download(self, url: str) -> bytes:
+        try:
+            async with self.get_session().get(url) as response:
+                if response.status != 200:
+                    raise ImageFetchError(f"the server responded with {response.status}")
+                if (response.content_length or 0) > self.max_download:
+                    raise ImageFetchError("the file is too large")
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_download:
+                        raise ImageFetchError("the file is too large")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise ImageFetchError("the download failed") from e
+
+    def remember(self, url: str, digest: str, content: bytes, stored_at: float):
+        self.url_digests[url] = (digest, stored_at)
+        self.url_digests.move_to_end(url)
+        if digest not in self.blobs:
+            self.blobs[digest] = content
+            self.memory_size += len(content)
+        self.blobs.move_to_end(digest)
+        while self.memory_size > self.memory_budget and len(self.blobs) > 1:
+            _, evicted = self.blobs.popitem(last=False)
+            self.memory_size -= len(evicted)
+        # URLs pointing to evicted blobs are cheap to keep but shouldn't grow forever
+        while len(self.url_digests) > 4 * max(len(self.blobs), 64):
+            self.url_digests.popitem(last=False)
+
+    def read_disk(self, url: str) -> Optional[Tuple[str, bytes, float]]:
+        """Returns the digest and content of a URL along with the age of its mapping."""
+        try:
+            url_path = self.url_path(url)
+            age = time.time() - url_path.stat().st_mtime
+            if age > self.url_ttl:
+                return None
+            digest = url_path.read_text().strip()
+            blob_path = self.blob_path(digest)
+            content = blob_path.read_bytes()
+            os.utime(blob_path)
+        except (OSError, ValueError):
+            return None
+        return digest, content, age
+
+    def write_disk(self, url: str, digest: str, content: bytes):
+        try:
+            blob_path = self.blob_path(digest)
+            with self.disk_lock:
+                if not blob_path.exists():
+                    blob_path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = blob_path.with_suffix(".tmp")
+                    tmp_path.write_bytes(content)
+                    tmp_path.replace(blob_path)
+                    if self.disk_size is not None:
+                        self.disk_size += len(content)
+            url_path = self.url_path(url)
+            url_path.parent.mkdir(parents=True, exist_ok=True)
+            url_path.write_text(digest)
+            with self.disk_lock:
+                self.trim_disk()
+        except OSError:
+            log.exception("Failed to write to the image cache")
+
+    def trim_disk(self):
+        """Deletes the least recently used blobs until the disk tier fits its budget, call with `disk_lock` held."""
+        blobs_dir = self.path / "blobs"
+        if self.disk_size is not None and self.disk_size <= self.disk_budget:
+            return
+        entries = []
+        for entry in os.scandir(blobs_dir):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        self.disk_size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self.disk_size <= self.disk_budget:
+                break
+            os.remove(path)
+            self.disk_size -= size
+        # URL entries of deleted blobs simply miss on the next read
@@ -1,8 +1,12 @@
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 from .goonservers import GoonServers
 
 
 async def setup(bot: Red):
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
     cog = GoonServers(bot)
     await bot.add_cog(cog)
     await cog.reload_config()
+    cog.start_status_poller()
@@ -11,38 +11,105 @@ import datetime
 import random
 from collections import OrderedDict
 import functools
+import copy
 import json
+import time
+import logging
 import aiohttp
+from .outbox import Outbox
+
+log = logging.getLogger("red.goon.goonservers")
 
 
 class UnknownServerError(Exception):
     pass
 
 
+class WhoisEntry(NamedTuple):
+    name: str
+    ckey: str
+    role: str
+    dead: bool
+    traitor: bool
+
+
+def parse_indexed(response, count_key, prefix, start=0):
+    count = int(response[count_key])
+    return [response[f"{prefix}{i}"] for i in range(start, start + count)]
+
+
+def parse_players(response):
+    return parse_indexed(response, "players", "player")
+
+
+def parse_admins(response):
+    # admins with ~ are stealthed
+    return [
+        admin
+        for admin in parse_indexed(response, "admins", "admin")
+        if not admin.startswith("~")
+    ]
+
+
+def parse_mentors(response):
+    return parse_indexed(response, "mentors", "mentor")
+
+
+def parse_whois(response):
+    result = []
+    for i in range(1, int(response["count"]) + 1):
+        result.append(
+            WhoisEntry(
+                name=response.get(f"name{i}", "-"),
+                ckey=response.get(f"ckey{i}", "-"),
+                role=response.get(f"role{i}", "jobless"),
+                dead=bool(response.get(f"dead{i}")),
+                traitor=bool(response.get(f"t{i}")),
+            )
+        )
+    return result
+
+
+class TopicQuery:
+    """A world topic message together with the function turning its response into a typed result."""
+
+    def __init__(self, message, parse=None, to_dict=True):
+        self.message = message
+        self.parse = parse
+        self.to_dict = to_dict
+
+    def parse_result(self, result):
+        if self.parse is None:
+            return result
+        return self.parse(result)
+
+
 class Subtype:
     def __init__(self, name, data, cog):
         self.name = name
+        self.cog = cog
         self.channels = {}
         for name, channel_ids in data["channels"].items():
             self.channels[name] = cog.channel_trans(channel_ids)
         self.servers = []
 
-    async def send_to_channel(self, channel, content=None, *args, **kwargs):
+    def send_to_channel(self, channel, content=None, **kwargs):
+        """Queues the message in the outbox, short text messages may get combined with others."""
         if isinstance(content, str):
-            for page in pagify(content):
-                await channel.send(content=page, *args, **kwargs)
-        else:
-            await channel.send(content=content, *args, **kwargs)
+            return [
+                self.cog.outbox.enqueue(channel, page, coalesce=True, **kwargs)
+                for page in pagify(content)
+            ]
+        return [self.cog.outbox.enqueue(channel, content, **kwargs)]
 
     async def channel_broadcast(
         self, bot, channel_type, *args, exception=None, **kwargs
     ):
-        tasks = [
-            self.send_to_channel(bot.get_channel(ch), *args, **kwargs)
-            for ch in self.channels[channel_type]
-            if ch != exception
-        ]
-        await asyncio.gather(*tasks)
+        futures = []
+        for ch in self.channels[channel_type]:
+            if ch != exception:
+                futures.extend(self.send_to_channel(ch, *args, **kwargs))
+        return await asyncio.gather(*futures)
 
 
 class Server:
@@ -110,12 +177,108 @@ class GoonServers(commands.Cog):
     COLOR_GOON = discord.Colour.from_rgb(222, 190, 49)
     COLOR_OTHER = discord.Colour.from_rgb(130, 130, 222)
     COLOR_ERROR = discord.Colour.from_rgb(220, 150, 150)
+    QUERY_PLAYERS = TopicQuery("status", parse_players)
+    QUERY_ADMINS = TopicQuery("admins", parse_admins)
+    QUERY_MENTORS = TopicQuery("mentors", parse_mentors)
+    QUERY_ANTAGS = TopicQuery({"type": "antags"}, parse_whois)
+
+    @staticmethod
+    def whois_query(target):
+        return TopicQuery({"type": "whois", "target": target}, parse_whois)
 
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
 
         self.config = Config.get_conf(self, identifier=66217843218752)
-        self.config.register_global(servers=[], categories={}, channels={}, subtypes={})
+        self.config.register_global(
+            servers=[],
+            categories={},
+            channels={},
+            subtypes={},
+            status_poll_period=15,
+            status_max_age=30,
+        )
+        self.status_cache = {}
+        self.status_in_flight = {}
+        self.status_poll_task = None
+        self.outbox = Outbox(bot)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
+
+    def cog_unload(self):
+        if self.status_poll_task is not None:
+            self.status_poll_task.cancel()
+        self.outbox.close()
+        self.http.close()
+
+    def start_status_poller(self):
+        if self.status_poll_task is not None:
+            self.status_poll_task.cancel()
+        self.status_poll_task = asyncio.create_task(self.status_poll_loop())
+
+    async def status_poll_loop(self):
+        while True:
+            period = await self.config.status_poll_period()
+            if not period:
+                break
+            try:
+                await self.poll_statuses()
+            except asyncio.CancelledError:
+                break
+            except:
+                log.exception("Error in GoonServers status poller")
+            try:
+                await asyncio.sleep(period)
+            except asyncio.CancelledError:
+                break
+
+    async def poll_statuses(self):
+        worldtopic = self.bot.get_cog("WorldTopic")
+        if worldtopic is None:
+            return
+        await asyncio.gather(
+            *(self.refresh_status_info(s, worldtopic) for s in self.servers)
+        )
+
+    def cached_status_info(self, server, max_age=None):
+        """Returns the last polled status of a server if it's not older than `max_age` seconds."""
+        entry = self.status_cache.get((server.host, server.port))
+        if entry is None:
+            return None
+        timestamp, status_info = entry
+        if max_age is not None and time.monotonic() - timestamp > max_age:
+            return None
+        return status_info
+
+    async def refresh_status_info(self, server, worldtopic):
+        # concurrent refreshes of the same server share a single world topic round
+        key = (server.host, server.port)
+        future = self.status_in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._refresh_status_info(server, worldtopic, key)
+            )
+            self.status_in_flight[key] = future
+        return await asyncio.shield(future)
+
+    async def _refresh_status_info(self, server, worldtopic, key):
+        try:
+            status_info = await self.get_status_info(server, worldtopic)
+            self.status_cache[key] = (time.monotonic(), status_info)
+            return status_info
+        finally:
+            self.status_in_flight.pop(key, None)
+
+    async def get_status_info_cached(self, server, worldtopic, max_age=None):
+        if max_age is None:
+            max_age = await self.config.status_max_age()
+        status_info = self.cached_status_info(server, max_age)
+        if status_info is not None:
+            return status_info
+        return await self.refresh_status_info(server, worldtopic)
 
     @functools.lru_cache
     def channel_to_subtypes(self, channel_id, usage):
@@ -193,15 +356,75 @@ class GoonServers(commands.Cog):
             result = worldtopic.params_to_dict(result)
         return result
 
+    async def send_query(self, server, query):
+        result = await self.send_to_server(
+            server, copy.copy(query.message), to_dict=query.to_dict
+        )
+        return query.parse_result(result)
+
+    async def send_batch_to_server(self, server, queries):
+        """Sends several queries to one server concurrently over its pooled connections.
+
+        `queries` maps names to `TopicQuery` objects, the result maps the same names
+        to parsed results or to the exception the query failed with."""
+        if isinstance(server, str):
+            server = self.resolve_server(server)
+        if server is None:
+            raise UnknownServerError()
+        names = list(queries)
+        results = await asyncio.gather(
+            *(self.send_query(server, queries[name]) for name in names),
+            return_exceptions=True,
+        )
+        return dict(zip(names, results))
+
+    async def send_batch_to_server_safe(self, server, queries, messageable):
+        """Like `send_batch_to_server` but reports the first failure to `messageable` and returns None instead."""
+        error_fn = self._error_fn(messageable)
+        try:
+            results = await self.send_batch_to_server(server, queries)
+        except UnknownServerError:
+            await error_fn("Unknown server.")
+            return None
+        for result in results.values():
+            if isinstance(result, BaseException):
+                await error_fn(self.error_message(result))
+                return None
+        return results
+
+    async def send_query_safe(self, server, query, messageable):
+        """Like `send_query` but reports a failure to `messageable` and returns None instead."""
+        error_fn = self._error_fn(messageable)
+        try:
+            return await self.send_query(server, query)
+        except Exception as e:
+            await error_fn(self.error_message(e))
+            return None
+
+    def error_message(self, exception):
+        if isinstance(exception, UnknownServerError):
+            return "Unknown server."
+        if isinstance(exception, ConnectionRefusedError):
+            return "Server offline."
+        if isinstance(exception, ConnectionResetError):
+            return "Server restarting."
+        if isinstance(exception, asyncio.TimeoutError):
+            return "Server restarting or offline."
+        if isinstance(exception, (KeyError, ValueError, TypeError)):
+            return "That server is not responding correctly."
+        raise exception
+
+    def _error_fn(self, messageable):
+        if hasattr(messageable, "reply"):
+            return messageable.reply
+        elif hasattr(messageable, "send"):
+            return messageable.send
+        return None
+
     async def send_to_server_safe(
         self, server, message, messageable, to_dict=False, react_success=False
     ):
-        worldtopic = self.bot.get_cog("WorldTopic")
-        error_fn = None
-        if hasattr(messageable, "reply"):
-            error_fn = messageable.reply
-        elif hasattr(messageable, "send"):
-            error_fn = messageable.send
+        error_fn = self._error_fn(messageable)
         try:
             result = await self.send_to_server(server, message, to_dict=to_dict)
         except UnknownServerError:
@@ -264,8 +487,12 @@ class GoonServers(commands.Cog):
         result["url"] = server.url
         result["type"] = server.type
         result["error"] = None
+        result["raw"] = None
         try:
-            response = await worldtopic.send((server.host, server.port), "status")
+            response = await worldtopic.send((server.host, server.port), "status", adaptive=True)
+        except worldtopic.ServerUnavailableError:
+            result["error"] = "Server offline (cached)."
+            return result
         except (asyncio.exceptions.TimeoutError, TimeoutError) as e:
             result["error"] = "Server not responding."
             return result
@@ -280,8 +507,11 @@ class GoonServers(commands.Cog):
             return result
         status = worldtopic.params_to_dict(response)
         if len(response) < 20 or ("players" in status and len(status["players"]) > 5):
-            response = await worldtopic.send((server.host, server.port), "status&format=json")
+            response = await worldtopic.send(
+                (server.host, server.port), "status&format=json", adaptive=True
+            )
             status = json.loads(response)
+        result["raw"] = status
         result["station_name"] = status.get("station_name")
         try:
             result["players"] = int(status["players"]) if "players" in status else None
@@ -370,7 +600,9 @@ class GoonServers(commands.Cog):
         servers = self.resolve_server_or_category(name)
         if not servers:
             return await ctx.send("Unknown server.")
-        futures = [asyncio.Task(self.get_status_info(s, worldtopic)) for s in servers]
+        futures = [
+            asyncio.Task(self.get_status_info_cached(s, worldtopic)) for s in servers
+        ]
         done, pending = [], futures
         message = None
         async with ctx.typing():
@@ -417,7 +649,9 @@ class GoonServers(commands.Cog):
         if not servers:
             return await ctx.send("Unknown server.")
         single_server_embed = len(servers) == 1
-        futures = [asyncio.Task(self.get_status_info(s, worldtopic)) for s in servers]
+        futures = [
+            asyncio.Task(self.get_status_info_cached(s, worldtopic)) for s in servers
+        ]
         done, pending = [], futures
         message = None
         all_goon = all(server.type == "goon" for server in servers)
@@ -447,6 +681,51 @@ class GoonServers(commands.Cog):
                 else:
                     await message.edit(embed=embed)
 
+    @commands.command()
+    @checks.is_owner()
+    async def statuspoll(
+        self,
+        ctx: commands.Context,
+        period: Optional[int] = None,
+        max_age: Optional[int] = None,
+    ):
+        """Shows or sets the background status poll period and the maximum age of status data used by commands.
+
+        Period of 0 disables the poller."""
+        if period is None:
+            period = await self.config.status_poll_period()
+            max_age = await self.config.status_max_age()
+            now = time.monotonic()
+            ages = [now - timestamp for timestamp, _ in self.status_cache.values()]
+            oldest = f"{max(ages):.1f}s" if ages else "N/A"
+            await ctx.send(
+                f"Poll period: {period}s, max age: {max_age}s, cached servers: {len(ages)}, oldest entry: {oldest}"
+            )
+            return
+        await self.config.status_poll_period.set(period)
+        if max_age is not None:
+            await self.config.status_max_age.set(max_age)
+        self.start_status_poller()
+        await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
+
+    @commands.command()
+    @checks.is_owner()
+    async def outboxstats(self, ctx: commands.Context):
+        """Shows queue depth, throughput and latency of outgoing relay messages per channel."""
+        lines = []
+        for channel_id, stats in self.outbox.stats().items():
+            latency = "N/A"
+            if stats["latency_ewma"] is not None:
+                latency = f"{stats['latency_ewma'] * 1000:.0f}ms (max {stats['latency_max'] * 1000:.0f}ms)"
+            lines.append(
+                f"<#{channel_id}> queued: {stats['depth']} sent: {stats['sent']} "
+                f"coalesced: {stats['coalesced']} failed: {stats['failed']} latency: {latency}"
+            )
+        if not lines:
+            lines.append("Nothing sent yet.")
+        for page in pagify("\n".join(lines)):
+            await ctx.send(page)
+
     async def _check_gimmick_oven(self, ctx: commands.Context):
         ts = int(datetime.datetime.now().timestamp())
         ts += random.randint(1, 60 * 60)
@@ -458,10 +737,9 @@ class GoonServers(commands.Cog):
     async def _check_gimmick_goonhub(self, ctx: commands.Context):
         URL = "https://goonhub.com"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(URL) as response:
-                    if response.status < 400:
-                        return "https://goonhub.com is online, yay"
+            async with self.session.head(URL) as response:
+                if response.status < 400:
+                    return "https://goonhub.com is online, yay"
         except aiohttp.ClientError:
             pass
         return "https://goonhub.com is offline, oh no"
@@ -469,10 +747,9 @@ class GoonServers(commands.Cog):
     async def _check_gimmick_byond(self, ctx: commands.Context):
         URL = "http://www.byond.com/download/build"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(URL) as response:
-                    if response.status < 400:
-                        return "http://www.byond.com is online, yay"
+            async with self.session.head(URL) as response:
+                if response.status < 400:
+                    return "http://www.byond.com is online, yay"
         except aiohttp.ClientError:
             pass
         return "http://www.byond.com is offline, oh no"
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import *
+import discord
+
+log = logging.getLogger("red.goon.goonservers")
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, takes it right away if it's zero."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+
+class OutboxItem:
+    __slots__ = ("content", "kwargs", "reference", "on_sent", "coalesce", "future", "enqueued")
+
+    def __init__(self, content, kwargs, reference, on_sent, coalesce):
+        self.content = content
+        self.kwargs = kwargs
+        self.reference = reference
+        self.on_sent = on_sent
+        self.coalesce = coalesce
+        self.future = asyncio.get_running_loop().create_future()
+        self.future.add_done_callback(_consume_exception)
+        self.enqueued = time.monotonic()
+
+
+def _consume_exception(future):
+    # failures are logged by the worker, callers not awaiting the result shouldn't trigger warnings
+    if not future.cancelled():
+        future.exception()
+
+
+class ChannelQueue:
+    def __init__(self, bucket: TokenBucket):
+        self.items = deque()
+        self.bucket = bucket
+        self.worker = None
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.latency_ewma = None
+        self.latency_max = 0
+
+
+class Outbox:
+    """Sends Discord messages through per-channel queues.
+
+    Each channel gets a worker draining its queue in order while a token bucket
+    keeps it under Discord's per-channel rate limit. Short plain text messages
+    enqueued with `coalesce=True` that pile up behind the limit are combined
+    into a single post."""
+
+    BUCKET_CAPACITY = 5
+    BUCKET_REFILL_RATE = 1
+    MAX_MESSAGE_LENGTH = 2000
+    LATENCY_EWMA_ALPHA = 0.2
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.queues = {}
+
+    def close(self):
+        for queue in self.queues.values():
+            if queue.worker is not None:
+                queue.worker.cancel()
+            for item in queue.items:
+                item.future.cancel()
+        self.queues.clear()
+
+    def enqueue(
+        self,
+        channel: Union[int, discord.abc.Messageable],
+        content: Optional[str] = None,
+        *,
+        reference=None,
+        on_sent: Optional[Callable[[discord.Message], None]] = None,
+        coalesce: bool = False,
+        **kwargs,
+    ) -> asyncio.Future:
+        """Queues a message and returns a future resolving to the sent `discord.Message`.
+
+        `reference` can also be a callable returning the reference, it's resolved right
+        before sending. The worker doesn't yield between resolving one message's future
+        and sending the next, so anything a later callable reference depends on has to
+        be recorded in `on_sent`, which runs with the sent message before the future
+        resolves."""
+        channel_id = channel if isinstance(channel, int) else channel.id
+        queue = self.queues.get(channel_id)
+        if queue is None:
+            queue = ChannelQueue(TokenBucket(self.BUCKET_CAPACITY, self.BUCKET_REFILL_RATE))
+            self.queues[channel_id] = queue
+        item = OutboxItem(content, kwargs, reference, on_sent, coalesce and not kwargs)
+        queue.items.append(item)
+        if queue.worker is None or queue.worker.done():
+            queue.worker = asyncio.create_task(self.run_queue(channel_id, queue))
+        return item.future
+
+    async def send(self, channel, content=None, **kwargs):
+        return await self.enqueue(channel, content, **kwargs)
+
+    def take_batch(self, queue: ChannelQueue) -> List[OutboxItem]:
+        batch = [queue.items.popleft()]
+        if not batch[0].coalesce or batch[0].reference is not None:
+            return batch
+        length = len(batch[0].content or "")
+        while queue.items:
+            item = queue.items[0]
+            if not item.coalesce or item.reference is not None:
+                break
+            length += 1 + len(item.content or "")
+            if length > self.MAX_MESSAGE_LENGTH:
+                break
+            batch.append(queue.items.popleft())
+        return batch
+
+    async def run_queue(self, channel_id: int, queue: ChannelQueue):
+        while queue.items:
+            wait = queue.bucket.wait_time()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = queue.bucket.wait_time()
+            batch = self.take_batch(queue)
+            first = batch[0]
+            try:
+                channel = self.bot.get_channel(channel_id)
+                if channel is None:
+                    raise ValueError(f"Unknown channel {channel_id}.")
+                reference = first.reference
+                if callable(reference):
+                    reference = reference()
+                if len(batch) == 1:
+                    content = first.content
+                else:
+                    content = "\n".join(item.content or "" for item in batch)
+                    queue.coalesced += len(batch) - 1
+                message = await channel.send(content, reference=reference, **first.kwargs)
+            except asyncio.CancelledError:
+                for item in batch:
+                    item.future.cancel()
+                raise
+            except Exception as e:
+                log.exception(f"Failed to send a message to channel {channel_id}")
+                queue.failed += len(batch)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            queue.sent += 1
+            now = time.monotonic()
+            for item in batch:
+                latency = now - item.enqueued
+                queue.latency_max = max(queue.latency_max, latency)
+                if queue.latency_ewma is None:
+                    queue.latency_ewma = latency
+                else:
+                    queue.latency_ewma += self.LATENCY_EWMA_ALPHA * (latency - queue.latency_ewma)
+                if item.on_sent is not None:
+                    try:
+                        item.on_sent(message)
+                    except Exception:
+                        log.exception(f"Failed to record a message sent to channel {channel_id}")
+                if not item.future.done():
+                    item.future.set_result(message)
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        return {
+            channel_id: {
+                "depth": len(queue.items),
+                "sent": queue.sent,
+                "coalesced": queue.coalesced,
+                "failed": queue.failed,
+                "latency_ewma": queue.latency_ewma,
+                "latency_max": queue.latency_max,
+            }
+            for channel_id, queue in self.queues.items()
+        }
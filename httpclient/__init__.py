@@ -0,0 +1,7 @@
+from redbot.core.bot import Red
+from .httpclient import HttpClient
+
+
+async def setup(bot: Red):
+    cog = HttpClient(bot)
+    await bot.add_cog(cog)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from collections import deque
+from redbot.core import commands, checks
+from redbot.core.bot import Red
+from redbot.core.utils.chat_formatting import box, pagify
+from typing import *
+
+log = logging.getLogger("red.goon.httpclient")
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "elapsed", "latencies")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.latencies = deque(maxlen=256)
+
+    def record(self, elapsed: float, error: bool):
+        self.requests += 1
+        self.errors += error
+        self.elapsed += elapsed
+        self.latencies.append(elapsed)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class HttpClient(commands.Cog):
+    """Shared HTTP connection pool for the other cogs.
+
+    Cogs get their own `aiohttp.ClientSession` from `session_for(cog)`, so cookies
+    and default headers stay separate, but all sessions share one connector. That
+    gives keepalive across cogs, a cached DNS, a per-host connection limit and one
+    set of default timeouts. Request counts and latencies are kept per host.
+
+    Cogs using it refuse to load without it and keep a `SessionHandle` from
+    `handle_for(cog)`, which keeps working while this cog is unloaded or reloaded.
+    On unload the connector stays open until requests already running have hit
+    the total timeout."""
+
+    LIMIT = 64
+    LIMIT_PER_HOST = 8
+    KEEPALIVE_TIMEOUT = 30
+    DNS_CACHE_TTL = 5 * 60
+    TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10, sock_connect=10)
+
+    def __init__(self, bot: Red):
+        self.bot = bot
+        self.connector = aiohttp.TCPConnector(
+            limit=self.LIMIT,
+            limit_per_host=self.LIMIT_PER_HOST,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+        )
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_request_end.append(self._on_request_end)
+        self.trace_config.on_request_exception.append(self._on_request_exception)
+        self.trace_config.on_connection_create_end.append(self._on_connection_create)
+        self.trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        self.sessions = {}
+        self.host_stats = {}
+        self.connections = {"created": 0, "reused": 0}
+
+    def cog_unload(self):
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        asyncio.create_task(self.close(sessions))
+
+    async def close(self, sessions: List[aiohttp.ClientSession]):
+        # closed sessions take no new requests but ones in progress keep their connection
+        for session in sessions:
+            await session.close()
+        await asyncio.sleep(self.TIMEOUT.total)
+        await self.connector.close()
+
+    @staticmethod
+    def owner_name(owner) -> str:
+        return owner if isinstance(owner, str) else owner.qualified_name
+
+    def session_for(self, owner) -> aiohttp.ClientSession:
+        """The session of a cog (or any other name), created on first use."""
+        name = self.owner_name(owner)
+        session = self.sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=self.connector,
+                connector_owner=False,
+                timeout=self.TIMEOUT,
+                trace_configs=[self.trace_config],
+            )
+            self.sessions[name] = session
+        return session
+
+    def release(self, owner):
+        """Closes the session of a cog (or any other name)."""
+        session = self.sessions.pop(self.owner_name(owner), None)
+        if session is not None:
+            asyncio.create_task(session.close())
+
+    def handle_for(self, owner: commands.Cog) -> "SessionHandle":
+        return SessionHandle(self.bot, owner)
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    def _record(self, ctx, url, error: bool):
+        stats = self.host_stats.get(url.host)
+        if stats is None:
+            stats = self.host_stats[url.host] = HostStats()
+        stats.record(time.perf_counter() - ctx.start, error)
+
+    async def _on_request_end(self, session, ctx, params):
+        self._record(ctx, params.url, params.response.status >= 500)
+
+    async def _on_request_exception(self, session, ctx, params):
+        self._record(ctx, params.url, True)
+
+    async def _on_connection_create(self, session, ctx, params):
+        self.connections["created"] += 1
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.connections["reused"] += 1
+
+    @checks.is_owner()
+    @commands.command()
+    async def httpstats(self, ctx: commands.Context):
+        """Shows request counts and latencies of outgoing HTTP requests per host."""
+        if not self.host_stats:
+            await ctx.send("No HTTP requests made yet.")
+            return
+        lines = [f"{'host':<32} {'reqs':>6} {'errs':>5} {'p50 ms':>8} {'p99 ms':>8}"]
+        for host, stats in sorted(self.host_stats.items(), key=lambda item: -item[1].requests):
+            lines.append(
+                f"{host[:32]:<32} {stats.requests:>6} {stats.errors:>5} "
+                f"{stats.percentile(50) * 1000:>8.1f} {stats.percentile(99) * 1000:>8.1f}"
+            )
+        lines.append("")
+        lines.append(
+            f"connections: {self.connections['created']} opened, {self.connections['reused']} reused, "
+            f"{len(self.sessions)} sessions"
+        )
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
+
+
+class SessionHandle:
+    """How a cog gets its HTTP session, made by `HttpClient.handle_for(cog)`.
+
+    `session` is the cog's session from the HttpClient cog. While that isn't loaded
+    it is a private session instead, so requests keep working across an unload or
+    reload of HttpClient. Call `close` from the owner's `cog_unload`."""
+
+    def __init__(self, bot: Red, owner: commands.Cog):
+        self.bot = bot
+        self.owner = owner
+        self.fallback = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        httpclient = self.bot.get_cog("HttpClient")
+        if httpclient is not None:
+            return httpclient.session_for(self.owner)
+        if self.fallback is None or self.fallback.closed:
+            log.warning("HttpClient isn't loaded, %s uses a private session", self.owner.qualified_name)
+            self.fallback = aiohttp.ClientSession(timeout=HttpClient.TIMEOUT)
+        return self.fallback
+
+    def close(self):
+        httpclient = self.bot.get_cog("HttpClient")
+        if httpclient is not None:
+            httpclient.release(self.owner)
+        if self.fallback is not None:
+            asyncio.create_task(self.fallback.close())
+            self.fallback = None
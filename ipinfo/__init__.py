@@ -1,7 +1,10 @@
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 from .ipinfo import IPInfo
 
 
 async def setup(bot: Red):
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
     cog = IPInfo(bot)
     await bot.add_cog(cog)
@@ -10,10 +10,14 @@ from typing import *
 class IPInfo(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
+        self.http = bot.get_cog("HttpClient").handle_for(self)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     @checks.admin()
     @commands.command()
@@ -1,6 +1,11 @@
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 from .loudvideos import LoudVideos
 
 
 async def setup(bot: Red):
-    await bot.add_cog(LoudVideos(bot))
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
+    cog = LoudVideos(bot)
+    await bot.add_cog(cog)
+    cog.analyzer.start()
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import math
+import os
+import tempfile
+import time
+import aiohttp
+import numpy as np
+from collections import OrderedDict
+from typing import *
+import yt_dlp
+
+class TooLargeError(Exception):
+    pass
+
+
+class VolumeResult(NamedTuple):
+    mean_volume: Optional[float]
+    max_volume: Optional[float]
+    seconds_decoded: float = 0
+    bytes_decoded: int = 0
+    elapsed: float = 0
+    stop_reason: Optional[str] = None
+
+
+class LoudnessMeter:
+    """Running mean power and peak of 16-bit PCM, in dBFS like ffmpeg's volumedetect."""
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.sum_squares = 0.0
+        self.samples = 0
+        self.peak = 0.0
+
+    def add(self, pcm: bytes):
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float64) / 32768
+        if not len(samples):
+            return
+        self.sum_squares += float(np.dot(samples, samples))
+        self.samples += len(samples)
+        self.peak = max(self.peak, float(np.abs(samples).max()))
+
+    @property
+    def seconds(self) -> float:
+        return self.samples / self.sample_rate
+
+    @staticmethod
+    def to_db(value: float, factor: int) -> float:
+        return round(factor * math.log10(value), 1) if value > 0 else -math.inf
+
+    @property
+    def mean_volume(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return self.to_db(self.sum_squares / self.samples, 10)
+
+    @property
+    def max_volume(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return self.to_db(self.peak, 20)
+
+
+class VolumeAnalyzer:
+    """Measures the volume of videos with ffmpeg without blocking the event loop.
+
+    Jobs go through a bounded queue to a fixed number of workers. Each worker streams
+    the download straight into ffmpeg's stdin and measures the decoded PCM as it
+    arrives, stopping as soon as the video is clearly loud or the time budget is
+    spent. Results are cached by URL (without the query string, which Discord uses
+    for signing) and by the hash of the file's first bytes plus its size, checked
+    before starting ffmpeg, and concurrent requests for the same URL share one
+    analysis. `get_session` returns the session to download with."""
+
+    WORKERS = 2
+    QUEUE_SIZE = 32
+    CHUNK_SIZE = 100 * 1024
+    CONTENT_KEY_BYTES = 64 * 1024
+    FILE_SIZE_LIMIT = 15 * 1024 * 1024
+    CACHE_SIZE = 1024
+    SAMPLE_RATE = 16000
+    PCM_CHUNK_SIZE = 64 * 1024
+    LOUD_MEAN_VOLUME = -10.0
+    # how far above the threshold the running mean has to be to stop early
+    EARLY_STOP_MARGIN = 3.0
+    EARLY_STOP_MIN_SECONDS = 3
+    TIME_BUDGET = 15
+    MAX_AUDIO_SECONDS = 10 * 60
+
+    def __init__(self, temp_dir, get_session: Callable[[], aiohttp.ClientSession]):
+        self.temp_dir = temp_dir
+        self.get_session = get_session
+        self.queue = asyncio.Queue(self.QUEUE_SIZE)
+        self.workers = []
+        self.in_flight = {}
+        self.results = OrderedDict()
+        self.stats = {
+            "files": 0,
+            "cache_hits": 0,
+            "seconds_decoded": 0.0,
+            "bytes_decoded": 0,
+            "elapsed": 0.0,
+            "loud": 0,
+            "budget": 0,
+        }
+
+    def start(self):
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.WORKERS)]
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        for future in self.in_flight.values():
+            future.cancel()
+
+    @staticmethod
+    def cache_key(url: str) -> str:
+        return url.split("?")[0]
+
+    def cached(self, key: str) -> Optional[VolumeResult]:
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        return result
+
+    def remember(self, key: str, result: VolumeResult):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.CACHE_SIZE:
+            self.results.popitem(last=False)
+
+    async def analyze(self, url: str) -> VolumeResult:
+        """Raises TooLargeError for files over the limit and asyncio.QueueFull when busy."""
+        key = self.cache_key(url)
+        result = self.cached(key)
+        if result is not None:
+            self.stats["cache_hits"] += 1
+            return result
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait((url, key, future))
+            self.in_flight[key] = future
+        return await asyncio.shield(future)
+
+    async def worker(self):
+        while True:
+            url, key, future = await self.queue.get()
+            try:
+                result = await self.run_job(url)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                    # retrieved by whoever awaits it, don't warn if nobody did
+                    future.exception()
+            else:
+                self.remember(key, result)
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.in_flight.pop(key, None)
+                self.queue.task_done()
+
+    async def run_job(self, url: str) -> VolumeResult:
+        headers = {}
+        if "youtube" in url:
+            url, headers = await self.resolve_youtube(url)
+        async with self.get_session().get(url, headers=headers) as res:
+            res.raise_for_status()
+            size = res.content_length
+            if (size or 0) > self.FILE_SIZE_LIMIT:
+                raise TooLargeError(f"too large {size}")
+            content_key = None
+            head = b""
+            if size:
+                # the same file reuploaded under another URL is recognized before decoding anything
+                head = await res.content.readexactly(min(size, self.CONTENT_KEY_BYTES))
+                content_key = f"head:{hashlib.sha256(head).hexdigest()}:{size}"
+                cached = self.cached(content_key)
+                if cached is not None:
+                    self.stats["cache_hits"] += 1
+                    return cached
+            downloaded = len(head)
+
+            async def download():
+                nonlocal downloaded
+                if head:
+                    yield head
+                async for chunk in res.content.iter_chunked(self.CHUNK_SIZE):
+                    downloaded += len(chunk)
+                    if downloaded > self.FILE_SIZE_LIMIT:
+                        raise TooLargeError(f"too large {downloaded}")
+                    yield chunk
+
+            result = await self.run_ffmpeg(["-i", "pipe:0"], download())
+        if result.mean_volume is None and downloaded:
+            # containers with the index at the end (most MP4s from phones) can't be read from a pipe,
+            # download those again into a file rather than keeping every download in memory
+            result = await self.analyze_file(url, headers)
+        if content_key is not None:
+            self.remember(content_key, result)
+        self.record(result)
+        return result
+
+    def record(self, result: VolumeResult):
+        self.stats["files"] += 1
+        self.stats["seconds_decoded"] += result.seconds_decoded
+        self.stats["bytes_decoded"] += result.bytes_decoded
+        self.stats["elapsed"] += result.elapsed
+        if result.stop_reason is not None:
+            self.stats[result.stop_reason] += 1
+
+    @staticmethod
+    def extract_youtube_info(url: str):
+        with yt_dlp.YoutubeDL({"format": "worst", "quiet": True}) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    async def resolve_youtube(self, url: str) -> Tuple[str, Dict[str, str]]:
+        info = await asyncio.get_running_loop().run_in_executor(
+            None, self.extract_youtube_info, url
+        )
+        filesize = info.get("filesize") or info.get("filesize_approx")
+        if isinstance(filesize, (int, float)) and filesize > self.FILE_SIZE_LIMIT:
+            raise TooLargeError(f"too large {filesize}")
+        return info["url"], info.get("http_headers") or {}
+
+    async def analyze_file(self, url: str, headers: Dict[str, str]) -> VolumeResult:
+        fd, path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self.get_session().get(url, headers=headers) as res:
+                    res.raise_for_status()
+                    size = 0
+                    async for chunk in res.content.iter_chunked(self.CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.FILE_SIZE_LIMIT:
+                            raise TooLargeError(f"too large {size}")
+                        f.write(chunk)
+            return await self.run_ffmpeg(["-i", path])
+        finally:
+            os.remove(path)
+
+    async def run_ffmpeg(self, input_args: List[str], chunks: Optional[AsyncIterator[bytes]] = None) -> VolumeResult:
+        start = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner",
+            "-nostats",
+            "-loglevel",
+            "error",
+            *input_args,
+            "-vn",
+            "-sn",
+            "-dn",
+            "-ac",
+            "1",
+            "-ar",
+            str(self.SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "-",
+            stdin=asyncio.subprocess.PIPE if chunks is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        meter = LoudnessMeter(self.SAMPLE_RATE)
+        bytes_decoded = 0
+        stop_reason = None
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg gave up on the input, the caller retries from a file if nothing was decoded
+                pass
+            finally:
+                if not proc.stdin.is_closing():
+                    proc.stdin.close()
+
+        feed_task = asyncio.create_task(feed()) if chunks is not None else None
+        try:
+            leftover = b""
+            while True:
+                data = await proc.stdout.read(self.PCM_CHUNK_SIZE)
+                if not data:
+                    break
+                bytes_decoded += len(data)
+                data = leftover + data
+                cut = len(data) - len(data) % 2
+                leftover = data[cut:]
+                meter.add(data[:cut])
+                if (
+                    meter.seconds >= self.EARLY_STOP_MIN_SECONDS
+                    and meter.mean_volume > self.LOUD_MEAN_VOLUME + self.EARLY_STOP_MARGIN
+                ):
+                    stop_reason = "loud"
+                    break
+                if time.monotonic() - start > self.TIME_BUDGET or meter.seconds > self.MAX_AUDIO_SECONDS:
+                    stop_reason = "budget"
+                    break
+            if stop_reason is not None:
+                proc.kill()
+            elif feed_task is not None:
+                await feed_task
+            await proc.wait()
+        finally:
+            if feed_task is not None and not feed_task.done():
+                feed_task.cancel()
+                await asyncio.gather(feed_task, return_exceptions=True)
+                await chunks.aclose()
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return VolumeResult(
+            meter.mean_volume,
+            meter.max_volume,
+            meter.seconds,
+            bytes_decoded,
+            time.monotonic() - start,
+            stop_reason,
+        )
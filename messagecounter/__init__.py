@@ -2,4 +2,6 @@ from redbot.core.bot import Red
 from .messagecounter import MessageCounter
 
 async def setup(bot: Red):
-    await bot.add_cog(MessageCounter(bot))
+    cog = MessageCounter(bot)
+    await bot.add_cog(cog)
+    cog.start_flusher()
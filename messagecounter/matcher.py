@@ -0,0 +1,61 @@
+import re
+import warnings
+from typing import *
+
+FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class WordMatcher:
+    """Finds which of a guild's tracked patterns occur in a message.
+
+    Every pattern is compiled once. Patterns that can be safely combined are also
+    joined into a single alternation which rejects messages matching none of them
+    in one pass, the individual patterns only run when it hits."""
+
+    def __init__(self, words: Iterable[str]):
+        self.patterns = []
+        self.invalid = []
+        combined = []
+        for word in words:
+            try:
+                pattern = re.compile(word, FLAGS)
+            except re.error:
+                self.invalid.append(word)
+                continue
+            prefiltered = self.combinable(word)
+            self.patterns.append((word, pattern, prefiltered))
+            if prefiltered:
+                combined.append(f"(?:{word})")
+        self.prefilter = None
+        if combined:
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error")
+                    self.prefilter = re.compile("|".join(combined), FLAGS)
+            except (re.error, DeprecationWarning):
+                # e.g. the same group name used in two patterns
+                self.patterns = [(word, pattern, False) for word, pattern, _ in self.patterns]
+        self.unfiltered = [(word, pattern) for word, pattern, prefiltered in self.patterns if not prefiltered]
+
+    @staticmethod
+    def combinable(word: str) -> bool:
+        # group numbers shift once the pattern is part of an alternation and
+        # inline global flags are only allowed at the very start
+        if BACKREFERENCE.search(word):
+            return False
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                re.compile(f"x|(?:{word})")
+        except (re.error, DeprecationWarning):
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def matches(self, text: str) -> List[str]:
+        if self.prefilter is not None and self.prefilter.search(text) is None:
+            return [word for word, pattern in self.unfiltered if pattern.search(text)]
+        return [word for word, pattern, _ in self.patterns if pattern.search(text)]
@@ -1,22 +1,86 @@
+import asyncio
 import datetime
+import logging
 import re
 import time
 import discord
 from redbot.core import commands, Config, checks
 from redbot.core.bot import Red
+from collections import Counter
 from copy import deepcopy
 from redbot.core.utils.chat_formatting import box, pagify, quote
-import re
+from .matcher import WordMatcher
+
+log = logging.getLogger("red.goon.messagecounter")
 
 class MessageCounter(commands.Cog):
     default_guild_config = {
             "words": {}
         }
-    
+    FLUSH_PERIOD = 60
+
     def __init__(self, bot: Red):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=889521548234)
         self.config.register_guild(**self.default_guild_config)
+        # guild id -> (WordMatcher, {word: notify targets}), rebuilt when the words change
+        self.matchers = {}
+        # guild id -> Counter of matches not written to Config yet
+        self.pending_counts = {}
+        self.flush_task = None
+
+    def cog_unload(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        asyncio.create_task(self.flush_all())
+
+    def start_flusher(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        self.flush_task = asyncio.create_task(self.flush_loop())
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self.FLUSH_PERIOD)
+            except asyncio.CancelledError:
+                break
+            try:
+                await self.flush_all()
+            except asyncio.CancelledError:
+                break
+            except:
+                log.exception("Error flushing MessageCounter counters")
+
+    async def flush_all(self):
+        for guild_id in list(self.pending_counts):
+            await self.flush(guild_id)
+
+    async def flush(self, guild_id: int):
+        """Adds the counts accumulated in memory to the counters stored in Config."""
+        counts = self.pending_counts.pop(guild_id, None)
+        if not counts:
+            return
+        async with self.config.guild_from_id(guild_id).words() as words:
+            for word, count in counts.items():
+                if word in words:
+                    words[word]['counter'] += count
+
+    async def get_matcher(self, guild: discord.Guild):
+        cached = self.matchers.get(guild.id)
+        if cached is None:
+            words = await self.config.guild(guild).words()
+            cached = (
+                WordMatcher(words),
+                {word: data['notify_targets'] for word, data in words.items()},
+            )
+            if cached[0].invalid:
+                log.warning(f"Invalid MessageCounter patterns in guild {guild.id}: {cached[0].invalid}")
+            self.matchers[guild.id] = cached
+        return cached
+
+    def invalidate_matcher(self, guild: discord.Guild):
+        self.matchers.pop(guild.id, None)
 
     @checks.admin()
     @commands.group()
@@ -38,11 +102,13 @@ class MessageCounter(commands.Cog):
                 await ctx.send("That word already has a counter attached")
                 return
             words[word] = self.init_word()
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @messagestats.command()
     async def delcounter(self, ctx: commands.Context, *, word: str):
         """Deletes the counter for this word."""
+        await self.flush(ctx.guild.id)
         async with self.config.guild(ctx.guild).words() as words:
             if word not in words:
                 await ctx.send("That word is not tracked")
@@ -51,11 +117,13 @@ class MessageCounter(commands.Cog):
                 await ctx.send("You can't delete a word which has people or channels listening to it")
                 return
             del words[word]
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @messagestats.command()
     async def checkcounter(self, ctx: commands.Context, *, word: str):
         """Checks how many messages containing this word have been sent since we started counting."""
+        await self.flush(ctx.guild.id)
         words = await self.config.guild(ctx.guild).words()
         if word not in words:
             await ctx.send("That word isn't tracked, use addcounter to track")
@@ -67,6 +135,7 @@ class MessageCounter(commands.Cog):
     @messagestats.command()
     async def resetcounter(self, ctx: commands.Context, *, word: str):
         """Resets the counter of the word to 0 and the started-counting date to now."""
+        await self.flush(ctx.guild.id)
         async with self.config.guild(ctx.guild).words() as words:
             if word not in words:
                 await ctx.send("That word isn't tracked, use addcounter to track")
@@ -88,6 +157,7 @@ class MessageCounter(commands.Cog):
     @messagestats.command()
     async def list(self, ctx: commands.Context):
         """Lists all words we are looking for in this server with their stored info."""
+        await self.flush(ctx.guild.id)
         words = await self.config.guild(ctx.guild).words()
         lines = []
         for word, data in words.items():
@@ -105,6 +175,7 @@ class MessageCounter(commands.Cog):
     @messagestats.command()
     async def info(self, ctx: commands.Context, *, word: str):
         """Checks the complete info of a tracked word."""
+        await self.flush(ctx.guild.id)
         words = await self.config.guild(ctx.guild).words()
         if not word in words:
             await ctx.send("That word is not tracked")
@@ -126,6 +197,7 @@ class MessageCounter(commands.Cog):
                 words[word] = self.init_word()
             if not ctx.author.id in words[word]['notify_targets']:
                 words[word]['notify_targets'].append(ctx.author.id)
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @messagestats.command()
@@ -136,6 +208,7 @@ class MessageCounter(commands.Cog):
                 words[word] = self.init_word()
             if ctx.author.id in words[word]['notify_targets']:
                 words[word]['notify_targets'].remove(ctx.author.id)
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @messagestats.command()
@@ -146,6 +219,7 @@ class MessageCounter(commands.Cog):
                 words[word] = self.init_word()
             if not channel.id in words[word]['notify_targets']:
                 words[word]['notify_targets'].append(channel.id)
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @messagestats.command()
@@ -156,6 +230,7 @@ class MessageCounter(commands.Cog):
                 words[word] = self.init_word()
             if channel.id in words[word]['notify_targets']:
                 words[word]['notify_targets'].remove(channel.id)
+        self.invalidate_matcher(ctx.guild)
         await ctx.message.add_reaction("\N{White Heavy Check Mark}")
 
     @commands.Cog.listener()
@@ -170,19 +245,24 @@ class MessageCounter(commands.Cog):
             return
 
         msg = message.clean_content
+        matcher, notify_targets = await self.get_matcher(message.guild)
+        if not len(matcher):
+            return
+        matched = matcher.matches(msg)
+        if not matched:
+            return
         notify_message = f"{quote(msg)}\n{message.jump_url}\nby {message.author.mention} in {message.channel.mention}\ntriggered words: "
         messages_to_send = {}
-        async with self.config.guild(message.guild).words() as words:
-            for word, data in words.items():
-                if re.search(word, msg, re.IGNORECASE | re.MULTILINE | re.DOTALL):
-                    data['counter'] += 1
-                    for target_id in data['notify_targets']:
-                        target = self.resolve_target(target_id)
-                        if target:
-                            if not target in messages_to_send:
-                                messages_to_send[target] = []
-                            messages_to_send[target].append(word)
-        
+        counts = self.pending_counts.setdefault(message.guild.id, Counter())
+        for word in matched:
+            counts[word] += 1
+            for target_id in notify_targets[word]:
+                target = self.resolve_target(target_id)
+                if target:
+                    if not target in messages_to_send:
+                        messages_to_send[target] = []
+                    messages_to_send[target].append(word)
+
         for target, trig_words in messages_to_send.items():
             try:
                 await target.send(notify_message + ' '.join(f"`{t}`" for t in trig_words), allowed_mentions=discord.AllowedMentions.none())
@@ -1,8 +1,11 @@
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 from .mybbnotif import MybbNotif
 
 
 async def setup(bot: Red):
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
     cog = MybbNotif(bot)
     await bot.add_cog(cog)
     await cog.run()
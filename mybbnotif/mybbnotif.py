@@ -17,21 +17,25 @@ log = logging.getLogger("red.goon.mybbnotif")
 class MybbNotif(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.config = Config.get_conf(self, 856623215587)
         self.config.init_custom("subforums", 1)
         self.config.register_custom(
             "subforums", channel_ids={}, prefix=None, last_timestamp=None
         )
         self.config.register_global(forum_url=None, period=180)
-        self.session = aiohttp.ClientSession()
         self.main_loop_task = None
 
         self.debug_data = {}
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
+
     def cog_unload(self):
         self.running = False
         self.main_loop_task.cancel()
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     async def run(self):
         self.running = True
@@ -18,11 +18,15 @@ BASE_URL = "https://forum.ss13.co/"
 class PendingAppeals(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.config = Config.get_conf(self, 95222448842)
-        self.session = aiohttp.ClientSession()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
 
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     def parse_post_key(self, text):
         return re.search(r'var my_post_key = "([0-9a-f]*)";', text).groups()[0]
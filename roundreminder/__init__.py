@@ -3,4 +3,6 @@ from .roundreminder import RoundReminder
 
 
 async def setup(bot: Red):
-    await bot.add_cog(RoundReminder(bot))
+    cog = RoundReminder(bot)
+    await bot.add_cog(cog)
+    await cog.load_reminders()
@@ -0,0 +1,74 @@
+from typing import *
+
+
+class ReminderIndex:
+    """In-memory copy of the pending next round reminders kept in Config.
+
+    Besides every user's list of match strings it keeps an inverted index from
+    each distinct match string to the users waiting on it, so a round start only
+    has to test every distinct string once instead of every user's list."""
+
+    def __init__(self):
+        self.user_strings = {}
+        self.string_users = {}
+
+    def load(self, users: Dict[int, dict]):
+        """Builds the index from `Config.all_users()`."""
+        self.user_strings.clear()
+        self.string_users.clear()
+        for user_id, data in users.items():
+            if data.get("match_strings"):
+                self.set(int(user_id), data["match_strings"])
+
+    def __len__(self):
+        return len(self.user_strings)
+
+    def get(self, user_id: int) -> List[Optional[str]]:
+        return self.user_strings.get(user_id, [])
+
+    def set(self, user_id: int, match_strings: List[Optional[str]]):
+        self.clear(user_id)
+        if not match_strings:
+            return
+        self.user_strings[user_id] = list(match_strings)
+        for match_string in match_strings:
+            self.string_users.setdefault(match_string, set()).add(user_id)
+
+    def clear(self, user_id: int):
+        for match_string in self.user_strings.pop(user_id, []):
+            users = self.string_users.get(match_string)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.string_users[match_string]
+
+    def add(self, user_id: int, match_string: Optional[str]):
+        self.user_strings.setdefault(user_id, []).append(match_string)
+        self.string_users.setdefault(match_string, set()).add(user_id)
+
+    def remove(self, user_id: int, match_string: Optional[str]):
+        match_strings = self.user_strings.get(user_id, [])
+        match_strings.remove(match_string)
+        if match_string not in match_strings:
+            users = self.string_users[match_string]
+            users.discard(user_id)
+            if not users:
+                del self.string_users[match_string]
+        if not match_strings:
+            del self.user_strings[user_id]
+
+    def match_strings(self) -> Iterable[Optional[str]]:
+        return self.string_users.keys()
+
+    def matches(self, matched_strings: Set[Optional[str]]) -> Dict[int, Optional[str]]:
+        """For every user with a reminder among `matched_strings` returns the first one in their list."""
+        users = set()
+        for match_string in matched_strings:
+            users.update(self.string_users.get(match_string, ()))
+        result = {}
+        for user_id in users:
+            for match_string in self.user_strings[user_id]:
+                if match_string in matched_strings:
+                    result[user_id] = match_string
+                    break
+        return result
@@ -1,5 +1,6 @@
 import asyncio
 import discord
+import logging
 from redbot.core import commands, Config
 from redbot.core.bot import Red
 from copy import copy
@@ -7,17 +8,27 @@ import re
 from typing import Optional
 from fastapi import Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
+from .reminderindex import ReminderIndex
+
+log = logging.getLogger("red.goon.roundreminder")
 
 
 class RoundReminder(commands.Cog):
     default_user_settings = {"match_strings": []}
     GOON_COLOUR = discord.Colour.from_rgb(222, 190, 49)
     SUCCESS_REPLY = {"status": "ok"}
+    MAX_CONCURRENT_DMS = 10
 
     def __init__(self, bot: Red):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=77984122151871643842)
         self.config.register_user(**self.default_user_settings)
+        self.reminders = ReminderIndex()
+        self.reminders_ready = asyncio.Event()
+
+    async def load_reminders(self):
+        self.reminders.load(await self.config.all_users())
+        self.reminders_ready.set()
 
     class SpacebeeError(Exception):
         def __init__(self, message: str, status_code: int, error_code: int = 0):
@@ -102,7 +113,8 @@ class RoundReminder(commands.Cog):
     @commands.command()
     async def listnextround(self, ctx: commands.Context):
         """Lists all next round reminders you have scheduled."""
-        match_strings = await self.config.user(ctx.author).match_strings()
+        await self.reminders_ready.wait()
+        match_strings = self.reminders.get(ctx.author.id)
         if not match_strings:
             await ctx.send("No round reminders.")
         else:
@@ -115,7 +127,9 @@ class RoundReminder(commands.Cog):
     @commands.command()
     async def clearnextround(self, ctx: commands.Context):
         """Clears all next round reminders you have scheduled."""
+        await self.reminders_ready.wait()
         await self.config.user(ctx.author).match_strings.set([])
+        self.reminders.clear(ctx.author.id)
         try:
             await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
         except discord.Forbidden:
@@ -124,15 +138,18 @@ class RoundReminder(commands.Cog):
     @commands.command()
     async def nextround(self, ctx: commands.Context, *, search_text: Optional[str]):
         """Notifies you about the next round or the next round with server or map name containing `search_text`."""
-        async with self.config.user(ctx.author).match_strings() as match_strings:
-            if len(match_strings) >= 100:
-                await ctx.send("You have too many reminders set, chill out.")
-            else:
-                match_strings.append(self.normalize(search_text))
-                try:
-                    await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
-                except discord.Forbidden:
-                    await ctx.send("\N{WHITE HEAVY CHECK MARK}")
+        await self.reminders_ready.wait()
+        match_strings = self.reminders.get(ctx.author.id)
+        if len(match_strings) >= 100:
+            await ctx.send("You have too many reminders set, chill out.")
+            return
+        match_string = self.normalize(search_text)
+        self.reminders.add(ctx.author.id, match_string)
+        await self.config.user(ctx.author).match_strings.set(self.reminders.get(ctx.author.id))
+        try:
+            await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
+        except discord.Forbidden:
+            await ctx.send("\N{WHITE HEAVY CHECK MARK}")
 
     async def notify(self, user: discord.User, embed, match_string: Optional[str]):
         try:
@@ -145,33 +162,53 @@ class RoundReminder(commands.Cog):
             # it's their fault if they don't open DMs!
             pass
 
+    def string_matches(self, match_string, fulltext, server, goonservers):
+        if match_string is None:
+            return True
+        if len(match_string) > 1 and match_string in fulltext:
+            return True
+        return server in goonservers.resolve_server_or_category(match_string)
+
     async def process_embed(self, embed):
         goonservers = self.bot.get_cog("GoonServers")
         server = goonservers.resolve_server(embed.title)
         fulltext = " ".join(f.value for f in embed.fields)
         fulltext = self.normalize(fulltext)
 
-        for user_id, data in (await self.config.all_users()).items():
+        await self.reminders_ready.wait()
+        matched_strings = {
+            match_string
+            for match_string in self.reminders.match_strings()
+            if self.string_matches(match_string, fulltext, server, goonservers)
+        }
+        to_notify = []
+        for user_id, match_string in self.reminders.matches(matched_strings).items():
             user = self.bot.get_user(user_id)
             if user is None:
                 continue
-            match_strings = data["match_strings"]
-            for match_string in match_strings:
-                match = False
-                if match_string is None:
-                    match = True
-                elif len(match_string) > 1 and match_string in fulltext:
-                    match = True
-                elif server in goonservers.resolve_server_or_category(match_string):
-                    match = True
-                if match:
+            self.reminders.remove(user_id, match_string)
+            to_notify.append((user, match_string))
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_DMS)
+
+        async def notify_and_save(user, match_string):
+            try:
+                async with semaphore:
                     await self.notify(user, embed, match_string)
-                    if len(match_strings) == 1:
-                        await self.config.user(user).match_strings.clear()
-                    else:
-                        match_strings.remove(match_string)
-                        await self.config.user(user).match_strings.set(match_strings)
-                    break
+            finally:
+                match_strings = self.reminders.get(user.id)
+                if match_strings:
+                    await self.config.user(user).match_strings.set(match_strings)
+                else:
+                    await self.config.user(user).match_strings.clear()
+
+        results = await asyncio.gather(
+            *(notify_and_save(user, match_string) for user, match_string in to_notify),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("Failed to send a next round reminder", exc_info=result)
 
     @commands.Cog.listener()
     async def on_message_without_command(self, message: discord.Message):
@@ -184,7 +221,7 @@ class RoundReminder(commands.Cog):
                 return
             if len(message.embeds) > 0:
                 embed = message.embeds[0]
-                await process_embed(embed)
+                await self.process_embed(embed)
         except:
             import traceback
 
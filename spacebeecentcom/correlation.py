@@ -0,0 +1,231 @@
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from typing import *
+
+
+class RelayedMessage:
+    __slots__ = ("channel_id", "message_id")
+
+    def __init__(self, channel_id: int, message_id: int):
+        self.channel_id = channel_id
+        self.message_id = message_id
+
+
+class HelpTicket:
+    __slots__ = ("channel_id", "message_id", "guild_id", "created_at", "summary")
+
+    def __init__(self, channel_id: int, message_id: int, guild_id: Optional[int], created_at: float, summary: str):
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.guild_id = guild_id
+        self.created_at = created_at
+        self.summary = summary
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.guild_id or '@me'}/{self.channel_id}/{self.message_id}"
+
+
+class CorrelationStore:
+    """Maps game message IDs (msgid) to the Discord messages relaying them and back.
+
+    Only IDs are kept. Both the msgid threads and the open help tickets are LRU
+    bounded by `capacity` and evict one entry at a time. If `path` is given every
+    change is also written to an SQLite file and loaded back on startup. Changes are
+    committed together at most `COMMIT_DELAY` seconds later rather than one by one."""
+
+    COMMIT_DELAY = 1.0
+
+    def __init__(self, capacity: int, path=None):
+        self.capacity = capacity
+        self.threads = OrderedDict()
+        self.message_to_msgid = {}
+        self.tickets = OrderedDict()
+        self.channel_tickets = {}
+        self.writes_since_compact = 0
+        self.commit_handle = None
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(str(path))
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS relayed (message_id INTEGER PRIMARY KEY, msgid TEXT NOT NULL, channel_id INTEGER NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS relayed_msgid ON relayed (msgid)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS tickets (message_id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, guild_id INTEGER, created_at REAL NOT NULL, summary TEXT NOT NULL)"
+            )
+            self.db.commit()
+            self.load()
+
+    def close(self):
+        if self.commit_handle is not None:
+            self.commit_handle.cancel()
+            self.commit_handle = None
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def load(self):
+        rows = self.db.execute(
+            "SELECT message_id, msgid, channel_id FROM relayed ORDER BY rowid"
+        ).fetchall()
+        for message_id, msgid, channel_id in rows:
+            self._add_relayed(msgid, channel_id, message_id)
+        rows = self.db.execute(
+            "SELECT message_id, channel_id, guild_id, created_at, summary FROM tickets ORDER BY created_at"
+        ).fetchall()
+        for message_id, channel_id, guild_id, created_at, summary in rows:
+            self._add_ticket(HelpTicket(channel_id, message_id, guild_id, created_at, summary))
+        self.compact()
+
+    def compact(self):
+        """Drops rows of entries that were evicted from memory."""
+        if self.db is None:
+            return
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS live_messages (message_id INTEGER PRIMARY KEY)")
+        self.db.execute("DELETE FROM live_messages")
+        self.db.executemany(
+            "INSERT INTO live_messages VALUES (?)",
+            ((message_id,) for message_id in self.message_to_msgid),
+        )
+        self.db.execute("DELETE FROM relayed WHERE message_id NOT IN live_messages")
+        self.db.execute("DELETE FROM live_messages")
+        self.db.executemany(
+            "INSERT INTO live_messages VALUES (?)",
+            ((message_id,) for message_id in self.tickets),
+        )
+        self.db.execute("DELETE FROM tickets WHERE message_id NOT IN live_messages")
+        self.db.commit()
+        self.writes_since_compact = 0
+
+    def commit(self):
+        self.commit_handle = None
+        if self.db is not None:
+            self.db.commit()
+
+    def _schedule_commit(self):
+        if self.commit_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.commit()
+            return
+        self.commit_handle = loop.call_later(self.COMMIT_DELAY, self.commit)
+
+    def _written(self):
+        self.writes_since_compact += 1
+        if self.writes_since_compact > self.capacity:
+            self.compact()
+        else:
+            self._schedule_commit()
+
+    def _add_relayed(self, msgid: str, channel_id: int, message_id: int):
+        thread = self.threads.get(msgid)
+        if thread is None:
+            thread = []
+            self.threads[msgid] = thread
+        else:
+            self.threads.move_to_end(msgid)
+        thread.append(RelayedMessage(channel_id, message_id))
+        self.message_to_msgid[message_id] = msgid
+        while len(self.threads) > self.capacity:
+            _, evicted = self.threads.popitem(last=False)
+            for relayed in evicted:
+                self.message_to_msgid.pop(relayed.message_id, None)
+
+    def add_relayed(self, msgid: str, channel_id: int, message_id: int):
+        self._add_relayed(msgid, channel_id, message_id)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO relayed (message_id, msgid, channel_id) VALUES (?, ?, ?)",
+                (message_id, msgid, channel_id),
+            )
+            self._written()
+
+    def thread(self, msgid: str) -> List[RelayedMessage]:
+        return self.threads.get(msgid, [])
+
+    def msgid_of(self, message_id: int) -> Optional[str]:
+        return self.message_to_msgid.get(message_id)
+
+    def _add_ticket(self, ticket: HelpTicket):
+        self.tickets[ticket.message_id] = ticket
+        self.tickets.move_to_end(ticket.message_id)
+        channel_tickets = self.channel_tickets.setdefault(ticket.channel_id, OrderedDict())
+        newest = next(reversed(channel_tickets.values()), None)
+        channel_tickets[ticket.message_id] = ticket
+        if newest is not None and newest.created_at > ticket.created_at:
+            # rare out of order arrival, keep the channel sorted by time
+            self.channel_tickets[ticket.channel_id] = OrderedDict(
+                sorted(channel_tickets.items(), key=lambda item: item[1].created_at)
+            )
+        evicted = []
+        while len(self.tickets) > self.capacity:
+            message_id, evicted_ticket = self.tickets.popitem(last=False)
+            self._remove_from_channel(evicted_ticket)
+            evicted.append(message_id)
+        return evicted
+
+    def _remove_from_channel(self, ticket: HelpTicket):
+        channel_tickets = self.channel_tickets.get(ticket.channel_id)
+        if channel_tickets is None:
+            return
+        channel_tickets.pop(ticket.message_id, None)
+        if not channel_tickets:
+            del self.channel_tickets[ticket.channel_id]
+
+    def add_ticket(self, ticket: HelpTicket):
+        evicted = self._add_ticket(ticket)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tickets (message_id, channel_id, guild_id, created_at, summary) VALUES (?, ?, ?, ?, ?)",
+                (ticket.message_id, ticket.channel_id, ticket.guild_id, ticket.created_at, ticket.summary),
+            )
+            self.db.executemany(
+                "DELETE FROM tickets WHERE message_id = ?", ((m,) for m in evicted)
+            )
+            self._written()
+
+    def close_ticket(self, message_id: int) -> Optional[HelpTicket]:
+        ticket = self.tickets.pop(message_id, None)
+        if ticket is None:
+            return None
+        self._remove_from_channel(ticket)
+        if self.db is not None:
+            self.db.execute("DELETE FROM tickets WHERE message_id = ?", (message_id,))
+            self._schedule_commit()
+        return ticket
+
+    def is_open_ticket(self, message_id: int) -> bool:
+        return message_id in self.tickets
+
+    def open_tickets(self, channel_id: int, since: float = 0) -> List[HelpTicket]:
+        """Open tickets of a channel created after `since`, newest first."""
+        result = []
+        for ticket in reversed(self.channel_tickets.get(channel_id, {}).values()):
+            if ticket.created_at < since:
+                break
+            result.append(ticket)
+        return result
+
+    def ticket_stats(self, now: float, since: float = 0) -> Dict[int, Dict[str, float]]:
+        """Count and age percentiles (in seconds) of open tickets per channel."""
+        result = {}
+        for channel_id in self.channel_tickets:
+            ages = [now - t.created_at for t in self.open_tickets(channel_id, since)]
+            if not ages:
+                continue
+            # oldest first, so percentiles index straight into the list
+            ages.sort(reverse=True)
+            result[channel_id] = {
+                "count": len(ages),
+                "oldest": ages[0],
+                "p50": ages[len(ages) // 2],
+                "p90": ages[len(ages) // 10],
+            }
+        return result
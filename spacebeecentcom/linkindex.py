@@ -0,0 +1,52 @@
+from typing import *
+
+
+class LinkIndex:
+    """In-memory copy of the ckey <-> Discord user links kept in Config, indexed both ways."""
+
+    def __init__(self):
+        self.ckey_to_user = {}
+        self.user_to_ckey = {}
+
+    def load(self, users: Dict[int, dict], ckeys: Dict[str, dict]):
+        """Builds the index from `Config.all_users()` and the "ckey" custom group's `all()`."""
+        self.ckey_to_user.clear()
+        self.user_to_ckey.clear()
+        for ckey, data in ckeys.items():
+            if data.get("discord_id"):
+                self.ckey_to_user[ckey] = int(data["discord_id"])
+        for user_id, data in users.items():
+            if data.get("linked_ckey"):
+                self.user_to_ckey[int(user_id)] = data["linked_ckey"]
+                self.ckey_to_user.setdefault(data["linked_ckey"], int(user_id))
+
+    def __len__(self):
+        return len(self.user_to_ckey)
+
+    def get_ckey(self, user_id: int) -> Optional[str]:
+        return self.user_to_ckey.get(user_id)
+
+    def get_user_id(self, ckey: str) -> Optional[int]:
+        return self.ckey_to_user.get(ckey)
+
+    def ckeys_to_user_ids(self, ckeys: Iterable[str]) -> Dict[str, Optional[int]]:
+        return {ckey: self.ckey_to_user.get(ckey) for ckey in ckeys}
+
+    def user_ids_to_ckeys(self, user_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        return {user_id: self.user_to_ckey.get(user_id) for user_id in user_ids}
+
+    def link(self, user_id: int, ckey: str):
+        self.user_to_ckey[user_id] = ckey
+        self.ckey_to_user[ckey] = user_id
+
+    def unlink_user(self, user_id: int) -> Optional[str]:
+        ckey = self.user_to_ckey.pop(user_id, None)
+        if ckey is not None and self.ckey_to_user.get(ckey) == user_id:
+            del self.ckey_to_user[ckey]
+        return ckey
+
+    def unlink_ckey(self, ckey: str) -> Optional[int]:
+        user_id = self.ckey_to_user.pop(ckey, None)
+        if user_id is not None and self.user_to_ckey.get(user_id) == ckey:
+            del self.user_to_ckey[user_id]
+        return user_id
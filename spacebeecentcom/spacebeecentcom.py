@@ -13,6 +13,11 @@ from collections import OrderedDict
 import logging
 import re
 import secrets
+from redbot.core.data_manager import cog_data_path
+from .linkindex import LinkIndex
+from .correlation import CorrelationStore, HelpTicket
+
+log = logging.getLogger("red.goon.spacebeecentcom")
 
 PLAYER_ROLE_ID = 182284445837950977
 GUILD_ID = 182249960895545344
@@ -27,6 +32,8 @@ class SpacebeeCentcom(commands.Cog):
         "link_verification": None,
     }
     MAX_CACHE_LENGTH = 2000
+    PERSIST_MESSAGE_THREADS = True
+    UNANSWERED_MAX_AGE = datetime.timedelta(days=1)
     REPLIED_TO_EMOJI = "\N{CLOSED MAILBOX WITH LOWERED FLAG}"
 
     def __init__(self, bot: Red):
@@ -37,12 +44,78 @@ class SpacebeeCentcom(commands.Cog):
         self.config.register_user(**self.default_user_settings)
         self.config.register_custom("ckey", discord_id=None)
         self.gh = None
-        self.id_to_messages = OrderedDict()
-        self.message_to_id = OrderedDict()
-        self.initiating_messages = OrderedDict()
+        self.threads = CorrelationStore(
+            self.MAX_CACHE_LENGTH,
+            cog_data_path(self) / "threads.sqlite3"
+            if self.PERSIST_MESSAGE_THREADS
+            else None,
+        )
+        self.links = LinkIndex()
+        self.links_ready = asyncio.Event()
+        self.background_tasks = set()
+
+    def cog_unload(self):
+        for task in self.background_tasks:
+            task.cancel()
+        self.threads.close()
+
+    def spawn(self, coro):
+        """Runs a relay in the background so API requests from the game return right away."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+        return task
+
+    def _background_task_done(self, task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Relaying a message failed", exc_info=task.exception())
 
     async def init(self):
         self.gh = Github((await self.bot.get_shared_api_tokens("github")).get("token"))
+        await self.load_links()
+
+    async def load_links(self):
+        self.links.load(
+            await self.config.all_users(), await self.config.custom("ckey").all()
+        )
+        self.links_ready.set()
+
+    async def set_link(self, user_id: int, ckey: str):
+        await self.links_ready.wait()
+        await self.config.user_from_id(user_id).linked_ckey.set(ckey)
+        await self.config.custom("ckey", ckey).discord_id.set(user_id)
+        self.links.link(user_id, ckey)
+
+    async def unlink_user(self, user_id: int):
+        """Removes the link of a Discord user, returns the ckey they were linked to."""
+        await self.links_ready.wait()
+        ckey = self.links.unlink_user(user_id)
+        await self.config.user_from_id(user_id).linked_ckey.set(None)
+        if ckey is not None:
+            await self.config.custom("ckey", ckey).discord_id.set(None)
+        return ckey
+
+    async def unlink_ckey(self, ckey: str):
+        """Removes the link of a ckey, returns the Discord user ID it was linked to."""
+        await self.links_ready.wait()
+        user_id = self.links.unlink_ckey(ckey)
+        await self.config.custom("ckey", ckey).discord_id.set(None)
+        if user_id is not None:
+            await self.config.user_from_id(user_id).linked_ckey.set(None)
+        return user_id
+
+    async def ckey_to_user_id(self, ckey: str):
+        await self.links_ready.wait()
+        return self.links.get_user_id(ckey)
+
+    async def ckeys_to_user_ids(self, ckeys):
+        await self.links_ready.wait()
+        return self.links.ckeys_to_user_ids(ckeys)
+
+    async def user_ids_to_ckeys(self, user_ids):
+        await self.links_ready.wait()
+        return self.links.user_ids_to_ckeys(user_ids)
 
     class SpacebeeError(Exception):
         def __init__(self, message: str, status_code: int, error_code: int = 0):
@@ -92,8 +165,23 @@ class SpacebeeCentcom(commands.Cog):
 
     async def mark_initiating_message_reply(self, message: discord.Message):
         await message.add_reaction(self.REPLIED_TO_EMOJI)
-        if message.id in self.initiating_messages:
-            del self.initiating_messages[message.id]
+        self.threads.close_ticket(message.id)
+
+    def open_ticket(self, message: discord.Message):
+        summary = ""
+        if len(message.embeds) > 0 and message.embeds[0].description:
+            summary = message.embeds[0].description
+            if len(summary) > 100:
+                summary = summary[:97] + "..."
+        self.threads.add_ticket(
+            HelpTicket(
+                message.channel.id,
+                message.id,
+                message.guild.id if message.guild else None,
+                message.created_at.timestamp(),
+                summary,
+            )
+        )
 
     async def discord_broadcast(self,
             channels,
@@ -104,42 +192,51 @@ class SpacebeeCentcom(commands.Cog):
             msgid=None,
             **kwargs
         ):
-        channel_to_reply_message = {}
-        if reply_message_id is not None and reply_message_id in self.id_to_messages:
-            reply_message_list = self.id_to_messages[reply_message_id]
-        if reply_message_list is not None:
-            for message in reply_message_list:
-                channel_to_reply_message[message.channel.id] = message
+        goonservers = self.bot.get_cog("GoonServers")
+
+        def reply_message_for(ch):
+            # resolved by the outbox right before sending so replies can thread
+            # onto messages that were still queued when this one was enqueued
+            if reply_message_list is not None:
+                for message in reply_message_list:
+                    if message.channel.id == ch:
+                        return message
+            if reply_message_id is None:
+                return None
+            for relayed in reversed(self.threads.thread(reply_message_id)):
+                if relayed.channel_id == ch:
+                    return self.bot.get_channel(ch).get_partial_message(relayed.message_id)
+            return None
+
         async def task(ch):
-            reply_message = channel_to_reply_message.get(ch, None)
-            result_msg = await self.bot.get_channel(ch).send(*args, **kwargs, reference=reply_message)
-            if reply_message and await self.is_initiating_message(reply_message):
+            reply_message = None
+
+            def reference():
+                nonlocal reply_message
+                reply_message = reply_message_for(ch)
+                return reply_message
+
+            def on_sent(message):
+                # recorded before the next queued message resolves its reference
+                if msgid:
+                    self.threads.add_relayed(msgid, ch, message.id)
+
+            result_msg = await goonservers.outbox.enqueue(
+                ch, *args, reference=reference, on_sent=on_sent, **kwargs
+            )
+            if msgid:
+                if await self.is_initiating_message(result_msg):
+                    self.open_ticket(result_msg)
+            if reply_message and self.threads.is_open_ticket(reply_message.id):
                 await self.mark_initiating_message_reply(reply_message)
             return result_msg
+
         tasks = [
             task(ch)
             for ch in channels
             if ch != exception
         ]
-        messages = await asyncio.gather(*tasks)
-        if msgid:
-            self.id_to_messages[msgid] = list(messages)
-            for message in messages:
-                self.message_to_id[message] = msgid
-                if await self.is_initiating_message(message):
-                    self.initiating_messages[message.id] = message
-            if len(self.id_to_messages) > self.MAX_CACHE_LENGTH:
-                new_size = self.MAX_CACHE_LENGTH // 2
-                for _ in range(new_size):
-                    self.id_to_messages.popitem(last=False)
-                new_message_to_id_size = len(self.message_to_id) // 2
-                for _ in range(new_message_to_id_size):
-                    self.message_to_id.popitem(last=False)
-            if len(self.initiating_messages) > self.MAX_CACHE_LENGTH:
-                new_size = self.MAX_CACHE_LENGTH // 2
-                for _ in range(new_size):
-                    self.initiating_messages.popitem(last=False)
-        return messages
+        return await asyncio.gather(*tasks)
 
     async def discord_broadcast_ahelp(
         self,
@@ -229,12 +326,12 @@ class SpacebeeCentcom(commands.Cog):
     ):
         if hasattr(channels, "channels"):
             channels = channels.channels["alert"]
-        out_msg = f"\N{RED EXCLAMATION MARK} [{server_name}] {from_name} ({from_key}) {msg}"
-        messages = await server.subtype.channel_broadcast(self.bot, "alert", out_msg)
+        out_msg = f"\N{HEAVY EXCLAMATION MARK SYMBOL} [{server_name}] {from_name} ({from_key}) {msg}"
+        messages = await self.discord_broadcast(channels, out_msg, exception=exception)
         for message in messages:
-            await message.add_reaction("\N{BLUE SQUARE}")
-            await message.add_reaction("\N{YELLOW SQUARE}")
-            await message.add_reaction("\N{RED SQUARE}")
+            await message.add_reaction("\N{LARGE BLUE SQUARE}")
+            await message.add_reaction("\N{LARGE YELLOW SQUARE}")
+            await message.add_reaction("\N{LARGE RED SQUARE}")
 
     async def server_dep(self, server: str, server_name: str, api_key: str):
         if api_key != (await self.bot.get_shared_api_tokens("spacebee"))["api_key"]:
@@ -262,17 +359,17 @@ class SpacebeeCentcom(commands.Cog):
         async def adminsay(
             key: str, name: str, msg: str, server=Depends(self.server_dep)
         ):
-            await self.discord_broadcast_asay(
+            self.spawn(self.discord_broadcast_asay(
                 server.subtype, server.full_name, key, name, server.short_name, msg
-            )
-            await self.game_broadcast_asay(
+            ))
+            self.spawn(self.game_broadcast_asay(
                 server.subtype.servers,
                 key,
                 name,
                 server.short_name,
                 msg,
                 exception=server,
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/ban")
@@ -302,8 +399,7 @@ class SpacebeeCentcom(commands.Cog):
                 embed.add_field(name="expires", value="until appeal")
             embed.colour = discord.Colour.red()
             embed.set_footer(text=f"{server.full_name} BAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            self.spawn(self.discord_broadcast(server.subtype.channels["ban"], embed=embed))
             return self.SUCCESS_REPLY
 
         @app.get("/job_ban")
@@ -320,8 +416,7 @@ class SpacebeeCentcom(commands.Cog):
             embed.description = f"server `{applicable_server}`"
             embed.colour = discord.Colour.from_rgb(200, 100, 100)
             embed.set_footer(text=f"{server.full_name} JOBBAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            self.spawn(self.discord_broadcast(server.subtype.channels["ban"], embed=embed))
             return self.SUCCESS_REPLY
 
         @app.get("/job_unban")
@@ -338,8 +433,7 @@ class SpacebeeCentcom(commands.Cog):
             embed.description = f"server `{applicable_server}`"
             embed.colour = discord.Colour.from_rgb(200, 100, 100)
             embed.set_footer(text=f"{server.full_name} JOBUNBAN")
-            for channel_id in server.subtype.channels["ban"]:
-                await self.bot.get_channel(channel_id).send(embed=embed)
+            self.spawn(self.discord_broadcast(server.subtype.channels["ban"], embed=embed))
             return self.SUCCESS_REPLY
 
         @app.get("/help")
@@ -352,9 +446,9 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_ahelp(
+            self.spawn(self.discord_broadcast_ahelp(
                 server.subtype, server.full_name, key, name, msg, url=log_link, msgid=msgid, reply_message_id=previous_msgid
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/pm")
@@ -368,9 +462,9 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_ahelp(
+            self.spawn(self.discord_broadcast_ahelp(
                 server.subtype, server.full_name, key, name, msg, key2, name2, msgid=msgid, reply_message_id=previous_msgid
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/mentorhelp")
@@ -382,9 +476,9 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep)
         ):
-            await self.discord_broadcast_mhelp(
+            self.spawn(self.discord_broadcast_mhelp(
                 server.subtype, server.full_name, key, name, msg, msgid=msgid, reply_message_id=previous_msgid
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/mentorpm")
@@ -398,9 +492,9 @@ class SpacebeeCentcom(commands.Cog):
             previous_msgid: Optional[str] = None,
             server=Depends(self.server_dep),
         ):
-            await self.discord_broadcast_mhelp(
+            self.spawn(self.discord_broadcast_mhelp(
                 server.subtype, server.full_name, key, name, msg, key2, name2, msgid=msgid, reply_message_id=previous_msgid
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/admin")
@@ -411,16 +505,16 @@ class SpacebeeCentcom(commands.Cog):
             if key or name:
                 out += f"{name} ({key}) "
             out += msg
-            await server.subtype.channel_broadcast(self.bot, "admin_misc", out)
+            self.spawn(server.subtype.channel_broadcast(self.bot, "admin_misc", out))
             return self.SUCCESS_REPLY
 
         @app.get("/alert")
         async def alert(
             msg: str, key: str = "", name: str = "", server=Depends(self.server_dep)
         ):
-            await self.discord_broadcast_alert(
+            self.spawn(self.discord_broadcast_alert(
                 server.subtype, server.full_name, key, name, msg
-            )
+            ))
             return self.SUCCESS_REPLY
 
         @app.get("/admin_debug")
@@ -431,7 +525,7 @@ class SpacebeeCentcom(commands.Cog):
             if key or name:
                 out += f"{name} ({key}) "
             out += msg
-            await server.subtype.channel_broadcast(self.bot, "debug", out)
+            self.spawn(server.subtype.channel_broadcast(self.bot, "debug", out))
             return self.SUCCESS_REPLY
 
         @app.get("/issue")
@@ -447,6 +541,18 @@ class SpacebeeCentcom(commands.Cog):
             repo.create_issue(title, body)
             return self.SUCCESS_REPLY
 
+        @app.get("/unanswered_stats")
+        async def unanswered_stats(api_key: str):
+            if api_key != (await self.bot.get_shared_api_tokens("spacebee"))["api_key"]:
+                raise self.SpacebeeError("Invalid API key.", 403)
+            stats = self.threads.ticket_stats(
+                datetime.datetime.now().timestamp(), self.unanswered_cutoff()
+            )
+            return {
+                "status": "ok",
+                "channels": {str(channel_id): data for channel_id, data in stats.items()},
+            }
+
         @app.get("/link")
         async def link(key: str, ckey: str, code: str, server=Depends(self.server_dep)):
             if "-" not in code:
@@ -460,7 +566,7 @@ class SpacebeeCentcom(commands.Cog):
             target_verif = await self.config.user(user).link_verification()
             if target_verif != verification:
                 return {"status": "error", "response": "Wrong link verification code", "errormsg": f"Invalid link code verification '{code}'"}
-            ckeys_linked_account = await self.config.custom("ckey", ckey).discord_id()
+            ckeys_linked_account = await self.ckey_to_user_id(ckey)
             if ckeys_linked_account:
                 try:
                     await user.send(
@@ -470,8 +576,7 @@ class SpacebeeCentcom(commands.Cog):
                     pass
                 return {"status": "error", "response": "Your byond account is already linked to an account", "errormsg": f"User already linked"}
             await self.config.user(user).link_verification.set(None)
-            await self.config.user(user).linked_ckey.set(ckey)
-            await self.config.custom("ckey", ckey).discord_id.set(user_id)
+            await self.set_link(user_id, ckey)
             try:
                 await user.send(f"Account successfully linked to ckey `{ckey}`.")
             except:
@@ -489,12 +594,13 @@ class SpacebeeCentcom(commands.Cog):
         return "".join(c.lower() for c in text if c.isalnum())
 
     async def get_ckey(self, member: discord.Member):
-        return await self.config.user(member).linked_ckey()
+        await self.links_ready.wait()
+        return self.links.get_ckey(member.id)
 
     @commands.command()
     async def link(self, ctx: commands.Context):
         """Links your Discord account with your BYOND username and gives you the Player role."""
-        current_ckey = await self.config.user(ctx.author).linked_ckey()
+        current_ckey = await self.get_ckey(ctx.author)
         if current_ckey:
             await ctx.send(
                 f"You are already linked to username `{current_ckey}`. If you wish to unlink please contact an administrator (ideally using the /report command)."
@@ -512,7 +618,7 @@ class SpacebeeCentcom(commands.Cog):
     @app_commands.command(name="link")
     async def slash_link(self, interaction: discord.Interaction):
         """Links your Discord account with your BYOND username and gives you the Player role."""
-        current_ckey = await self.config.user(interaction.user).linked_ckey()
+        current_ckey = await self.get_ckey(interaction.user)
         if current_ckey:
             await interaction.response.send_message(
                 f"You are already linked to username `{current_ckey}`. If you wish to unlink please contact an administrator (ideally using the /report command).",
@@ -529,7 +635,7 @@ class SpacebeeCentcom(commands.Cog):
     async def on_member_join(self, member: discord.Member):
         if member.guild.id != GUILD_ID:
             return
-        current_ckey = await self.config.user(member).linked_ckey()
+        current_ckey = await self.get_ckey(member)
         if current_ckey:
             rolestuff_cog = self.bot.get_cog("RoleStuff")
             player_added = False
@@ -544,10 +650,8 @@ class SpacebeeCentcom(commands.Cog):
     @checks.admin()
     async def unlinkother(self, ctx: commands.Context, target: discord.User):
         """Unlinks a Discord user from their ckey."""
-        current_ckey = await self.config.user(target).linked_ckey()
+        current_ckey = await self.unlink_user(target.id)
         if current_ckey:
-            await self.config.user(target).linked_ckey.set(None)
-            await self.config.custom("ckey", current_ckey).discord_id.set(None)
             await ctx.send(f"Unlinked ckey `{current_ckey}` from {target.mention}")
             guild = self.bot.get_guild(GUILD_ID)
             member = guild.get_member(target.id)
@@ -561,10 +665,8 @@ class SpacebeeCentcom(commands.Cog):
     async def unlinkotherckey(self, ctx: commands.Context, ckey: str):
         """Unlinks a ckey from their Discord account."""
         ckey = self.ckeyify(ckey)
-        user_id = await self.config.custom("ckey", ckey).discord_id()
+        user_id = await self.unlink_ckey(ckey)
         if user_id:
-            await self.config.user_from_id(user_id).linked_ckey.set(None)
-            await self.config.custom("ckey", ckey).discord_id.set(None)
             await ctx.send(f"Unlinked ckey `{ckey}` from {self.userid_mention(user_id)}")
         else:
             await ctx.send("They have no linked Discord account")
@@ -576,20 +678,19 @@ class SpacebeeCentcom(commands.Cog):
     ):
         """Directly links a Discord user to a BYOND ckey."""
         ckey = self.ckeyify(ckey)
-        current_ckey = await self.config.user(target).linked_ckey()
+        current_ckey = await self.get_ckey(target)
         if current_ckey:
             await ctx.send(
                 f"That user is already linked to a ckey `{current_ckey}`. Unlink it first."
             )
             return
-        ckeys_linked_account = await self.config.custom("ckey", ckey).discord_id()
+        ckeys_linked_account = await self.ckey_to_user_id(ckey)
         if ckeys_linked_account:
             await ctx.send(
                 f"That ckey is already linked to user <@{ckeys_linked_account}>."
             )
             return
-        await self.config.user(target).linked_ckey.set(ckey)
-        await self.config.custom("ckey", ckey).discord_id.set(target.id)
+        await self.set_link(target.id, ckey)
         msg = f"Linked ckey `{ckey}` to {target.mention}"
         if current_ckey:
             msg += f" (Their previous ckey was `{current_ckey}`)"
@@ -600,21 +701,21 @@ class SpacebeeCentcom(commands.Cog):
         await ctx.send(msg)
 
     async def user_to_ckey(self, user):
-        return await self.config.user(user).linked_ckey()
+        return await self.get_ckey(user)
 
     @commands.command()
     @checks.admin()
     async def checklink(self, ctx: commands.Context, target: Union[discord.User, str]):
         """Checks linked account of a Discord user."""
         if not isinstance(target, str):
-            current_ckey = await self.config.user(target).linked_ckey()
+            current_ckey = await self.get_ckey(target)
             if current_ckey:
                 await ctx.send(f"{target.mention}'s ckey is `{current_ckey}`")
             else:
                 await ctx.send(f"{target.mention} has not linked their account")
         else:
             ckey = self.ckeyify(target)
-            user_id = await self.config.custom("ckey", ckey).discord_id()
+            user_id = await self.ckey_to_user_id(ckey)
             if user_id:
                 await ctx.send(
                     f"`{ckey}`'s Discord account is {self.userid_mention(user_id)}"
@@ -640,7 +741,9 @@ class SpacebeeCentcom(commands.Cog):
         msgid = "Discord " + str(message.id)
         if type in ["ahelp", "mhelp"]:
             data["msgid"] = msgid
-        previous_msgid = self.message_to_id.get(replied_to_msg, None)
+        previous_msgid = (
+            self.threads.msgid_of(replied_to_msg.id) if replied_to_msg else None
+        )
         response = await goonservers.send_to_server_safe(
             server, data, message, to_dict=True
         )
@@ -686,8 +789,7 @@ class SpacebeeCentcom(commands.Cog):
                     exception=message.channel.id,
                 )
             if type in ["ahelp", "mhelp"]:
-                self.message_to_id[message] = msgid
-                self.id_to_messages[msgid].append(message)
+                self.threads.add_relayed(msgid, message.channel.id, message.id)
             return True
         return False
 
@@ -791,7 +893,7 @@ class SpacebeeCentcom(commands.Cog):
         Lists unanswered messages in this channel in reverse chronological order.
 
         You can react with \N{CLOSED MAILBOX WITH LOWERED FLAG} manually to a message to mark
-        it as resolved. Only messages from last 24 hours or since last bot restart are displayed.
+        it as resolved. Only messages from last 24 hours are displayed.
         """
         author_ckey = await self.get_ckey(ctx.author)
         if author_ckey is None:
@@ -801,27 +903,44 @@ class SpacebeeCentcom(commands.Cog):
         if ctx.channel.id not in goonservers.valid_channels:
             await ctx.reply("Wrong channel.")
             return False
-        unanswered_list = []
-        for msg in reversed(self.initiating_messages.values()):
-            if (datetime.datetime.now().replace(tzinfo=None) - msg.created_at.replace(tzinfo=None)) > datetime.timedelta(days = 1):
-                break
-            if await self.is_initiating_message(msg) and \
-                    not any(react.emoji == self.REPLIED_TO_EMOJI for react in msg.reactions) and \
-                    msg.channel == ctx.channel:
-                unanswered_list.append(msg)
-        def format_msg(msg):
-            msg_text = ""
-            if len(msg.embeds) > 0 and msg.embeds[0].description:
-                msg_text = msg.embeds[0].description
-                if len(msg_text) > 100:
-                    msg_text = msg_text[:97] + "..."
-            return msg.jump_url + " " + msg_text
+        unanswered_list = self.threads.open_tickets(ctx.channel.id, self.unanswered_cutoff())
         if len(unanswered_list) == 0:
             await ctx.reply("No unanswered messages!")
         else:
-            for page in pagify("\n".join(format_msg(msg) for msg in unanswered_list)):
+            for page in pagify("\n".join(ticket.jump_url + " " + ticket.summary for ticket in unanswered_list)):
                 await ctx.reply(page)
 
+    def unanswered_cutoff(self):
+        return datetime.datetime.now().timestamp() - self.UNANSWERED_MAX_AGE.total_seconds()
+
+    def format_age(self, seconds):
+        minutes = int(seconds) // 60
+        if minutes < 60:
+            return f"{minutes}m"
+        return f"{minutes // 60}h{minutes % 60:02}m"
+
+    @commands.command()
+    async def unansweredstats(self, ctx: commands.Context):
+        """Shows counts and ages of unanswered messages in all relay channels."""
+        goonservers = self.bot.get_cog("GoonServers")
+        if ctx.channel.id not in goonservers.valid_channels:
+            await ctx.reply("Wrong channel.")
+            return
+        stats = self.threads.ticket_stats(datetime.datetime.now().timestamp(), self.unanswered_cutoff())
+        if not stats:
+            await ctx.reply("No unanswered messages!")
+            return
+        lines = []
+        for channel_id, channel_stats in stats.items():
+            lines.append(
+                f"<#{channel_id}>: {channel_stats['count']} unanswered, "
+                f"median age {self.format_age(channel_stats['p50'])}, "
+                f"p90 {self.format_age(channel_stats['p90'])}, "
+                f"oldest {self.format_age(channel_stats['oldest'])}"
+            )
+        for page in pagify("\n".join(lines)):
+            await ctx.reply(page)
+
     async def process_discord_replies(self, message: discord.Message):
         reference = message.reference
         if reference is None:
@@ -917,8 +1036,8 @@ class SpacebeeCentcom(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent) -> None:
-        if str(payload.emoji) == self.REPLIED_TO_EMOJI and payload.message_id in self.initiating_messages:
-            del self.initiating_messages[payload.message_id]
+        if str(payload.emoji) == self.REPLIED_TO_EMOJI:
+            self.threads.close_ticket(payload.message_id)
 
     @commands.Cog.listener()
     async def on_reaction_add(reaction, user):
@@ -931,11 +1050,11 @@ class SpacebeeCentcom(commands.Cog):
         if reaction.me is False:
             return
 
-        if str(reaction.emoji) == "\N{BLUE SQUARE}":
+        if str(reaction.emoji) == "\N{LARGE BLUE SQUARE}":
             message = "notes"
-        elif str(reaction.emoji == "\N{YELLOW SQUARE}"):
+        elif str(reaction.emoji == "\N{LARGE YELLOW SQUARE}"):
             message = "pm"
-        elif str(reaction.emoji == "\N{RED SQUARE}"):
+        elif str(reaction.emoji == "\N{LARGE RED SQUARE}"):
             message = "ban"
             
         await self.check_and_send_message(
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import threading
+import urllib.parse
+from concurrent.futures.thread import ThreadPoolExecutor
+from pathlib import Path
+from typing import *
+import xattr
+import yt_dlp
+
+log = logging.getLogger("red.goon.spacebeecommands")
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+class TooLargeError(Exception):
+    pass
+
+
+class YoutubeAudioCache:
+    """Audio of YouTube videos converted to mp3, served from GeneralApi's static folder.
+
+    Files are named by video ID so a video is downloaded once however its URL looks.
+    Concurrent requests for the same video share one download, each download goes to
+    its own partial folder and is moved into place when done. The folder is kept
+    under `budget` bytes by deleting the least recently played files. yt_dlp runs in
+    a small thread pool, never on the event loop."""
+
+    WORKERS = 2
+
+    def __init__(self, path: Path, max_filesize: int, budget: int = 2 * 1024 * 1024 * 1024):
+        self.path = Path(path)
+        self.partial_path = self.path / ".partial"
+        self.max_filesize = max_filesize
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(max_workers=self.WORKERS)
+        self.in_flight = {}
+        self.titles = {}
+        self.disk_size = None
+        self.disk_lock = threading.Lock()
+        self.stats = {"hits": 0, "downloads": 0, "deduped": 0}
+        self.path.mkdir(parents=True, exist_ok=True)
+        # leftovers of downloads interrupted by a restart
+        shutil.rmtree(self.partial_path, ignore_errors=True)
+
+    def close(self):
+        for task in self.in_flight.values():
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def video_id(url: str) -> Optional[str]:
+        """Parses the video ID out of the usual YouTube URL shapes without asking yt_dlp."""
+        try:
+            parsed = urllib.parse.urlparse(url)
+        except ValueError:
+            return None
+        host = (parsed.hostname or "").lower()
+        video_id = None
+        if host == "youtu.be":
+            video_id = parsed.path.lstrip("/").split("/")[0]
+        elif host.endswith("youtube.com"):
+            if parsed.path == "/watch":
+                video_id = urllib.parse.parse_qs(parsed.query).get("v", [None])[0]
+            else:
+                parts = parsed.path.strip("/").split("/")
+                if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                    video_id = parts[1]
+        if video_id and VIDEO_ID_RE.match(video_id):
+            return video_id
+        return None
+
+    def file_name(self, video_id: str) -> str:
+        return video_id + ".mp3"
+
+    def file_path(self, video_id: str) -> Path:
+        return self.path / self.file_name(video_id)
+
+    async def fetch(self, url: str) -> Tuple[str, str]:
+        """Returns (file name, title) of the mp3 of the video at `url`.
+
+        Raises TooLargeError if the video is over the size limit and yt_dlp's
+        DownloadError if it can't be downloaded."""
+        loop = asyncio.get_running_loop()
+        video_id = self.video_id(url)
+        if video_id is None:
+            video_id = await loop.run_in_executor(self.executor, self.extract_id, url)
+            if not VIDEO_ID_RE.match(video_id):
+                raise yt_dlp.utils.DownloadError(f"Unsupported video ID {video_id!r}")
+        task = self.in_flight.get(video_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(video_id, url))
+            self.in_flight[video_id] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(video_id, None))
+        else:
+            self.stats["deduped"] += 1
+        title = await asyncio.shield(task)
+        return self.file_name(video_id), title
+
+    def touch(self, video_id: str) -> bool:
+        try:
+            os.utime(self.file_path(video_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def title(self, video_id: str) -> str:
+        title = self.titles.get(video_id)
+        if title is None:
+            title = await asyncio.get_running_loop().run_in_executor(None, self.read_title, video_id)
+            self.titles[video_id] = title
+        return title
+
+    def read_title(self, video_id: str) -> str:
+        try:
+            return xattr.getxattr(str(self.file_path(video_id)), "user.dublincore.title").decode("utf8")
+        except (OSError, UnicodeDecodeError):
+            return video_id
+
+    def extract_id(self, url: str) -> str:
+        with yt_dlp.YoutubeDL({"geo_bypass": True, "noplaylist": True, "quiet": True}) as ydl:
+            # without processing this doesn't look at the formats, which is the slow part
+            return ydl.extract_info(url, download=False, process=False)["id"]
+
+    async def _fetch(self, video_id: str, url: str) -> str:
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, self.touch, video_id):
+            self.stats["hits"] += 1
+            return await self.title(video_id)
+        title = await loop.run_in_executor(self.executor, self.download_sync, video_id, url)
+        self.titles[video_id] = title
+        self.stats["downloads"] += 1
+        return title
+
+    def download_sync(self, video_id: str, url: str) -> str:
+        partial_dir = self.partial_path / video_id
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        postprocessors = [
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": "mp3",
+                "preferredquality": "8",
+                "nopostoverwrites": False,
+            },
+            {
+                "key": "XAttrMetadata",
+            }
+        ]
+        ydl_opts = {
+            "format": "worstaudio/worst",
+            "geo_bypass": True,
+            "outtmpl": str(partial_dir / f"{video_id}.%(ext)s"),
+            "postprocessors": postprocessors,
+            "max_filesize": self.max_filesize,
+            "noplaylist": True,
+            "quiet": True,
+        }
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+                filesize = min(
+                    (
+                        fmt["filesize"]
+                        for fmt in info.get("formats") or []
+                        if isinstance(fmt.get("filesize"), int)
+                    ),
+                    default=None,
+                )
+                if filesize is not None and filesize > self.max_filesize:
+                    raise TooLargeError(f"too large {filesize}")
+                ydl.process_ie_result(info, download=True)
+            converted = next(partial_dir.glob("*.mp3"), None)
+            if converted is None:
+                raise yt_dlp.utils.DownloadError("No audio was produced (the file might be too large)")
+            file_path = self.file_path(video_id)
+            size = converted.stat().st_size
+            os.replace(converted, file_path)
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+        with self.disk_lock:
+            if self.disk_size is not None:
+                self.disk_size += size
+            self.trim()
+        return info.get("title") or video_id
+
+    def trim(self):
+        """Deletes the least recently played files until the folder fits its budget."""
+        if self.disk_size is not None and self.disk_size <= self.budget:
+            return
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.is_file() or not entry.name.endswith(".mp3"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        self.disk_size = sum(size for _, size, _, _ in entries)
+        entries.sort()
+        # always keep the newest file, it's about to be played
+        for _, size, path, name in entries[:-1]:
+            if self.disk_size <= self.budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                log.exception("Failed to evict %s from the YouTube audio cache", name)
+                continue
+            self.disk_size -= size
+            self.titles.pop(name[:-len(".mp3")], None)
@@ -0,0 +1,162 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import secrets
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import *
+
+log = logging.getLogger("red.goon.spacebeecommands")
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class ProcStats(NamedTuple):
+    name: str
+    self: float
+    total: float
+    real: float
+    over: float
+    calls: int
+
+
+class ProfilerRequest:
+    __slots__ = ("request_id", "message", "server_id", "created_at")
+
+    def __init__(self, request_id: str, message, server_id: str, created_at: float):
+        self.request_id = request_id
+        self.message = message
+        self.server_id = server_id
+        self.created_at = created_at
+
+
+def parse_profile(path) -> Optional[List[ProcStats]]:
+    """Reads a gzipped BYOND profiler JSON dump, None if it isn't the proc profiler's format."""
+    with gzip.open(path, "rt", encoding="utf8") as f:
+        try:
+            data = json.load(f)
+        except ValueError:
+            return None
+    if not isinstance(data, list):
+        return None
+    procs = []
+    for entry in data:
+        if not isinstance(entry, dict) or "name" not in entry or "self" not in entry:
+            continue
+        try:
+            procs.append(
+                ProcStats(
+                    str(entry["name"]),
+                    float(entry.get("self") or 0),
+                    float(entry.get("total") or 0),
+                    float(entry.get("real") or 0),
+                    float(entry.get("over") or 0),
+                    int(entry.get("calls") or 0),
+                )
+            )
+        except (TypeError, ValueError):
+            continue
+    return procs or None
+
+
+def top_procs(procs: List[ProcStats], key: str, count: int = 10) -> List[ProcStats]:
+    return sorted(procs, key=lambda proc: getattr(proc, key), reverse=True)[:count]
+
+
+class ProfilerResults:
+    """Profiler dumps posted by game servers, matched to the commands that asked for them.
+
+    Every request gets an ID which is sent to the game along with the profiler
+    command. A result is matched by that ID if the game passes it back, otherwise by
+    the server that sent it and as the last resort by age, so older game builds keep
+    working. Uploads are streamed to disk gzipped and the newest `keep` dumps stay
+    around in `path`."""
+
+    REQUEST_TIMEOUT = 10 * 60
+    MAX_UPLOAD = 200 * 1024 * 1024
+    WRITE_BUFFER = 1024 * 1024
+
+    def __init__(self, path: Path, keep: int = 50):
+        self.path = Path(path)
+        self.keep = keep
+        self.pending = OrderedDict()
+
+    def register(self, message, server_id: str) -> str:
+        self.expire()
+        request_id = secrets.token_hex(8)
+        self.pending[request_id] = ProfilerRequest(request_id, message, server_id, time.time())
+        return request_id
+
+    def cancel(self, request_id: str):
+        """Forgets a request, for when the command sending it to the game failed."""
+        self.pending.pop(request_id, None)
+
+    def expire(self):
+        cutoff = time.time() - self.REQUEST_TIMEOUT
+        while self.pending:
+            request = next(iter(self.pending.values()))
+            if request.created_at >= cutoff:
+                break
+            self.pending.popitem(last=False)
+
+    def claim(self, request_id: Optional[str], server_id: Optional[str], server_matches) -> Optional[ProfilerRequest]:
+        """Pops the request a result belongs to.
+
+        `server_matches(server_id, request)` decides whether a server name from the
+        game refers to the server a request was sent to."""
+        self.expire()
+        if request_id is not None and request_id in self.pending:
+            return self.pending.pop(request_id)
+        if server_id is not None:
+            for request in self.pending.values():
+                if server_matches(server_id, request):
+                    return self.pending.pop(request.request_id)
+        if request_id is None and server_id is None and self.pending:
+            return self.pending.popitem(last=False)[1]
+        return None
+
+    async def receive(self, chunks: AsyncIterator[bytes], name: str) -> Tuple[Path, int]:
+        """Streams an upload into `<name>.json.gz`, returns its path and uncompressed size."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: self.path.mkdir(parents=True, exist_ok=True))
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        out = await loop.run_in_executor(None, lambda: gzip.open(tmp_path, "wb", compresslevel=6))
+        size = 0
+        buffer = []
+        buffered = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.MAX_UPLOAD:
+                    raise UploadTooLargeError(f"profiler result over {self.MAX_UPLOAD} bytes")
+                buffer.append(chunk)
+                buffered += len(chunk)
+                if buffered >= self.WRITE_BUFFER:
+                    await loop.run_in_executor(None, out.write, b"".join(buffer))
+                    buffer = []
+                    buffered = 0
+            await loop.run_in_executor(None, out.write, b"".join(buffer))
+            await loop.run_in_executor(None, out.close)
+            path = self.path / f"{name}.json.gz"
+            os.replace(tmp_path, path)
+        except BaseException:
+            out.close()
+            os.remove(tmp_path)
+            raise
+        await loop.run_in_executor(None, self.trim)
+        return path, size
+
+    def trim(self):
+        dumps = sorted(self.path.glob("*.json.gz"), key=lambda path: path.stat().st_mtime)
+        for path in dumps[:-self.keep]:
+            try:
+                path.unlink()
+            except OSError:
+                log.exception("Failed to delete old profiler result %s", path.name)
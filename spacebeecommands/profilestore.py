@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+from typing import *
+from .profiler import ProcStats
+
+
+class Snapshot(NamedTuple):
+    snapshot_id: int
+    server_id: str
+    revision: Optional[str]
+    created_at: float
+    file_name: Optional[str]
+    proc_count: int
+
+
+class ProcDiff(NamedTuple):
+    name: str
+    old_share: float
+    new_share: float
+    old_per_call: Optional[float]
+    new_per_call: Optional[float]
+    old_calls: int
+    new_calls: int
+
+    @property
+    def change(self) -> float:
+        return self.new_share - self.old_share
+
+
+class ProfileStore:
+    """Proc profiler snapshots of game servers kept in SQLite for comparing over time.
+
+    Each snapshot stores the server, code revision and time along with every proc's
+    self, total and real time and call count. The oldest snapshots are dropped past
+    `max_snapshots`. Methods are blocking and safe to call from executor threads."""
+
+    METRICS = ("self", "total", "real")
+
+    def __init__(self, path, max_snapshots: int = 500):
+        self.max_snapshots = max_snapshots
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, server_id TEXT NOT NULL, revision TEXT, created_at REAL NOT NULL, file_name TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS snapshots_revision ON snapshots (revision)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS procs (snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE, name TEXT NOT NULL, self REAL NOT NULL, total REAL NOT NULL, real REAL NOT NULL, calls INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS procs_snapshot ON procs (snapshot_id)")
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def add_snapshot(
+        self,
+        server_id: str,
+        revision: Optional[str],
+        created_at: float,
+        file_name: Optional[str],
+        procs: List[ProcStats],
+    ) -> int:
+        with self.lock, self.db:
+            snapshot_id = self.db.execute(
+                "INSERT INTO snapshots (server_id, revision, created_at, file_name) VALUES (?, ?, ?, ?)",
+                (server_id, revision, created_at, file_name),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO procs (snapshot_id, name, self, total, real, calls) VALUES (?, ?, ?, ?, ?, ?)",
+                ((snapshot_id, p.name, p.self, p.total, p.real, p.calls) for p in procs),
+            )
+            self.db.execute(
+                "DELETE FROM snapshots WHERE id NOT IN (SELECT id FROM snapshots ORDER BY id DESC LIMIT ?)",
+                (self.max_snapshots,),
+            )
+        return snapshot_id
+
+    def snapshots(self, server_id: Optional[str] = None, limit: int = 20) -> List[Snapshot]:
+        """Newest snapshots first, optionally of one server only."""
+        query = "SELECT s.id, s.server_id, s.revision, s.created_at, s.file_name, (SELECT COUNT(*) FROM procs WHERE snapshot_id = s.id) FROM snapshots s"
+        params = []
+        if server_id is not None:
+            query += " WHERE s.server_id = ?"
+            params.append(server_id)
+        query += " ORDER BY s.id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return [Snapshot(*row) for row in self.db.execute(query, params)]
+
+    def resolve(self, spec: str, server_id: Optional[str] = None) -> List[int]:
+        """Snapshot IDs meant by `spec`, either a snapshot ID or a (prefix of a) revision."""
+        with self.lock:
+            if spec.isdigit():
+                row = self.db.execute("SELECT id FROM snapshots WHERE id = ?", (int(spec),)).fetchone()
+                if row is not None:
+                    return [row[0]]
+            query = "SELECT id FROM snapshots WHERE revision LIKE ? ESCAPE '\\'"
+            params = [spec.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+            if server_id is not None:
+                query += " AND server_id = ?"
+                params.append(server_id)
+            return [row[0] for row in self.db.execute(query, params)]
+
+    def aggregate(self, snapshot_ids: List[int], metric: str) -> Dict[str, Tuple[float, int]]:
+        """Summed `metric` and calls per proc over the given snapshots."""
+        if metric not in self.METRICS:
+            raise ValueError(f"unknown metric {metric}")
+        placeholders = ", ".join("?" * len(snapshot_ids))
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT name, SUM({metric}), SUM(calls) FROM procs WHERE snapshot_id IN ({placeholders}) GROUP BY name",
+                snapshot_ids,
+            ).fetchall()
+        return {name: (value, calls) for name, value, calls in rows}
+
+    def diff(self, old_ids: List[int], new_ids: List[int], metric: str = "self", count: int = 15) -> List[ProcDiff]:
+        """Procs whose share of the profiled time grew the most from `old_ids` to `new_ids`.
+
+        Snapshots cover different lengths of time, so every proc's cost is compared as
+        a fraction of all procs' summed self time rather than in absolute seconds."""
+        old = self.aggregate(old_ids, metric)
+        new = self.aggregate(new_ids, metric)
+        old_base = sum(self_time for self_time, _ in self.aggregate(old_ids, "self").values()) or 1
+        new_base = sum(self_time for self_time, _ in self.aggregate(new_ids, "self").values()) or 1
+        diffs = []
+        for name in old.keys() | new.keys():
+            old_value, old_calls = old.get(name, (0.0, 0))
+            new_value, new_calls = new.get(name, (0.0, 0))
+            diffs.append(
+                ProcDiff(
+                    name,
+                    old_value / old_base,
+                    new_value / new_base,
+                    old_value / old_calls if old_calls else None,
+                    new_value / new_calls if new_calls else None,
+                    old_calls,
+                    new_calls,
+                )
+            )
+        diffs.sort(key=lambda diff: diff.change, reverse=True)
+        return [diff for diff in diffs[:count] if diff.change > 0]
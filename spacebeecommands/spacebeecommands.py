@@ -6,6 +6,7 @@ import discord
 from redbot.core import commands, Config, checks
 import discord.errors
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 from typing import *
 from fastapi import Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
@@ -18,15 +19,20 @@ import time
 import io
 import os
 import datetime
+import logging
 from pydantic import BaseModel
 from starlette.requests import Request
 from starlette.responses import Response
-from concurrent.futures.thread import ThreadPoolExecutor
 import yt_dlp
 import base64
 from PIL import Image
 import contextlib
-import xattr
+from .mediacache import YoutubeAudioCache, TooLargeError
+from .ytsearch import YoutubeSearcher, SearchBusyError
+from .profilestore import ProfileStore
+from .profiler import ProfilerResults, ProfilerRequest, ProcStats, UploadTooLargeError, parse_profile, top_procs
+
+log = logging.getLogger("red.goon.spacebeecommands")
 
 @contextlib.asynccontextmanager
 async def empty_context_manager():
@@ -44,45 +50,138 @@ class PlayMenu(SimpleMenu):
 
 class SpacebeeCommands(commands.Cog):
     FILE_SIZE_LIMIT = 15 * 1024 * 1024
+    PROFILER_ATTACHMENT_LIMIT = 8 * 1024 * 1024
+    PROFILER_SUMMARY_COUNT = 8
+    MEDIA_CACHE_BUDGET = 2 * 1024 * 1024 * 1024
 
     def __init__(self, bot: Red):
         self.bot = bot
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self.last_profiler_check_message = None
-        self.last_profiler_id = None
+        self.searcher = YoutubeSearcher()
+        self.media_cache = None
+        self.profiler_results = None
+        self.profile_store = None
+        self.background_tasks = set()
+
+    def cog_unload(self):
+        for task in self.background_tasks:
+            task.cancel()
+        self.searcher.close()
+        if self.media_cache is not None:
+            self.media_cache.close()
+        if self.profile_store is not None:
+            self.profile_store.close()
 
     def register_to_general_api(self, app):
         @app.post("/profiler_result", response_class=Response)
-        async def profiler_result(request: Request):
-            if self.last_profiler_check_message is None:
+        async def profiler_result(
+            request: Request, request_id: Optional[str] = None, server: Optional[str] = None
+        ):
+            results = self.get_profiler_results()
+            profiler_request = results.claim(request_id, server, self.profiler_server_matches)
+            if profiler_request is None:
                 return
+            server_id = profiler_request.server_id
             dat_string = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            prof_file = discord.File(
-                io.BytesIO(await request.body()),
-                filename=f"profiling_{self.last_profiler_id}_{dat_string}.json",
-            )
-            msg = "Consider using https://mini.xkeeper.net/ss13/profiler/ to view the results:"
-            await self.last_profiler_check_message.reply(msg, file=prof_file)
-            self.last_profiler_check_message = None
+            try:
+                path, raw_size = await results.receive(
+                    request.stream(), f"profiling_{server_id}_{dat_string}_{profiler_request.request_id}"
+                )
+            except UploadTooLargeError as e:
+                self.spawn(profiler_request.message.reply(f"Profiler result dropped: {e}"))
+                raise HTTPException(status_code=413, detail=str(e))
+            self.spawn(self.deliver_profiler_result(profiler_request, path, raw_size))
             return "ok"
 
-    def format_whois(self, response):
-        count = int(response["count"])
+    def spawn(self, coro):
+        """Runs Discord delivery in the background so API requests from the game return right away."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+        return task
+
+    def _background_task_done(self, task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Delivering a profiler result failed", exc_info=task.exception())
+
+    def get_profiler_results(self) -> ProfilerResults:
+        if self.profiler_results is None:
+            generalapi = self.bot.get_cog("GeneralApi")
+            self.profiler_results = ProfilerResults(generalapi.static_path / "profiler")
+        return self.profiler_results
+
+    def get_profile_store(self) -> ProfileStore:
+        if self.profile_store is None:
+            self.profile_store = ProfileStore(cog_data_path(self) / "profiles.sqlite3")
+        return self.profile_store
+
+    def profiler_server_matches(self, server_name: str, request: ProfilerRequest) -> bool:
+        goonservers = self.bot.get_cog("GoonServers")
+        server = goonservers.resolve_server(server_name)
+        return server is not None and server is goonservers.resolve_server(request.server_id)
+
+    def format_profiler_summary(self, procs: List[ProcStats]) -> str:
+        lines = []
+        for key in ("self", "total"):
+            lines.append(f"Top procs by {key} time:")
+            for proc in top_procs(procs, key, self.PROFILER_SUMMARY_COUNT):
+                name = proc.name if len(proc.name) <= 48 else "…" + proc.name[-47:]
+                lines.append(f"{getattr(proc, key):>10.3f} {proc.calls:>9} {name}")
+            lines.append("")
+        return box("\n".join(lines).rstrip())
+
+    def profile_server_key(self, server_id: str) -> str:
+        """Name snapshots of a server are stored under, the same for all of its aliases."""
+        server = self.bot.get_cog("GoonServers").resolve_server(server_id)
+        return server.short_name if server is not None else server_id.lower()
+
+    async def server_revision(self, server_id: str) -> Optional[str]:
+        goonservers = self.bot.get_cog("GoonServers")
+        try:
+            response = await goonservers.send_to_server(server_id, {"type": "rev"}, to_dict=True)
+            return response["msg"].split(" by ")[0].strip()
+        except Exception:
+            log.warning("Couldn't get the revision of %s for a profiler snapshot", server_id, exc_info=True)
+            return None
+
+    async def deliver_profiler_result(self, request: ProfilerRequest, path, raw_size: int):
+        loop = asyncio.get_running_loop()
+        procs = await loop.run_in_executor(None, parse_profile, path)
+        snapshot_id = None
+        if procs:
+            revision = await self.server_revision(request.server_id)
+            snapshot_id = await loop.run_in_executor(
+                None,
+                self.get_profile_store().add_snapshot,
+                self.profile_server_key(request.server_id),
+                revision,
+                time.time(),
+                path.name,
+                procs,
+            )
+        gz_size = path.stat().st_size
+        msg = "Consider using https://mini.xkeeper.net/ss13/profiler/ to view the results"
+        msg += f" ({raw_size / 1024 / 1024:.1f} MB uncompressed)"
+        file = None
+        if gz_size <= self.PROFILER_ATTACHMENT_LIMIT:
+            msg += ":"
+            file = discord.File(str(path), filename=path.name)
+        else:
+            msg += f": https://medass.pali.link/static/profiler/{path.name}"
+        if procs:
+            msg += "\n" + self.format_profiler_summary(procs)
+            msg += f"\nStored as snapshot `{snapshot_id}`, compare snapshots with `profiler diff`."
+        await request.message.reply(msg, file=file)
+
+    def format_whois(self, entries):
         out = []
-        for i in range(1, count + 1):
-            rolestuff = response.get(f"role{i}", "jobless")
-            if response.get(f"dead{i}"):
+        for entry in entries:
+            rolestuff = entry.role
+            if entry.dead:
                 rolestuff += " DEAD"
-            if response.get(f"t{i}"):
+            if entry.traitor:
                 rolestuff += " \N{REGIONAL INDICATOR SYMBOL LETTER T}"
-            line = (
-                response.get(f"name{i}", "-")
-                + " ("
-                + response.get(f"ckey{i}", "-")
-                + ") "
-                + rolestuff
-            )
-            out.append(line)
+            out.append(f"{entry.name} ({entry.ckey}) {rolestuff}")
         if out:
             return "\n".join(out)
         return "No one found."
@@ -96,9 +195,10 @@ class SpacebeeCommands(commands.Cog):
         """Locates a ckey on all servers."""
         who = self.ckeyify(who)
         goonservers = self.bot.get_cog("GoonServers")
+        worldtopic = self.bot.get_cog("WorldTopic")
         servers = [s for s in goonservers.servers if s.type == "goon"]
         futures = [
-            asyncio.Task(goonservers.send_to_server(s, "status", to_dict=True))
+            asyncio.Task(goonservers.get_status_info_cached(s, worldtopic))
             for s in servers
         ]
         message = None
@@ -112,10 +212,14 @@ class SpacebeeCommands(commands.Cog):
             lines = []
             for server, f in zip(servers, futures):
                 if f.done() and f.exception() is None:
-                    result = f.result()
+                    result = f.result()["raw"] or {}
                     server_found = []
                     for k, v in result.items():
-                        if k.startswith("player") and who in self.ckeyify(v):
+                        if (
+                            k.startswith("player")
+                            and isinstance(v, str)
+                            and who in self.ckeyify(v)
+                        ):
                             server_found.append(v)
                     if not server_found:
                         continue
@@ -142,35 +246,22 @@ class SpacebeeCommands(commands.Cog):
     async def whois(self, ctx: commands.Context, server_id: str, *, query: str):
         """Looks for a person on a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id,
-            {
-                "type": "whois",
-                "target": query,
-            },
-            ctx,
-            to_dict=True,
+        entries = await goonservers.send_query_safe(
+            server_id, goonservers.whois_query(query), ctx
         )
-        if response is None:
+        if entries is None:
             return
-        for page in pagify(self.format_whois(response)):
+        for page in pagify(self.format_whois(entries)):
             await ctx.send(page)
 
     @commands.command()
     async def players(self, ctx: commands.Context, server_id: str):
         """Lists players on a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id, "status", ctx.message, to_dict=True
+        players = await goonservers.send_query_safe(
+            server_id, goonservers.QUERY_PLAYERS, ctx.message
         )
-        if response is None:
-            return
-        players = []
-        try:
-            for i in range(int(response["players"])):
-                players.append(response[f"player{i}"])
-        except KeyError:
-            await ctx.message.reply("That server is not responding correctly.")
+        if players is None:
             return
         players.sort()
         if players:
@@ -185,25 +276,21 @@ class SpacebeeCommands(commands.Cog):
         goonservers = self.bot.get_cog("GoonServers")
         spacebeecentcom = self.bot.get_cog("SpacebeeCentcom")
         nightshadewhitelist = self.bot.get_cog("NightshadeWhitelist")
-        response = await goonservers.send_to_server_safe(
-            server_id, "status", ctx.message, to_dict=True
+        players = await goonservers.send_query_safe(
+            server_id, goonservers.QUERY_PLAYERS, ctx.message
         )
-        if response is None:
-            return
-        players = []
-        try:
-            for i in range(int(response["players"])):
-                players.append(response[f"player{i}"])
-        except KeyError:
-            await ctx.message.reply("That server is not responding correctly.")
+        if players is None:
             return
         players.sort()
         if not players:
             await ctx.message.reply("No players.")
+        user_ids = await spacebeecentcom.ckeys_to_user_ids(players)
+        ns_user_ids = await asyncio.gather(
+            *(nightshadewhitelist.config.custom("ckey", p).discord_id() for p in players)
+        )
         output = []
-        for player in players:
-            user_id = await spacebeecentcom.config.custom("ckey", player).discord_id()
-            ns_user_id = await nightshadewhitelist.config.custom("ckey", player).discord_id()
+        for player, ns_user_id in zip(players, ns_user_ids):
+            user_id = user_ids[player]
             if user_id and ns_user_id and ns_user_id == user_id:
                 output.append(f"{player} - <@{user_id}> (NS & G)")
             elif user_id and ns_user_id and ns_user_id != user_id:
@@ -239,17 +326,12 @@ class SpacebeeCommands(commands.Cog):
     async def antags(self, ctx: commands.Context, server_id: str):
         """Lists antagonists on a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id,
-            {
-                "type": "antags",
-            },
-            ctx,
-            to_dict=True,
+        entries = await goonservers.send_query_safe(
+            server_id, goonservers.QUERY_ANTAGS, ctx
         )
-        if response is None:
+        if entries is None:
             return
-        for page in pagify(self.format_whois(response)):
+        for page in pagify(self.format_whois(entries)):
             await ctx.send(page)
 
     @checks.admin()
@@ -405,14 +487,7 @@ RTT: {elapsed * 1000:.2f}ms"""
         await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
 
     async def youtube_search(self, query: str, count: int = 1) -> list[tuple[str, str]]:
-        ydl_opts = {
-            "geo_bypass": True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await asyncio.get_running_loop().run_in_executor(
-                    self.executor, lambda: ydl.extract_info(f"ytsearch{count}:{query}", download=False)
-                )
-            return [(entry['title'], f"https://youtube.com/watch?v={entry['id']}") for entry in info['entries']]
+        return await self.searcher.search(query, count)
 
     @commands.command(rest_is_raw=True, aliases=["musicsearch", "ytsearch"])
     async def youtubesearch(self, ctx: commands.Context, *, query: str, count: int = 1):
@@ -447,8 +522,12 @@ RTT: {elapsed * 1000:.2f}ms"""
         if not query:
             await ctx.reply("You need to provide a search query")
             return
-        async with ctx.typing():
-            data = [f"{title} - {url}" for (title, url) in await self.youtube_search(query, count)]
+        try:
+            async with ctx.typing():
+                data = [f"{title} - {url}" for (title, url) in await self.youtube_search(query, count)]
+        except SearchBusyError:
+            await ctx.reply("Too many searches are running right now, try again in a bit.")
+            return
         if not data:
             await ctx.reply("No results found!")
         else:
@@ -505,64 +584,22 @@ RTT: {elapsed * 1000:.2f}ms"""
             else:
                 await ctx.reply("something went wrong")
 
+    def get_media_cache(self) -> YoutubeAudioCache:
+        if self.media_cache is None:
+            generalapi = self.bot.get_cog("GeneralApi")
+            self.media_cache = YoutubeAudioCache(
+                generalapi.static_path / "youtube", self.FILE_SIZE_LIMIT, self.MEDIA_CACHE_BUDGET
+            )
+        return self.media_cache
+
     async def youtube_play(self, ctx: commands.Context, url: str, server_id: str):
         url = url.lstrip("<").rstrip(">")
-        generalapi = self.bot.get_cog("GeneralApi")
-        file_folder = generalapi.static_path / "youtube"
-        file_folder.mkdir(exist_ok=True)
-        file_name = url
-        if "watch?v=" in file_name:
-            file_name = file_name.split("watch?v=")[1]
-        else:
-            file_name = self.ckeyify(file_name)
-        tmp_file_name = file_name + ".webm"
-        play_file_name = file_name + ".mp3"
-        tmp_file_path = file_folder / tmp_file_name
-        play_file_path = file_folder / play_file_name
-        alt_play_file_path = file_folder / (tmp_file_name + ".mp3")
-        info = None
-        if not play_file_path.is_file():
-            postprocessors = [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "8",
-                    "nopostoverwrites": False,
-                },
-                {
-                    "key": "XAttrMetadata",
-                }
-            ]
-            ydl_opts = {
-                "format": "worstaudio/worst",
-                "geo_bypass": True,
-                "outtmpl": str(tmp_file_path),
-                "postprocessors": postprocessors,
-                "max_filesize": self.FILE_SIZE_LIMIT,
-                "noplaylist": True,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                filesize = min(
-                    fmt["filesize"]
-                    for fmt in info["formats"]
-                    if isinstance(fmt.get("filesize"), int)
-                )
-                if filesize > self.FILE_SIZE_LIMIT:
-                    return None
-                await asyncio.get_running_loop().run_in_executor(
-                    self.executor, ydl.download, [url]
-                )
-        if alt_play_file_path.is_file():
-            os.rename(alt_play_file_path, play_file_path)
-        if not play_file_path.is_file():
+        try:
+            play_file_name, title = await self.get_media_cache().fetch(url)
+        except TooLargeError:
             return None
-        title = info["title"] if info else None
-        if title is None:
-            try:
-                title = xattr.getxattr(str(play_file_path), "user.dublincore.title").decode("utf8")
-            except:
-                title = file_name
+        video = self.searcher.video(play_file_name.rsplit(".", 1)[0])
+        duration = int(video["duration"]) if video and video["duration"] else "?"
         goonservers = self.bot.get_cog("GoonServers")
         response = await goonservers.send_to_server_safe(
             server_id,
@@ -572,7 +609,7 @@ RTT: {elapsed * 1000:.2f}ms"""
                     {
                         "key": ctx.message.author.name + " (Discord)",
                         "file": f"https://medass.pali.link/static/youtube/{play_file_name}",
-                        "duration": "?",
+                        "duration": duration,
                         "title": title,
                     }
                 ),
@@ -684,20 +721,10 @@ RTT: {elapsed * 1000:.2f}ms"""
     async def admins(self, ctx: commands.Context, server_id: str):
         """Lists admins in a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id, "admins", ctx.message, to_dict=True
+        admins = await goonservers.send_query_safe(
+            server_id, goonservers.QUERY_ADMINS, ctx.message
         )
-        if response is None:
-            return
-        admins = []
-        try:
-            for i in range(int(response["admins"])):
-                admin = response[f"admin{i}"]
-                if admin.startswith("~"):
-                    continue
-                admins.append(admin)
-        except KeyError:
-            await ctx.message.reply("That server is not responding correctly.")
+        if admins is None:
             return
         admins.sort()
         if admins:
@@ -710,18 +737,10 @@ RTT: {elapsed * 1000:.2f}ms"""
     async def mentors(self, ctx: commands.Context, server_id: str):
         """Lists mentors in a given Goonstation server."""
         goonservers = self.bot.get_cog("GoonServers")
-        response = await goonservers.send_to_server_safe(
-            server_id, "mentors", ctx.message, to_dict=True
+        mentors = await goonservers.send_query_safe(
+            server_id, goonservers.QUERY_MENTORS, ctx.message
         )
-        if response is None:
-            return
-        mentors = []
-        try:
-            for i in range(int(response["mentors"])):
-                mentor = response[f"mentor{i}"]
-                mentors.append(mentor)
-        except KeyError:
-            await ctx.message.reply("That server is not responding correctly.")
+        if mentors is None:
             return
         mentors.sort()
         if mentors:
@@ -729,6 +748,24 @@ RTT: {elapsed * 1000:.2f}ms"""
         else:
             await ctx.message.reply("No mentors.")
 
+    @checks.admin()
+    @commands.command()
+    async def staff(self, ctx: commands.Context, server_id: str):
+        """Lists admins and mentors in a given Goonstation server."""
+        goonservers = self.bot.get_cog("GoonServers")
+        results = await goonservers.send_batch_to_server_safe(
+            server_id,
+            {"admins": goonservers.QUERY_ADMINS, "mentors": goonservers.QUERY_MENTORS},
+            ctx.message,
+        )
+        if results is None:
+            return
+        lines = []
+        for name in ("admins", "mentors"):
+            people = sorted(results[name])
+            lines.append(f"**{name.capitalize()}:** {', '.join(people) if people else 'none'}")
+        await ctx.message.reply("\n".join(lines))
+
     @commands.command()
     @commands.cooldown(1, 1)
     @commands.max_concurrency(1, wait=True)
@@ -844,18 +881,20 @@ RTT: {elapsed * 1000:.2f}ms"""
     ):
         """Stops the profiler on a given server, returns output."""
         goonservers = self.bot.get_cog("GoonServers")
-        self.last_profiler_check_message = ctx.message
-        self.last_profiler_id = server_id
+        results = self.get_profiler_results()
+        request_id = results.register(ctx.message, server_id)
         response = await goonservers.send_to_server_safe(
             server_id,
             {
                 "type": "profile",
                 "action": "stop",
                 "profiler_type": type,
+                "request_id": request_id,
             },
             ctx,
         )
         if response is None:
+            results.cancel(request_id)
             return
         if response == 1:
             await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
@@ -944,8 +983,8 @@ RTT: {elapsed * 1000:.2f}ms"""
     ):
         """Fetches and returns current profiling data of a server."""
         goonservers = self.bot.get_cog("GoonServers")
-        self.last_profiler_check_message = ctx.message
-        self.last_profiler_id = server_id
+        results = self.get_profiler_results()
+        request_id = results.register(ctx.message, server_id)
         response = await goonservers.send_to_server_safe(
             server_id,
             {
@@ -953,10 +992,12 @@ RTT: {elapsed * 1000:.2f}ms"""
                 "action": "refresh",
                 "profiler_type": type,
                 "average": average,
+                "request_id": request_id,
             },
             ctx,
         )
         if response is None:
+            results.cancel(request_id)
             return
         if response == 1:
             await ctx.message.add_reaction("\N{WHITE HEAVY CHECK MARK}")
@@ -966,6 +1007,72 @@ RTT: {elapsed * 1000:.2f}ms"""
         # prof_file = discord.File(io.StringIO(response), filename=f"profiling_{server_id}_{dat_string}.json")
         # await ctx.send(file=prof_file)
 
+    @profiler.command(name="history")
+    async def profiler_history(self, ctx: commands.Context, server_id: Optional[str] = None):
+        """Lists stored profiler snapshots, of a given server or all of them."""
+        server_key = self.profile_server_key(server_id) if server_id is not None else None
+        snapshots = await asyncio.get_running_loop().run_in_executor(
+            None, self.get_profile_store().snapshots, server_key
+        )
+        if not snapshots:
+            await ctx.send("No profiler snapshots stored.")
+            return
+        lines = [
+            f"{snapshot.snapshot_id:>5} {snapshot.server_id:<12} {(snapshot.revision or '?')[:10]:<10} "
+            f"{datetime.datetime.fromtimestamp(snapshot.created_at):%Y-%m-%d %H:%M} {snapshot.proc_count:>6} procs"
+            for snapshot in snapshots
+        ]
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
+
+    @profiler.command(name="diff")
+    async def profiler_diff(
+        self,
+        ctx: commands.Context,
+        old: str,
+        new: str,
+        metric: str = "self",
+        server_id: Optional[str] = None,
+    ):
+        """Ranks the procs whose cost grew the most between two snapshots or revisions.
+
+        `old` and `new` are snapshot IDs from `profiler history` or (prefixes of) code revisions,
+        all snapshots of a revision are added together. `metric` is `self`, `total` or `real`.
+        Costs are compared as a share of all profiled time since snapshots differ in length."""
+        if metric not in ProfileStore.METRICS:
+            await ctx.send(f"Metric needs to be one of {', '.join(ProfileStore.METRICS)}.")
+            return
+        loop = asyncio.get_running_loop()
+        store = self.get_profile_store()
+        server_key = self.profile_server_key(server_id) if server_id is not None else None
+        old_ids = await loop.run_in_executor(None, store.resolve, old, server_key)
+        new_ids = await loop.run_in_executor(None, store.resolve, new, server_key)
+        for spec, ids in ((old, old_ids), (new, new_ids)):
+            if not ids:
+                await ctx.send(f"No snapshots found for `{spec}`.")
+                return
+        diffs = await loop.run_in_executor(None, store.diff, old_ids, new_ids, metric)
+        if not diffs:
+            await ctx.send("No proc got more expensive.")
+            return
+
+        def per_call(value):
+            return f"{value * 1000:.3f}" if value is not None else "-"
+
+        lines = [f"{'share':>15} {'ms/call':>17} {'calls':>15}  proc"]
+        for diff in diffs:
+            name = diff.name if len(diff.name) <= 48 else "…" + diff.name[-47:]
+            lines.append(
+                f"{diff.old_share:>6.2%} → {diff.new_share:>6.2%} "
+                f"{per_call(diff.old_per_call):>8}→{per_call(diff.new_per_call):<8} "
+                f"{diff.old_calls:>7}→{diff.new_calls:<7}  {name}"
+            )
+        await ctx.send(
+            f"Procs by growth in {metric} time, {len(old_ids)} snapshot(s) → {len(new_ids)} snapshot(s):"
+        )
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
+
     @checks.admin()
     @commands.command()
     async def canvas(self, ctx: commands.Context, server_id: str, *, canvas_name: str = 'centcom'):
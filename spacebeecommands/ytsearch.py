@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import *
+import yt_dlp
+
+
+class SearchBusyError(Exception):
+    pass
+
+
+class TTLCache:
+    """Small LRU mapping whose entries expire `ttl` seconds after being stored."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class YoutubeSearcher:
+    """YouTube searches on a bounded thread pool with cached results.
+
+    Every worker thread keeps one YoutubeDL around instead of creating one per
+    search, and searches only fetch the flat result list rather than every video's
+    formats. Results are cached per normalized query for `ttl` seconds, along with
+    the title and duration of every video seen. Identical concurrent searches share
+    one extraction."""
+
+    WORKERS = 2
+    MAX_PENDING = 16
+
+    def __init__(self, ttl: float = 60 * 60, max_queries: int = 256, max_videos: int = 4096):
+        self.executor = ThreadPoolExecutor(max_workers=self.WORKERS)
+        self.local = threading.local()
+        self.queries = TTLCache(ttl, max_queries)
+        self.videos = TTLCache(ttl, max_videos)
+        self.in_flight = {}
+        self.stats = {"hits": 0, "searches": 0, "deduped": 0}
+
+    def close(self):
+        for future in self.in_flight.values():
+            future.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    def ydl(self) -> yt_dlp.YoutubeDL:
+        ydl = getattr(self.local, "ydl", None)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL({"geo_bypass": True, "extract_flat": "in_playlist", "quiet": True})
+            self.local.ydl = ydl
+        return ydl
+
+    def search_sync(self, query: str, count: int) -> List[dict]:
+        info = self.ydl().extract_info(f"ytsearch{count}:{query}", download=False)
+        return [entry for entry in info.get("entries") or [] if entry and entry.get("id")]
+
+    def video(self, video_id: str) -> Optional[dict]:
+        """Cached title and duration of a video seen in recent search results."""
+        return self.videos.get(video_id)
+
+    async def search(self, query: str, count: int = 1) -> List[Tuple[str, str]]:
+        """Returns up to `count` (title, url) pairs.
+
+        Raises SearchBusyError if too many searches are already queued."""
+        query = self.normalize(query)
+        cached = self.queries.get(query)
+        # a cached longer result list also answers shorter searches
+        if cached is not None and (len(cached[1]) >= count or cached[0] >= count):
+            self.stats["hits"] += 1
+            return cached[1][:count]
+        key = (query, count)
+        future = self.in_flight.get(key)
+        if future is None:
+            if len(self.in_flight) >= self.MAX_PENDING:
+                raise SearchBusyError()
+            future = asyncio.wrap_future(self.executor.submit(self.search_sync, query, count))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            self.stats["searches"] += 1
+        else:
+            self.stats["deduped"] += 1
+        entries = await asyncio.shield(future)
+        results = []
+        for entry in entries:
+            self.videos.set(entry["id"], {"title": entry.get("title"), "duration": entry.get("duration")})
+            results.append((entry.get("title") or entry["id"], f"https://youtube.com/watch?v={entry['id']}"))
+        cached = self.queries.get(query)
+        if cached is None or cached[0] < count:
+            self.queries.set(query, (count, results))
+        return results
@@ -4,6 +4,8 @@ from .tgs import TGS
 
 
 async def setup(bot: Red):
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
     api_tokens = await bot.get_shared_api_tokens("tgs")
     required_keys = {"user", "password", "host"}
     if any(key not in api_tokens for key in required_keys):
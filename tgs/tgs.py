@@ -35,14 +35,18 @@ class TGS(commands.Cog):
 
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.bearer = None
         self.bearer_expires = None
         self.host = None
-        self.session = aiohttp.ClientSession()
         self.server_list_cache = None
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
+
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     def _parse_iso_time(self, text):
         # fromisoformat accepts only exactly 0, 3 or 6 decimal places; screw that
@@ -3,6 +3,7 @@ import json
 from pathlib import Path
 
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 
 from .wikiss13 import Wikiss13
 
@@ -12,5 +13,7 @@ with open(Path(__file__).parent / "info.json") as fp:
 
 async def setup(bot: Red) -> None:
     """Load Wikss13 cog."""
-    cog = Wikiss13()
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
+    cog = Wikiss13(bot)
     await bot.add_cog(cog)
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import *
+
+
+class ResponseCache:
+    """LRU cache of wiki responses where every entry has a freshness lifetime.
+
+    `get` also returns entries that are past their `ttl` but younger than
+    `max_age`, flagged as stale, so callers can answer right away and revalidate
+    in the background. `fetch` runs one shared fetch per key at a time."""
+
+    def __init__(self, ttl: float, max_age: float, max_entries: int):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.stats = {"fresh": 0, "stale": 0, "misses": 0}
+
+    def get(self, key) -> Tuple[Any, bool]:
+        """Returns (value, is_fresh), value is None on a miss."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None, False
+        stored_at, ttl, value = entry
+        age = time.monotonic() - stored_at
+        if age > self.max_age:
+            del self.entries[key]
+            self.stats["misses"] += 1
+            return None, False
+        self.entries.move_to_end(key)
+        fresh = age <= ttl
+        self.stats["fresh" if fresh else "stale"] += 1
+        return value, fresh
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self.entries[key] = (time.monotonic(), self.ttl if ttl is None else ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def fetch(self, key, fetcher: Callable[[], Awaitable[Tuple[Any, Optional[float]]]]):
+        """Runs `fetcher` (returning a value and its ttl or None) and stores its result,
+        concurrent fetches of the same key share one call."""
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetcher))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetcher):
+        value, ttl = await fetcher()
+        self.set(key, value, ttl)
+        return value
@@ -6,11 +6,14 @@ import aiohttp
 import discord
 from dateutil.parser import isoparse
 from redbot.core import __version__ as redbot_version, commands
+from redbot.core.bot import Red
 from redbot.core.utils.chat_formatting import error, warning
 from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 import Levenshtein
 import html
 from itertools import chain
+from typing import *
+from .cache import ResponseCache
 
 __author__ = "PhasecoreX, pali"
 
@@ -42,6 +45,22 @@ class Wikiss13(commands.Cog):
     }
     WIKI_URL = "https://wiki.ss13.co"
     API_URL = WIKI_URL + "/api.php"
+    SEARCH_TTL = 10 * 60
+    SEARCH_MAX_AGE = 24 * 60 * 60
+    PAGE_MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, bot: Red):
+        self.http = bot.get_cog("HttpClient").handle_for(self)
+        # search results by normalized query, revalidated after SEARCH_TTL
+        self.search_cache = ResponseCache(self.SEARCH_TTL, self.SEARCH_MAX_AGE, 512)
+        # rendered pages by (title, fragment, revision), a new revision is a new key
+        self.page_cache = ResponseCache(self.SEARCH_TTL, self.PAGE_MAX_AGE, 1024)
+        self.background_tasks = set()
+
+    def cog_unload(self):
+        for task in self.background_tasks:
+            task.cancel()
+        self.http.close()
 
     async def red_delete_data_for_user(self, **kwargs):
         """Nothing to delete."""
@@ -71,68 +90,32 @@ class Wikiss13(commands.Cog):
     async def wikiss13(self, ctx: commands.Context, *, query: str):
         """Get information from Goonstation Wiki."""
         async with ctx.typing():
-            payload = self.generate_payload(query)
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.API_URL, params=payload, headers=self.HEADERS
-                ) as res:
-                    result = await res.json(content_type=None)
-
-                embed_tasks = []
-                if "query" in result and "pages" in result["query"]:
-                    result["query"]["pages"].sort(
-                        key=lambda unsorted_page: unsorted_page["index"]
+            session = self.http.session
+            result = await self.search(self.normalize_query(query), session)
+
+            embed_tasks = []
+            for page in self.result_pages(result, query):
+                if (
+                    "categories" in page
+                    and page["categories"]
+                    and "title" in page["categories"][0]
+                    and page["categories"][0]["title"]
+                    == self.DISAMBIGUATION_CAT
+                ):
+                    continue  # Skip disambiguation pages
+                if not ctx.channel.permissions_for(ctx.me).embed_links:
+                    # No embeds here :(
+                    await ctx.send(
+                        warning(
+                            f"I'm not allowed to do embeds here, so here's the first result:\n{page['fullurl']}"
+                        )
                     )
-                    pages = result["query"]["pages"]
-                    if "redirects" in result["query"]:
-                        for redirect in result["query"]["redirects"]:
-                            skip = False
-                            for page in pages:
-                                if (
-                                    page["title"] == redirect["to"]
-                                    and not "tofragment" in redirect
-                                ):
-                                    skip = True
-                                    break
-                            if skip:
-                                continue
-                            page = {
-                                "title": redirect["from"],
-                                "fullurl": self.WIKI_URL
-                                + "/"
-                                + self.fix_fragment_urls(redirect["to"]),
-                                "redirect_title": redirect["to"],
-                            }
-                            if "tofragment" in redirect:
-                                page["fullurl"] += "#" + self.fix_fragment_urls(
-                                    redirect["tofragment"]
-                                )
-                                page["tofragment"] = self.fix_fragment_urls(
-                                    redirect["tofragment"]
-                                )
-                            pages.append(page)
-                    pages.sort(key=lambda page: -self.similarity(page["title"], query))
-                    for page in pages:
-                        if (
-                            "categories" in page
-                            and page["categories"]
-                            and "title" in page["categories"][0]
-                            and page["categories"][0]["title"]
-                            == self.DISAMBIGUATION_CAT
-                        ):
-                            continue  # Skip disambiguation pages
-                        if not ctx.channel.permissions_for(ctx.me).embed_links:
-                            # No embeds here :(
-                            await ctx.send(
-                                warning(
-                                    f"I'm not allowed to do embeds here, so here's the first result:\n{page['fullurl']}"
-                                )
-                            )
-                            return
-                        embed_tasks.append(self.generate_embed(page, session))
-                        if not ctx.channel.permissions_for(ctx.me).add_reactions:
-                            break  # Menu can't function so only show first result
-                embeds = await asyncio.gather(*embed_tasks, return_exceptions=True)
+                    return
+                embed_tasks.append(self.page_embed(page, session))
+                if not ctx.channel.permissions_for(ctx.me).add_reactions:
+                    break  # Menu can't function so only show first result
+            embeds = await asyncio.gather(*embed_tasks, return_exceptions=True)
+            embeds = [embed for embed in embeds if isinstance(embed, discord.Embed)]
 
         if not embeds:
             await ctx.send(
@@ -148,6 +131,105 @@ class Wikiss13(commands.Cog):
                 embed.set_author(name=f"Result {count} of {len(embeds)}")
             await menu(ctx, embeds, DEFAULT_CONTROLS, timeout=60.0)
 
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    async def search(self, query: str, session: aiohttp.ClientSession) -> dict:
+        """Search results of a normalized query, stale ones are used while they're revalidated."""
+        result, fresh = self.search_cache.get(query)
+        if result is None:
+            return await self.search_cache.fetch(query, lambda: self.fetch_search(query, session))
+        if not fresh and query not in self.search_cache.in_flight:
+            self.spawn(self.search_cache.fetch(query, lambda: self.fetch_search(query, session)))
+        return result
+
+    async def fetch_search(self, query: str, session: aiohttp.ClientSession):
+        async with session.get(
+            self.API_URL, params=self.generate_payload(query), headers=self.HEADERS
+        ) as res:
+            res.raise_for_status()
+            return await res.json(content_type=None), None
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        # a failed revalidation keeps serving the stale entry until it's too old
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def result_pages(self, result: dict, query: str) -> List[dict]:
+        """Result pages and redirects sorted by similarity to the query, without touching the cached result."""
+        if "query" not in result or "pages" not in result["query"]:
+            return []
+        pages = sorted(result["query"]["pages"], key=lambda unsorted_page: unsorted_page["index"])
+        revisions = {page["title"]: page.get("lastrevid") for page in pages}
+        redirect_pages = []
+        for redirect in result["query"].get("redirects", []):
+            skip = False
+            for page in pages:
+                if (
+                    page["title"] == redirect["to"]
+                    and not "tofragment" in redirect
+                ):
+                    skip = True
+                    break
+            if skip:
+                continue
+            page = {
+                "title": redirect["from"],
+                "fullurl": self.WIKI_URL
+                + "/"
+                + self.fix_fragment_urls(redirect["to"]),
+                "redirect_title": redirect["to"],
+                "lastrevid": revisions.get(redirect["to"]),
+            }
+            if "tofragment" in redirect:
+                page["fullurl"] += "#" + self.fix_fragment_urls(
+                    redirect["tofragment"]
+                )
+                page["tofragment"] = self.fix_fragment_urls(
+                    redirect["tofragment"]
+                )
+            redirect_pages.append(page)
+        pages += redirect_pages
+        pages.sort(key=lambda page: -self.similarity(page["title"], query))
+        return pages
+
+    async def page_embed(self, page_json, session) -> discord.Embed:
+        """Embed of a result page, parsed once per page revision."""
+        revision = page_json.get("lastrevid")
+        key = (page_json["title"], page_json.get("tofragment"), revision)
+        parts, fresh = self.page_cache.get(key)
+        if parts is None:
+            parts = await self.page_cache.fetch(key, lambda: self.fetch_page(page_json, session))
+        elif not fresh and key not in self.page_cache.in_flight:
+            self.spawn(self.page_cache.fetch(key, lambda: self.fetch_page(page_json, session)))
+        return self.make_embed(parts)
+
+    async def fetch_page(self, page_json, session):
+        async with session.get(
+            self.API_URL,
+            params={
+                "action": "parse",
+                "format": "json",
+                "page": page_json["title"],
+                "prop": "text",
+                "redirects": "1",
+                "formatversion": "2",
+            },
+            headers=self.HEADERS,
+        ) as res:
+            res.raise_for_status()
+            result = await res.json(content_type=None)
+        parts = await asyncio.get_running_loop().run_in_executor(
+            None, self.render_page, page_json, result["parse"]["text"]
+        )
+        # without a known revision the page can't be revalidated, so only keep it briefly
+        ttl = None if page_json.get("lastrevid") is None else self.page_cache.max_age
+        return parts, ttl
+
     def generate_payload(self, query: str):
         """Generate the payload for Goonstation Wiki based on a query string."""
         query_tokens = query.split()
@@ -172,49 +254,34 @@ class Wikiss13(commands.Cog):
         }
         return payload
 
-    async def generate_embed(self, page_json, session):
-        """Generate the embed for the json page."""
+    def render_page(self, page_json, page_text: str) -> dict:
+        """Everything needed for the embed of a page, computed from its parsed HTML."""
         title = page_json["title"]
 
-        page_text = None
-        async with session.get(
-            self.API_URL,
-            params={
-                "action": "parse",
-                "format": "json",
-                "page": title,
-                "prop": "text",
-                "redirects": "1",
-                "formatversion": "2",
-            },
-            headers=self.HEADERS,
-        ) as res:
-            result = await res.json(content_type=None)
-            page_text = html.unescape(result["parse"]["text"])
-
-            if "tofragment" in page_json:
-                fragment_match = re.search(
-                    r'id="' + page_json["tofragment"] + r'".*?>', page_text
+        page_text = html.unescape(page_text)
+        if "tofragment" in page_json:
+            fragment_match = re.search(
+                r'id="' + page_json["tofragment"] + r'".*?>', page_text
+            )
+            if fragment_match:
+                page_text = page_text[fragment_match.end() :]
+            else:
+                tab_matches = re.findall(
+                    r'<label class="tabs-label" for="tabs-input-[0-9]*-[0-9]*" data-tabpos="([0-9]*)">(.*?)</label>',
+                    page_text,
                 )
-                if fragment_match:
-                    page_text = page_text[fragment_match.end() :]
+                tab_id = None
+                for tabpos, label in tab_matches:
+                    if self.fix_fragment_urls(label) == page_json["tofragment"]:
+                        tab_id = int(tabpos)
+                        break
+                if tab_id is not None:
+                    page_text = page_text.split(
+                        f'class="tabs-content tabs-content-{tab_id}">'
+                    )[1]
                 else:
-                    tab_matches = re.findall(
-                        r'<label class="tabs-label" for="tabs-input-[0-9]*-[0-9]*" data-tabpos="([0-9]*)">(.*?)</label>',
-                        page_text,
-                    )
-                    tab_id = None
-                    for tabpos, label in tab_matches:
-                        if self.fix_fragment_urls(label) == page_json["tofragment"]:
-                            tab_id = int(tabpos)
-                            break
-                    if tab_id is not None:
-                        page_text = page_text.split(
-                            f'class="tabs-content tabs-content-{tab_id}">'
-                        )[1]
-                    else:
-                        page_text = "ERROR"
-            page_text = re.sub(self.IGNORE_STUFF, "", page_text)
+                    page_text = "ERROR"
+        page_text = re.sub(self.IGNORE_STUFF, "", page_text)
 
         url = page_json["fullurl"]
 
@@ -298,17 +365,26 @@ class Wikiss13(commands.Cog):
         if "redirect_title" in page_json:
             title = title + " → " + page_json["redirect_title"]
 
+        return {
+            "title": title,
+            "description": description,
+            "url": url,
+            "image": image,
+            "timestamp": timestamp,
+        }
+
+    def make_embed(self, parts: dict) -> discord.Embed:
         embed = discord.Embed(
-            title=title,
-            description=description,
+            title=parts["title"],
+            description=parts["description"],
             color=discord.Colour.from_rgb(223, 191, 49),
-            url=url,
-            timestamp=timestamp or None,
+            url=parts["url"],
+            timestamp=parts["timestamp"] or None,
         )
-        if image:
-            embed.set_image(url=image)
+        if parts["image"]:
+            embed.set_image(url=parts["image"])
         text = "Information provided by Goonstation"
-        if timestamp:
+        if parts["timestamp"]:
             text += f"\nArticle last updated"
         embed.set_footer(
             text=text,
@@ -1,6 +1,9 @@
 from redbot.core.bot import Red
+from redbot.core.errors import CogLoadError
 from .wireciendpoint import WireCiEndpoint
 
 
 async def setup(bot: Red):
+    if bot.get_cog("HttpClient") is None:
+        raise CogLoadError("This cog needs the httpclient cog, load that one first.")
     await bot.add_cog(WireCiEndpoint(bot))
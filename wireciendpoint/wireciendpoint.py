@@ -97,19 +97,23 @@ def random_emoji(unicode_version=8, rnd=random):
 class WireCiEndpoint(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
+        self.http = bot.get_cog("HttpClient").handle_for(self)
         self.config = Config.get_conf(self, 1482189223515)
         self.config.register_global(channels={}, repo=None, testmerge_channels={})
         self.rnd = random.Random()
         self.funny_messages = open(
             bundled_data_path(self) / "code_quality.txt"
         ).readlines()
-        self.session = aiohttp.ClientSession()
         self.processed_successful_commits = {}
         self.processed_failed_commits = set()
         self.build_finished_lock = asyncio.Lock()
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.http.session
+
     def cog_unload(self):
-        asyncio.create_task(self.session.close())
+        self.http.close()
 
     async def run_with_github(self, github_fn, ctx = None):
         github_keys = await self.bot.get_shared_api_tokens("github")
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import random
+import urllib.parse
+from typing import *
+from . import protocol
+
+
+class CannedReplies:
+    """Topic handler answering the requests the cogs send with plausible Goonstation replies."""
+
+    def __init__(
+        self,
+        station_name: str = "Fake Station 13",
+        players: Optional[List[str]] = None,
+        map_name: str = "Cogmap 1",
+        mode: str = "secret",
+        admins: Optional[List[str]] = None,
+        mentors: Optional[List[str]] = None,
+    ):
+        self.station_name = station_name
+        self.players = players if players is not None else []
+        self.map_name = map_name
+        self.mode = mode
+        self.admins = admins if admins is not None else []
+        self.mentors = mentors if mentors is not None else []
+        self.elapsed = 0
+
+    def __call__(self, topic: str) -> Union[str, float, None, bytes]:
+        params = dict(urllib.parse.parse_qsl(topic, keep_blank_values=True))
+        topic_type = params.get("type")
+        if topic_type is None:
+            topic_type = topic.split("&")[0]
+            if topic_type == "status":
+                return self.status(params)
+        handler = getattr(self, f"topic_{topic_type}", None)
+        if handler is None:
+            return None
+        return handler(params)
+
+    def status(self, params):
+        self.elapsed += 1
+        status = {
+            "version": "Goonstation",
+            "mode": self.mode,
+            "respawn": 0,
+            "enter": 1,
+            "ai": 1,
+            "host": None,
+            "players": len(self.players),
+            "station_name": self.station_name,
+            "map_name": self.map_name,
+            "elapsed": self.elapsed,
+            "shuttle_time": 360,
+        }
+        if params.get("format") == "json":
+            status["players"] = str(len(self.players))
+            return json.dumps(status)
+        for i, player in enumerate(self.players):
+            status[f"player{i}"] = player
+        return urllib.parse.urlencode(
+            {k: "" if v is None else v for k, v in status.items()}
+        )
+
+    def topic_admins(self, params):
+        result = {"admins": len(self.admins)}
+        for i, admin in enumerate(self.admins):
+            result[f"admin{i}"] = admin
+        return urllib.parse.urlencode(result)
+
+    def topic_mentors(self, params):
+        result = {"mentors": len(self.mentors)}
+        for i, mentor in enumerate(self.mentors):
+            result[f"mentor{i}"] = mentor
+        return urllib.parse.urlencode(result)
+
+    def topic_whois(self, params):
+        target = "".join(c for c in params.get("target", "").lower() if c.isalnum())
+        found = [p for p in self.players if target in p]
+        result = {"count": len(found)}
+        for i, ckey in enumerate(found, start=1):
+            result[f"name{i}"] = ckey.capitalize()
+            result[f"ckey{i}"] = ckey
+            result[f"role{i}"] = "Staff Assistant"
+        return urllib.parse.urlencode(result)
+
+    def topic_getPlayerStats(self, params):
+        return json.dumps(
+            {
+                "seen": 120,
+                "seen_rp": 3,
+                "participated": 100,
+                "participated_rp": 2,
+                "playtime": 360000,
+                "last_seen": "2020-01-01T00:00:00",
+            }
+        )
+
+
+class FakeTopicServer:
+    """Local stand-in for a BYOND server's /world/Topic() for testing and benchmarking.
+
+    `handler` gets the topic string and returns the reply value, or raw bytes to
+    send the packet as is. Each reply is delayed by `latency` plus up to `jitter`
+    seconds, and with probability `drop_rate` the connection is closed instead.
+    Connections are kept open between requests."""
+
+    def __init__(
+        self,
+        handler: Optional[Callable[[str], Union[str, float, None, bytes]]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        jitter: float = 0,
+        drop_rate: float = 0,
+        seed: Optional[int] = None,
+    ):
+        self.handler = handler if handler is not None else CannedReplies()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.dropped = 0
+        self.server = None
+        self.requests = 0
+        self.connections = 0
+        self.open_connections = {}
+
+    @property
+    def addr_port(self) -> Tuple[str, int]:
+        return (self.host, self.port)
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in self.open_connections.values():
+            writer.close()
+        if self.open_connections:
+            await asyncio.gather(*self.open_connections, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.open_connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(protocol.HEADER_LENGTH)
+                    length = int.from_bytes(header[2:4], byteorder="big")
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                self.requests += 1
+                reply = await self.respond(protocol.decode_packet(header + body))
+                if reply is None:
+                    break
+                writer.write(reply)
+                await writer.drain()
+        finally:
+            del self.open_connections[asyncio.current_task()]
+            writer.close()
+
+    async def respond(self, topic: str) -> Optional[bytes]:
+        """Returns the packet to send back, None closes the connection without replying."""
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            self.dropped += 1
+            return None
+        value = self.handler(topic)
+        if isinstance(value, bytes):
+            return value
+        return protocol.encode_response(value)
@@ -0,0 +1,75 @@
+import time
+from collections import deque
+from typing import *
+
+
+class ServerUnavailableError(ConnectionRefusedError):
+    """Raised without contacting the server while its circuit breaker is open."""
+
+    pass
+
+
+class ServerHealth:
+    """Latency statistics and circuit breaker state of a single server.
+
+    Latency is tracked as an EWMA plus a sliding window of recent samples used
+    for percentiles. After `FAILURE_THRESHOLD` consecutive failures the breaker
+    opens for a backoff window which doubles on every failed probe."""
+
+    EWMA_ALPHA = 0.2
+    WINDOW_SIZE = 64
+    MIN_SAMPLES = 8
+    DEFAULT_TIMEOUT = 5
+    MIN_TIMEOUT = 2
+    FAILURE_THRESHOLD = 3
+    BASE_BACKOFF = 5
+    MAX_BACKOFF = 300
+
+    def __init__(self):
+        self.ewma = None
+        self.samples = deque(maxlen=self.WINDOW_SIZE)
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.open_until = None
+        self.backoff = self.BASE_BACKOFF
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    @property
+    def timeout(self) -> float:
+        if len(self.samples) < self.MIN_SAMPLES:
+            return self.DEFAULT_TIMEOUT
+        estimate = max(self.ewma * 4, self.percentile(99) * 2)
+        return min(self.DEFAULT_TIMEOUT, max(self.MIN_TIMEOUT, estimate))
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until is not None
+
+    def record_success(self, elapsed: float):
+        self.samples.append(elapsed)
+        if self.ewma is None:
+            self.ewma = elapsed
+        else:
+            self.ewma += self.EWMA_ALPHA * (elapsed - self.ewma)
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.backoff = self.BASE_BACKOFF
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure just opened the breaker."""
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.is_open or self.consecutive_failures < self.FAILURE_THRESHOLD:
+            return False
+        self.open_until = time.monotonic() + self.backoff
+        return True
+
+    def record_failed_probe(self):
+        self.total_failures += 1
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+        self.open_until = time.monotonic() + self.backoff
@@ -0,0 +1,97 @@
+import asyncio
+import struct
+from typing import *
+
+# Packets in both directions are a 4 byte header (0x00, 0x83, big endian
+# payload length) followed by the payload. Response payloads start with a
+# type byte describing the rest of the data.
+PACKET_MAGIC = 0x83
+HEADER_LENGTH = 4
+MAX_PAYLOAD_LENGTH = 0xFFFF
+
+TYPE_NULL = 0x00
+TYPE_UNKNOWN_STRING = 0x04  # no idea, string with a longer header
+TYPE_STRING = 0x06
+TYPE_FLOAT = 0x2A
+
+UNKNOWN_STRING_OFFSET = 13
+
+_float = struct.Struct("<f")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_packet(msg: str) -> bytes:
+    body = msg.encode("utf8")
+    prefix = b"" if msg and msg[0] == "?" else b"?"
+    length = 5 + len(prefix) + len(body)
+    if length > MAX_PAYLOAD_LENGTH:
+        raise ProtocolError(f"Message too long ({length} bytes).")
+    packet = bytearray(HEADER_LENGTH + length)
+    packet[1] = PACKET_MAGIC
+    packet[2:4] = length.to_bytes(2, byteorder="big")
+    pos = 8 + len(prefix)
+    packet[8:pos] = prefix
+    packet[pos : pos + len(body)] = body
+    return bytes(packet)
+
+
+async def read_payload(reader: asyncio.StreamReader) -> memoryview:
+    """Reads one response and returns a view of its payload.
+
+    The header tells us the exact size so the payload lands in a single buffer
+    instead of being grown chunk by chunk. Raises `asyncio.IncompleteReadError`
+    if the connection is closed early."""
+    header = await reader.readexactly(HEADER_LENGTH)
+    length = int.from_bytes(header[2:4], byteorder="big")
+    if length == 0:
+        raise ProtocolError(f"Empty response. Header: '{header.hex()}'.")
+    return memoryview(await reader.readexactly(length))
+
+
+def decode_payload(payload: memoryview) -> Union[str, float, None]:
+    response_type = payload[0]
+    if response_type == TYPE_NULL:
+        return None
+    if response_type == TYPE_FLOAT:
+        if len(payload) < 1 + _float.size:
+            raise ProtocolError(f"Truncated float response: '{payload.hex()}'.")
+        return _float.unpack_from(payload, 1)[0]
+    if response_type == TYPE_STRING:
+        start = 1
+    elif response_type == TYPE_UNKNOWN_STRING:
+        start = UNKNOWN_STRING_OFFSET
+    else:
+        raise ProtocolError(
+            f"Unknown response type {hex(response_type)}. Full hex dump: '{payload.hex()}'."
+        )
+    end = len(payload)
+    while start < end and payload[start] == 0:
+        start += 1
+    while end > start and payload[end - 1] == 0:
+        end -= 1
+    return str(payload[start:end], "utf8")
+
+
+def encode_response(value: Union[str, float, None]) -> bytes:
+    """Builds a response packet the way a BYOND server would, used by fake servers."""
+    if value is None:
+        payload = bytes([TYPE_NULL])
+    elif isinstance(value, (int, float)):
+        payload = bytes([TYPE_FLOAT]) + _float.pack(value)
+    else:
+        payload = bytes([TYPE_STRING]) + value.encode("utf8") + b"\x00"
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise ProtocolError(f"Response too long ({len(payload)} bytes).")
+    return bytes([0, PACKET_MAGIC]) + len(payload).to_bytes(2, byteorder="big") + payload
+
+
+def decode_packet(packet: bytes) -> str:
+    """Extracts the topic string from a request packet, used by fake servers."""
+    payload = memoryview(packet)[HEADER_LENGTH:]
+    end = len(payload)
+    while end > 5 and payload[end - 1] == 0:
+        end -= 1
+    return str(payload[5:end], "utf8")
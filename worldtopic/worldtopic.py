@@ -1,7 +1,6 @@
 import asyncio
 import urllib
 from collections import OrderedDict
-import struct
 import discord
 from redbot.core import commands, Config, checks
 import discord.errors
@@ -10,76 +9,216 @@ from typing import *
 import re
 import time
 from redbot.core.utils.chat_formatting import pagify, box
+from . import protocol
+from .health import ServerHealth, ServerUnavailableError
+
+
+class StaleConnectionError(ConnectionError):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+    @property
+    def broken(self):
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class ConnectionPool:
+    """Idle sockets to a single (host, port) plus a limit on how many can be open at once."""
+
+    def __init__(self, addr_port: Tuple[str, int], max_connections: int, idle_timeout: float):
+        self.addr_port = addr_port
+        self.idle_timeout = idle_timeout
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(max_connections)
+
+    def pop_idle(self) -> Optional[PooledConnection]:
+        now = time.monotonic()
+        while self.idle:
+            conn = self.idle.pop()
+            if conn.broken or now - conn.last_used > self.idle_timeout:
+                conn.close()
+                continue
+            return conn
+        return None
+
+    def put_back(self, conn: PooledConnection):
+        conn.last_used = time.monotonic()
+        if conn.broken:
+            conn.close()
+        else:
+            self.idle.append(conn)
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle.clear()
 
 
 class WorldTopic(commands.Cog):
-    RESPONSE_HEADER_LENGTH = 5
-    MAGIC_STRING = 0x06
-    MAGIC_STRING = 0x06
-    MAGIC_FLOAT = 0x2A
-    MAGIC_NULL = 0x00
-    MAX_RECEIVE_TRIES = 10
+    MAX_CONNECTIONS_PER_SERVER = 4
+    IDLE_CONNECTION_TIMEOUT = 30
+    PROBE_MESSAGE = "status"
+    ServerUnavailableError = ServerUnavailableError
 
     def __init__(self, bot: Red):
         self.bot = bot
+        self.pools = {}
+        self.pool_stats = {"hits": 0, "misses": 0, "reconnects": 0}
+        self.health = {}
+        self.probe_tasks = {}
 
-    async def send(self, addr_port: Tuple[str, int], msg: str, timeout: int = 5) -> str:
-        future = self._send(addr_port, msg)
-        return await asyncio.wait_for(future, timeout=timeout)
+    def cog_unload(self):
+        for task in self.probe_tasks.values():
+            task.cancel()
+        self.probe_tasks.clear()
+        for pool in self.pools.values():
+            pool.close()
+        self.pools.clear()
 
-    async def _send(self, addr_port: Tuple[str, int], msg: str) -> str:
-        addr, port = addr_port
-
-        packet = bytearray(b"\x00" * 8)
-        if not msg or msg[0] != "?":
-            packet += b"?"
-        packet += msg.encode("utf8")
-        packet += b"\x00"
-
-        packet[1] = 0x83
-        length = len(packet) - 4
-        length_bytes = length.to_bytes(length=2, byteorder="big")
-        packet[2] = int(length_bytes[0])
-        packet[3] = int(length_bytes[1])
-
-        reader, writer = await asyncio.open_connection(addr, port)
-
-        writer.write(bytes(packet))
-        await writer.drain()
-
-        response = b""
-        target_length = 0
-        failures_left = self.MAX_RECEIVE_TRIES
-        while len(response) < 4 or len(response) < target_length:
-            new_bytes = await reader.read(0xFFFF)
-            if not new_bytes:
-                failures_left -= 1
-                if failures_left < 0:
-                    raise TimeoutError("Maximum receive tries exceeded.")
-            response += new_bytes
-            if not target_length and len(response) >= 4:
-                target_length = int.from_bytes(response[2:4], byteorder="big") + 4
-
-        writer.close()
-        await writer.wait_closed()
-
-        response_type_magic = response[4]
-
-        header_length = self.RESPONSE_HEADER_LENGTH
-        if response_type_magic == 0x04:  # no idea
-            response_type_magic = self.MAGIC_STRING
-            header_length = 17
-
-        if response_type_magic == self.MAGIC_STRING:
-            return response[header_length:].strip(b"\x00").decode("utf8")
-        elif response_type_magic == self.MAGIC_FLOAT:
-            return struct.unpack("f", response[header_length:])[0]
-        elif response_type_magic == self.MAGIC_NULL:
-            return None
-        else:
-            raise ValueError(
-                f"Unknown response type {hex(response_type_magic)}. Full hex dump: '{response.hex()}'."
+    def get_health(self, addr_port: Tuple[str, int]) -> ServerHealth:
+        addr_port = tuple(addr_port)
+        health = self.health.get(addr_port)
+        if health is None:
+            health = ServerHealth()
+            self.health[addr_port] = health
+        return health
+
+    def is_unavailable(self, addr_port: Tuple[str, int]) -> bool:
+        health = self.health.get(tuple(addr_port))
+        return health is not None and health.is_open
+
+    async def probe(self, addr_port: Tuple[str, int]):
+        # keeps retrying a server with an open breaker until it answers again
+        health = self.get_health(addr_port)
+        try:
+            while health.is_open:
+                await asyncio.sleep(max(0, health.open_until - time.monotonic()))
+                start = time.monotonic()
+                try:
+                    await asyncio.wait_for(
+                        self._send(addr_port, self.PROBE_MESSAGE),
+                        timeout=ServerHealth.DEFAULT_TIMEOUT,
+                    )
+                except (asyncio.TimeoutError, OSError, ValueError):
+                    health.record_failed_probe()
+                else:
+                    health.record_success(time.monotonic() - start)
+        finally:
+            self.probe_tasks.pop(addr_port, None)
+
+    def get_pool(self, addr_port: Tuple[str, int]) -> ConnectionPool:
+        addr_port = tuple(addr_port)
+        pool = self.pools.get(addr_port)
+        if pool is None:
+            pool = ConnectionPool(
+                addr_port, self.MAX_CONNECTIONS_PER_SERVER, self.IDLE_CONNECTION_TIMEOUT
             )
+            self.pools[addr_port] = pool
+        return pool
+
+    async def send(
+        self,
+        addr_port: Tuple[str, int],
+        msg: str,
+        timeout: float = ServerHealth.DEFAULT_TIMEOUT,
+        adaptive: bool = False,
+    ) -> str:
+        """Sends a topic and returns the response.
+
+        With `adaptive` the timeout is lowered to one derived from the server's
+        recent latency, meant for cheap topics like status polls. Timeouts of calls
+        with a longer than default `timeout` don't count against the server.
+        Raises `ServerUnavailableError` right away if the server failed repeatedly
+        and hasn't answered a background probe since."""
+        addr_port = tuple(addr_port)
+        health = self.get_health(addr_port)
+        if health.is_open:
+            raise ServerUnavailableError(f"{addr_port[0]}:{addr_port[1]} is marked offline.")
+        if adaptive:
+            timeout = min(timeout, health.timeout)
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._send(addr_port, msg), timeout=timeout)
+        except asyncio.TimeoutError:
+            if timeout <= ServerHealth.DEFAULT_TIMEOUT:
+                self.record_failure(addr_port, health)
+            raise
+        except OSError:
+            self.record_failure(addr_port, health)
+            raise
+        health.record_success(time.monotonic() - start)
+        return result
+
+    def record_failure(self, addr_port: Tuple[str, int], health: ServerHealth):
+        if health.record_failure() and addr_port not in self.probe_tasks:
+            self.probe_tasks[addr_port] = asyncio.create_task(self.probe(addr_port))
+
+    async def _send(self, addr_port: Tuple[str, int], msg: str) -> str:
+        packet = self.build_packet(msg)
+        pool = self.get_pool(addr_port)
+        async with pool.semaphore:
+            conn = pool.pop_idle()
+            response = None
+            if conn is not None:
+                self.pool_stats["hits"] += 1
+                try:
+                    response = await self._exchange(conn, packet, reused=True)
+                except StaleConnectionError:
+                    self.pool_stats["reconnects"] += 1
+                    conn = None
+            if conn is None:
+                self.pool_stats["misses"] += 1
+                reader, writer = await asyncio.open_connection(*addr_port)
+                conn = PooledConnection(reader, writer)
+                response = await self._exchange(conn, packet)
+            pool.put_back(conn)
+        return self.decode_response(response)
+
+    async def _exchange(self, conn: PooledConnection, packet: bytes, reused: bool = False) -> memoryview:
+        # any failure (including cancellation by the timeout) leaves the socket
+        # in an unknown state so it never goes back to the pool
+        try:
+            conn.writer.write(packet)
+            await conn.writer.drain()
+            response = await self._receive(conn.reader, reused)
+        except StaleConnectionError:
+            conn.close()
+            raise
+        except (ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if reused:
+                raise StaleConnectionError() from e
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        conn.uses += 1
+        return response
+
+    async def _receive(self, reader: asyncio.StreamReader, reused: bool = False) -> memoryview:
+        try:
+            return await protocol.read_payload(reader)
+        except asyncio.IncompleteReadError as e:
+            if reused and not e.partial:
+                raise StaleConnectionError() from e
+            raise ConnectionResetError("Connection closed mid-response.") from e
+
+    def build_packet(self, msg: str) -> bytes:
+        return protocol.encode_packet(msg)
+
+    def decode_response(self, payload: memoryview):
+        return protocol.decode_payload(payload)
 
     def params_to_dict(self, params: str):
         result = OrderedDict()
@@ -143,3 +282,43 @@ class WorldTopic(commands.Cog):
         response_message = f"Time: {elapsed * 1000:.2f}ms\nResponse: {response_message}"
         for page in pagify(response_message):
             await ctx.send(box(page))
+
+    @commands.command()
+    @checks.is_owner()
+    async def world_topic_pool(self, ctx: commands.Context):
+        """Shows world topic connection pool counters."""
+        lines = [f"{k}: {v}" for k, v in self.pool_stats.items()]
+        lookups = self.pool_stats["hits"] + self.pool_stats["misses"]
+        if lookups:
+            lines.append(f"hit rate: {self.pool_stats['hits'] / lookups * 100:.1f}%")
+        lines.append("")
+        for (addr, port), pool in self.pools.items():
+            lines.append(f"{addr}:{port} idle: {len(pool.idle)}")
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))
+
+    @commands.command()
+    @checks.is_owner()
+    async def world_topic_health(self, ctx: commands.Context):
+        """Shows latency, timeouts and circuit breaker state of servers contacted so far."""
+        lines = []
+        for (addr, port), health in self.health.items():
+            if health.ewma is None:
+                latency = "no data"
+            else:
+                latency = (
+                    f"ewma {health.ewma * 1000:.0f}ms "
+                    f"p50 {health.percentile(50) * 1000:.0f}ms "
+                    f"p99 {health.percentile(99) * 1000:.0f}ms"
+                )
+            state = "closed"
+            if health.is_open:
+                state = f"OPEN for {max(0, health.open_until - time.monotonic()):.0f}s"
+            lines.append(
+                f"{addr}:{port} {latency} timeout {health.timeout:.1f}s "
+                f"failures {health.total_failures} breaker {state}"
+            )
+        if not lines:
+            lines.append("No servers contacted yet.")
+        for page in pagify("\n".join(lines)):
+            await ctx.send(box(page))